@@ -0,0 +1,316 @@
+"""
+Certificate Backfill
+Regenerates issued certificates in bulk from an export of the enrollments table.
+
+Rows are streamed from a CSV or NDJSON export, rendered to PDF in a process
+pool and uploaded from a thread pool through the shared S3 client. Every
+finished certificate is appended to a local journal, so an interrupted run
+resumes where it stopped when started again with the same journal.
+
+Each row needs the enrollment columns user_id, course_id, certificate_number
+and completion_date, plus recipient_name, course_title and tier_level joined
+from the users and courses tables. Rows without a certificate number or with
+certificate_issued = 0 are skipped.
+
+With --skip-unchanged, each certificate's stored fingerprint is read with a
+concurrent HEAD first and only certificates whose template, styling, fonts,
+renderer version or input fields changed are rendered again.
+
+Usage:
+    python backfill.py enrollments.csv [--journal backfill.journal] [--render-workers 4] [--upload-workers 16]
+                       [--skip-unchanged]
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from certificate_generator import CertificateGenerator
+
+logger = logging.getLogger('backfill')
+
+# Per-process generator used by render workers
+_worker_generator = None
+
+
+def _init_render_worker():
+    """Create one CertificateGenerator per render process so templates load once."""
+    global _worker_generator
+    _worker_generator = CertificateGenerator()
+
+
+def _render_in_worker(certificate_data):
+    """Render a certificate PDF inside a render process."""
+    return _worker_generator.render_pdf(certificate_data)
+
+
+def read_enrollments(path, input_format=None):
+    """
+    Stream enrollment rows from a CSV or NDJSON export.
+
+    Args:
+        path (str): Export file path
+        input_format (str): 'csv' or 'ndjson'; inferred from the extension when omitted
+
+    Yields:
+        dict: One enrollment row
+    """
+    input_format = input_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if input_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_rows(path, input_format=None):
+    """
+    Count data rows so progress can report an ETA.
+
+    Rows are read with read_enrollments, so quoted multi-line CSV fields and
+    --format overrides are counted exactly as the backfill will see them.
+
+    Args:
+        path (str): Export file path
+        input_format (str): 'csv' or 'ndjson'; inferred from the extension when omitted
+
+    Returns:
+        int: Number of rows
+    """
+    return sum(1 for _ in read_enrollments(path, input_format))
+
+
+def build_certificate_data(row):
+    """
+    Convert an enrollment row into certificate data.
+
+    Args:
+        row (dict): Enrollment row
+
+    Returns:
+        dict: Certificate data, or None if the row has no issued certificate
+    """
+    if str(row.get('certificate_issued', '1')) in ('0', 'false', 'False') or not row.get('certificate_number'):
+        return None
+
+    completion_date = str(row['completion_date'])[:10]
+    formatted_date = datetime.strptime(completion_date, '%Y-%m-%d').strftime('%B %d, %Y')
+
+    return {
+        'recipient_name': str(row['recipient_name']).strip(),
+        'course_title': str(row['course_title']).strip(),
+        'tier_level': int(row['tier_level']),
+        'completion_date': formatted_date,
+        'certificate_number': row['certificate_number'],
+        'user_id': row['user_id'],
+        'course_id': row['course_id']
+    }
+
+
+class Journal:
+    """
+    Append-only NDJSON record of finished certificates.
+
+    Each line holds user_id, course_id, status and the S3 key or error.
+    Only 'done' entries are skipped on resume, so failures are retried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partial line from a crash mid-write
+                    if entry.get('status') == 'done':
+                        self.completed.add((str(entry['user_id']), str(entry['course_id'])))
+
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, certificate_data):
+        return (str(certificate_data['user_id']), str(certificate_data['course_id'])) in self.completed
+
+    def record(self, certificate_data, status, **details):
+        entry = {'user_id': certificate_data['user_id'], 'course_id': certificate_data['course_id'], 'status': status}
+        entry.update(details)
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        if status == 'done':
+            self.completed.add((str(entry['user_id']), str(entry['course_id'])))
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class Progress:
+    """Tracks throughput and logs progress with an ETA at a fixed interval."""
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def update(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+
+        elapsed = now - self.started
+        processed = self.done + self.unchanged + self.failed
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - processed - self.skipped, 0)
+        eta = f"{remaining / rate / 60:.1f} min" if rate > 0 else 'unknown'
+
+        logger.info(
+            f"{processed + self.skipped}/{self.total} rows | done {self.done} unchanged {self.unchanged} "
+            f"failed {self.failed} skipped {self.skipped} | {rate:.1f} certs/s | ETA {eta}"
+        )
+
+
+def run_backfill(rows, journal, total, render_workers, upload_workers, progress_interval=10, skip_unchanged=False):
+    """
+    Render and upload certificates for every row not yet completed in the journal.
+
+    At most a bounded number of certificates is in flight at once, so memory
+    stays flat however large the export is.
+
+    Args:
+        rows (iterable): Enrollment rows
+        journal (Journal): Progress journal
+        total (int): Total rows, for progress reporting
+        render_workers (int): Render processes
+        upload_workers (int): Upload threads
+        progress_interval (float): Seconds between progress log lines
+        skip_unchanged (bool): HEAD each certificate first and skip it if its fingerprint is current
+
+    Returns:
+        Progress: Final counters
+    """
+    generator = CertificateGenerator()
+    progress = Progress(total, progress_interval)
+    max_in_flight = render_workers * 2 + upload_workers
+    pending = {}
+
+    def handle(future):
+        stage, certificate_data = pending.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            progress.failed += 1
+            journal.record(certificate_data, 'failed', stage=stage, error=str(e))
+            logger.error(f"{stage} failed for user {certificate_data['user_id']}, course {certificate_data['course_id']}: {e}")
+            return
+
+        if stage == 'check':
+            if result:
+                progress.unchanged += 1
+                journal.record(certificate_data, 'done', unchanged=True)
+            else:
+                render = renderers.submit(_render_in_worker, certificate_data)
+                pending[render] = ('render', certificate_data)
+        elif stage == 'render':
+            upload = uploaders.submit(generator.upload_certificate, result, certificate_data)
+            pending[upload] = ('upload', certificate_data)
+        else:
+            progress.done += 1
+            journal.record(certificate_data, 'done', s3_key=result['s3_key'])
+
+    with ProcessPoolExecutor(max_workers=render_workers, initializer=_init_render_worker) as renderers, \
+            ThreadPoolExecutor(max_workers=upload_workers) as uploaders:
+
+        for row in rows:
+            try:
+                certificate_data = build_certificate_data(row)
+            except (KeyError, ValueError) as e:
+                progress.failed += 1
+                logger.error(f"Invalid enrollment row {row}: {e}")
+                continue
+
+            if certificate_data is None or journal.is_done(certificate_data):
+                progress.skipped += 1
+                continue
+
+            while len(pending) >= max_in_flight:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    handle(future)
+                progress.update()
+
+            if skip_unchanged:
+                # HEADs run concurrently on the upload threads; only stale certificates reach a renderer
+                check = uploaders.submit(generator.is_current, certificate_data)
+                pending[check] = ('check', certificate_data)
+            else:
+                render = renderers.submit(_render_in_worker, certificate_data)
+                pending[render] = ('render', certificate_data)
+
+        while pending:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in finished:
+                handle(future)
+            progress.update()
+
+    progress.update(force=True)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate certificates from an enrollments export')
+    parser.add_argument('input', help='CSV or NDJSON export of the enrollments table')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from extension)')
+    parser.add_argument('--journal', help='Progress journal path (default: <input>.journal)')
+    parser.add_argument('--render-workers', type=int, default=os.cpu_count() or 2, help='PDF render processes')
+    parser.add_argument('--upload-workers', type=int, default=16, help='S3 upload threads')
+    parser.add_argument('--progress-interval', type=float, default=10, help='Seconds between progress lines')
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help='Only regenerate certificates whose stored fingerprint differs from the current one')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    # Per-certificate generator logs would drown out progress reporting
+    logging.getLogger('certificate_generator').setLevel(logging.WARNING)
+
+    journal = Journal(args.journal or f"{args.input}.journal")
+    total = count_rows(args.input, args.format)
+    logger.info(f"Backfilling {total} rows, {len(journal.completed)} already done according to {journal.path}")
+
+    try:
+        progress = run_backfill(
+            read_enrollments(args.input, args.format),
+            journal,
+            total,
+            args.render_workers,
+            args.upload_workers,
+            args.progress_interval,
+            args.skip_unchanged
+        )
+    finally:
+        journal.close()
+
+    elapsed = time.monotonic() - progress.started
+    logger.info(f"Finished in {elapsed / 60:.1f} min: {progress.done} regenerated, {progress.unchanged} unchanged, "
+                f"{progress.failed} failed, {progress.skipped} skipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Compression Benchmark
+Measures gzip ratio and CPU cost across representative HTML certificate payloads.
+
+Usage:
+    python benchmark_compression.py [--iterations 500]
+"""
+
+import argparse
+import gzip
+import time
+
+from handler import GZIP_LEVEL, generate_html_certificate, get_tier_color
+
+TIER_NAMES = {1: "Foundation Program", 2: "Mastery Program", 3: "Elite Program"}
+
+RECIPIENTS = [
+    'Jo Li',
+    'John Doe',
+    'Maria Fernanda Gonzalez-Rodriguez',
+    'Dr. Alexandria Catherine Montgomery-Whitfield III',
+]
+
+COURSES = [
+    'Real Estate Foundations',
+    'Advanced Commercial Property Investment and Portfolio Management Strategies',
+]
+
+
+def build_payloads():
+    """
+    Render one HTML certificate per tier, recipient and course combination.
+
+    Returns:
+        list: (label, bytes) tuples of uncompressed certificate HTML
+    """
+    payloads = []
+
+    for tier_level, tier_name in TIER_NAMES.items():
+        for recipient_name in RECIPIENTS:
+            for course_title in COURSES:
+                html = generate_html_certificate({
+                    'recipient_name': recipient_name,
+                    'course_title': course_title,
+                    'tier_level': tier_level,
+                    'tier_name': tier_name,
+                    'completion_date': 'October 05, 2024',
+                    'certificate_number': 'CERT-2024-0847',
+                    'user_id': 123,
+                    'course_id': 456,
+                    'accent_color': get_tier_color(tier_level),
+                    'current_year': 2024
+                })
+                label = f"tier {tier_level}, {len(recipient_name)}-char name, {len(course_title)}-char course"
+                payloads.append((label, html.encode('utf-8')))
+
+    return payloads
+
+
+def benchmark_level(payloads, level, iterations):
+    """
+    Compress every payload ``iterations`` times at the given level.
+
+    Args:
+        payloads (list): (label, bytes) tuples to compress
+        level (int): gzip compression level
+        iterations (int): Repetitions per payload
+
+    Returns:
+        dict: Total raw and compressed bytes and mean CPU microseconds per payload
+    """
+    raw_bytes = 0
+    compressed_bytes = 0
+    cpu_seconds = 0.0
+
+    for _, data in payloads:
+        start = time.process_time()
+        for _ in range(iterations):
+            compressed = gzip.compress(data, compresslevel=level, mtime=0)
+        cpu_seconds += time.process_time() - start
+        raw_bytes += len(data)
+        compressed_bytes += len(compressed)
+
+    return {
+        'raw_bytes': raw_bytes,
+        'compressed_bytes': compressed_bytes,
+        'ratio': raw_bytes / compressed_bytes,
+        'cpu_us': cpu_seconds / (iterations * len(payloads)) * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gzip levels on HTML certificates')
+    parser.add_argument('--iterations', type=int, default=500, help='Compressions per payload and level')
+    args = parser.parse_args()
+
+    payloads = build_payloads()
+    sizes = [len(data) for _, data in payloads]
+    print(f"{len(payloads)} payloads, {min(sizes)}-{max(sizes)} bytes uncompressed")
+    print()
+    print(f"{'level':>5}  {'avg bytes':>9}  {'ratio':>6}  {'cpu us':>7}")
+
+    for level in range(1, 10):
+        result = benchmark_level(payloads, level, args.iterations)
+        marker = '  <- GZIP_LEVEL' if level == GZIP_LEVEL else ''
+        print(f"{level:>5}  {result['compressed_bytes'] // len(payloads):>9}  "
+              f"{result['ratio']:>5.2f}x  {result['cpu_us']:>7.1f}{marker}")
+
+
+if __name__ == '__main__':
+    main()
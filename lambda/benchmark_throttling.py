@@ -0,0 +1,155 @@
+"""
+Throttling Benchmark
+Failure-injection harness comparing S3 retry strategies against a local bucket
+that answers 503 SlowDown once its request rate is exceeded. Runs fully offline.
+
+Compares, with the same retry budget (--max-attempts) for both:
+    legacy-per-thread   botocore legacy retries with one client per worker thread
+                        (each request backs off on its own)
+    adaptive-shared     the shared client from s3_client (adaptive retries with one
+                        token bucket for every thread)
+
+Usage:
+    python benchmark_throttling.py [--uploads 1000] [--workers 64] [--capacity 100] [--max-attempts 10]
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from local_s3 import RawBody
+from s3_client import S3_MAX_ATTEMPTS, create_s3_client
+
+SLOW_DOWN_BODY = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>'
+)
+
+
+class ThrottlingBucket:
+    """
+    Local stand-in for a single S3 prefix with a fixed request rate.
+
+    Requests beyond ``capacity`` per second are answered with 503 SlowDown.
+    Every request, accepted or not, costs ``latency`` seconds.
+    """
+
+    def __init__(self, capacity, latency=0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.accepted = 0
+        self.rejected = 0
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def handle(self, request, **kwargs):
+        """before-send hook that answers the request locally instead of calling AWS."""
+        time.sleep(self.latency)
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.capacity)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.accepted += 1
+                return AWSResponse(request.url, 200, {'ETag': '"0"'}, RawBody(b''))
+            self.rejected += 1
+
+        return AWSResponse(request.url, 503, {'Content-Type': 'application/xml'}, RawBody(SLOW_DOWN_BODY))
+
+
+def _session():
+    """Return a boto3 session with dummy credentials so no real AWS config is used."""
+    return boto3.session.Session(
+        aws_access_key_id='testing',
+        aws_secret_access_key='testing',
+        region_name='us-east-1'
+    )
+
+
+def run_scenario(name, uploads, workers, capacity, shared, max_attempts=S3_MAX_ATTEMPTS):
+    """
+    Upload ``uploads`` small objects from ``workers`` threads against a throttling bucket.
+
+    Args:
+        name (str): Scenario label
+        uploads (int): Number of PutObject calls
+        workers (int): Thread pool size
+        capacity (int): Accepted requests per second
+        shared (bool): Use one adaptive client for all threads instead of legacy per-thread clients
+        max_attempts (int): Total attempts per upload, the same for either strategy
+
+    Returns:
+        dict: Wall time, successes, failures, attempts and throttled responses
+    """
+    bucket = ThrottlingBucket(capacity)
+    session = _session()
+    local = threading.local()
+
+    if shared:
+        shared_client = create_s3_client(retry_mode='adaptive', max_attempts=max_attempts, session=session)
+        shared_client.meta.events.register('before-send', bucket.handle)
+
+    def client_for_thread():
+        if shared:
+            return shared_client
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = create_s3_client(retry_mode='legacy', max_attempts=max_attempts, session=session)
+            client.meta.events.register('before-send', bucket.handle)
+            local.client = client
+        return client
+
+    def upload(i):
+        try:
+            client_for_thread().put_object(Bucket='benchmark', Key=f'certificates/{i}/cert.pdf', Body=b'%PDF')
+            return True
+        except ClientError:
+            return False
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(upload, range(uploads)))
+    elapsed = time.monotonic() - start
+
+    return {
+        'scenario': name,
+        'seconds': round(elapsed, 2),
+        'succeeded': sum(results),
+        'failed': len(results) - sum(results),
+        'attempts': bucket.accepted + bucket.rejected,
+        'throttled': bucket.rejected,
+        'client_metrics': shared_client.clarity_metrics.snapshot() if shared else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare S3 retry strategies under injected SlowDown throttling')
+    parser.add_argument('--uploads', type=int, default=1000, help='Objects to upload per scenario')
+    parser.add_argument('--workers', type=int, default=64, help='Concurrent upload threads')
+    parser.add_argument('--capacity', type=int, default=100, help='Requests per second the local bucket accepts')
+    parser.add_argument('--max-attempts', type=int, default=S3_MAX_ATTEMPTS, help='Total attempts per upload for both strategies')
+    args = parser.parse_args()
+
+    print(f"{args.uploads} uploads, {args.workers} threads, bucket accepts {args.capacity} req/s, "
+          f"{args.max_attempts} attempts per upload (no strategy can finish in under {args.uploads / args.capacity:.1f} s)")
+    print()
+    print(f"{'scenario':<20} {'seconds':>8} {'ok':>5} {'failed':>6} {'attempts':>8} {'throttled':>9}")
+
+    for name, shared in (('legacy-per-thread', False), ('adaptive-shared', True)):
+        result = run_scenario(name, args.uploads, args.workers, args.capacity, shared, args.max_attempts)
+        print(f"{result['scenario']:<20} {result['seconds']:>8} {result['succeeded']:>5} "
+              f"{result['failed']:>6} {result['attempts']:>8} {result['throttled']:>9}")
+        if result['client_metrics']:
+            print(f"{'':<20} client metrics: {result['client_metrics']}")
+
+
+if __name__ == '__main__':
+    main()
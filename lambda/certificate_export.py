@@ -0,0 +1,314 @@
+"""
+Certificate Export Module
+Streams all certificates of a user or a course from S3 into a single ZIP archive in S3.
+
+Objects are downloaded concurrently a few files ahead of the zip writer and
+copied chunk by chunk; the archive is written into a pipe that s3transfer
+reads as a multipart upload. No file or archive is ever held in memory as a
+whole, so memory stays flat regardless of archive size.
+
+Usage:
+    python certificate_export.py --user-id 123
+    python certificate_export.py --course-id 456
+"""
+
+import os
+import json
+import argparse
+import queue
+import logging
+import threading
+import zipfile
+import zlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+
+from s3_client import get_s3_client
+from s3_keys import LAYOUT_HASHED, LAYOUT_LEGACY, certificate_prefix, parse_certificate_key
+
+logger = logging.getLogger(__name__)
+
+# Bytes per read from a downloading object
+CHUNK_SIZE = 256 * 1024
+
+# Objects downloading ahead of the zip writer, and chunks buffered per object
+PREFETCH_OBJECTS = int(os.getenv('EXPORT_PREFETCH_OBJECTS', '8'))
+PREFETCH_CHUNKS = 4
+
+# Multipart part size and parallel part uploads for the archive
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4
+)
+
+_END = object()
+
+
+class _ObjectStream:
+    """Chunks of one S3 object, filled by a download thread and drained by the zip writer."""
+
+    def __init__(self, s3_key):
+        self.s3_key = s3_key
+        self.chunks = queue.Queue(maxsize=PREFETCH_CHUNKS)
+        self.cancelled = threading.Event()
+
+    def __iter__(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is _END:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def put(self, item):
+        """Queue an item unless the export was cancelled; returns False once cancelled."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+class CertificateExporter:
+    """
+    Builds ZIP archives of stored certificates.
+    """
+
+    def __init__(self):
+        """Initialize the exporter with the shared S3 client."""
+        self.s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.s3_region = os.getenv('S3_REGION', 'us-east-1')
+        self.s3_client = get_s3_client(self.s3_region)
+
+    def list_user_certificates(self, user_id):
+        """
+        List every certificate of a user in both key layouts.
+
+        Args:
+            user_id: WordPress user ID
+
+        Returns:
+            list: (s3_key, archive_name) tuples sorted by archive name
+        """
+        entries = []
+        for layout in (LAYOUT_LEGACY, LAYOUT_HASHED):
+            for s3_key in self._list_keys(certificate_prefix(user_id, layout)):
+                parsed = parse_certificate_key(s3_key)
+                if parsed and parsed['user_id'] == str(user_id):
+                    entries.append((s3_key, f"{parsed['course_id']}/cert-{parsed['certificate_number']}.{parsed['extension']}"))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def list_course_certificates(self, course_id):
+        """
+        List every certificate issued for a course across all users.
+
+        Keys are grouped by user, so this walks the whole certificates/ prefix.
+
+        Args:
+            course_id: Course ID
+
+        Returns:
+            list: (s3_key, archive_name) tuples sorted by archive name
+        """
+        entries = []
+        for s3_key in self._list_keys('certificates/'):
+            parsed = parse_certificate_key(s3_key)
+            if parsed and parsed['course_id'] == str(course_id):
+                entries.append((s3_key, f"{parsed['user_id']}/cert-{parsed['certificate_number']}.{parsed['extension']}"))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def export(self, entries, export_key):
+        """
+        Stream the given certificates into a ZIP archive uploaded to ``export_key``.
+
+        Args:
+            entries (list): (s3_key, archive_name) tuples
+            export_key (str): S3 key for the archive
+
+        Returns:
+            dict: Archive key, signed URL and number of certificates
+        """
+        read_fd, write_fd = os.pipe()
+        reader = os.fdopen(read_fd, 'rb')
+        writer = os.fdopen(write_fd, 'wb')
+        writer_errors = []
+
+        zip_thread = threading.Thread(
+            target=self._write_zip,
+            args=(entries, writer, writer_errors),
+            name='certificate-export-zip',
+            daemon=True
+        )
+        zip_thread.start()
+
+        try:
+            self.s3_client.upload_fileobj(
+                reader,
+                self.s3_bucket,
+                export_key,
+                ExtraArgs={'ContentType': 'application/zip', 'ServerSideEncryption': 'AES256'},
+                Config=TRANSFER_CONFIG
+            )
+        finally:
+            # Unblocks the writer with a broken pipe if the upload stopped early
+            reader.close()
+            zip_thread.join()
+
+        if writer_errors:
+            # The upload saw a truncated stream; don't leave a corrupt archive behind
+            self.s3_client.delete_object(Bucket=self.s3_bucket, Key=export_key)
+            raise Exception(f"Failed to build certificate archive: {str(writer_errors[0])}")
+
+        signed_url = self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.s3_bucket, 'Key': export_key},
+            ExpiresIn=7 * 24 * 3600  # 7 days in seconds
+        )
+
+        logger.info(f"Exported {len(entries)} certificates to {export_key}")
+        return {
+            'export_key': export_key,
+            'export_url': signed_url,
+            'certificate_count': len(entries)
+        }
+
+    def _write_zip(self, entries, writer, errors):
+        """Write the archive into the pipe, copying each object as its chunks arrive."""
+        streams = [_ObjectStream(s3_key) for s3_key, _ in entries]
+        downloads = ThreadPoolExecutor(max_workers=PREFETCH_OBJECTS, thread_name_prefix='certificate-export-get')
+
+        try:
+            # The pool size bounds how many objects download ahead of the writer;
+            # each one blocks once PREFETCH_CHUNKS chunks are waiting
+            for stream in streams:
+                downloads.submit(self._download, stream)
+
+            with zipfile.ZipFile(writer, 'w') as archive:
+                for stream, (_, archive_name) in zip(streams, entries):
+                    compress_type = zipfile.ZIP_STORED if archive_name.endswith('.pdf') else zipfile.ZIP_DEFLATED
+                    info = zipfile.ZipInfo(archive_name, date_time=datetime.now().timetuple()[:6])
+                    info.compress_type = compress_type
+                    with archive.open(info, 'w', force_zip64=True) as entry:
+                        for chunk in stream:
+                            entry.write(chunk)
+        except Exception as e:
+            logger.error(f"Certificate archive writer failed: {str(e)}")
+            errors.append(e)
+        finally:
+            for stream in streams:
+                stream.cancelled.set()
+            downloads.shutdown(wait=False, cancel_futures=True)
+            try:
+                writer.close()
+            except OSError:
+                pass
+
+    def _download(self, stream):
+        """Copy one object into its chunk queue, decompressing objects stored with gzip content encoding."""
+        if stream.cancelled.is_set():
+            return
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=stream.s3_key)
+            body = response['Body']
+            # HTML_GZIP certificates are stored compressed; the archive holds the HTML itself
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if response.get('ContentEncoding') == 'gzip' else None
+            for chunk in body.iter_chunks(CHUNK_SIZE):
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                    if not chunk:
+                        continue
+                if not stream.put(chunk):
+                    body.close()
+                    return
+            if decompressor is not None:
+                tail = decompressor.flush()
+                if tail and not stream.put(tail):
+                    return
+            stream.put(_END)
+        except Exception as e:
+            stream.put(e)
+
+    def _list_keys(self, prefix):
+        """Yield every key under a prefix."""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+
+
+def export_handler(event, context):
+    """
+    Lambda entry point for certificate exports.
+
+    Accepts {"user_id": ...} for all of a user's certificates or
+    {"course_id": ...} for all certificates of a course.
+    """
+    try:
+        body = event.get('body', event)
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        exporter = CertificateExporter()
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+
+        if body.get('user_id'):
+            entries = exporter.list_user_certificates(body['user_id'])
+            export_key = f"exports/users/{body['user_id']}/certificates-{timestamp}.zip"
+        elif body.get('course_id'):
+            entries = exporter.list_course_certificates(body['course_id'])
+            export_key = f"exports/courses/{body['course_id']}/certificates-{timestamp}.zip"
+        else:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': 'user_id or course_id is required'})
+            }
+
+        if not entries:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': 'No certificates found'})
+            }
+
+        result = exporter.export(entries, export_key)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': True, **result})
+        }
+
+    except Exception as e:
+        logger.error(f"Certificate export failed: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': False,
+                'error': 'Internal server error occurred while exporting certificates'
+            })
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export stored certificates as a ZIP archive in S3')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--user-id', help='Export every certificate of this user')
+    target.add_argument('--course-id', help='Export every certificate issued for this course')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    event = {'user_id': args.user_id} if args.user_id else {'course_id': args.course_id}
+    response = export_handler(event, None)
+    print(json.dumps(json.loads(response['body']), indent=2))
+
+
+if __name__ == '__main__':
+    main()
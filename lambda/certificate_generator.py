@@ -5,15 +5,66 @@ Handles PDF generation using WeasyPrint and S3 upload operations.
 
 import os
 import io
+import json
+import hashlib
 import logging
-import boto3
-from datetime import datetime, timedelta
+import re
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML, CSS
+from weasyprint import HTML, CSS, __version__ as WEASYPRINT_VERSION
+from PIL import Image
 from botocore.exceptions import ClientError, NoCredentialsError
+from single_flight import SingleFlight
+from s3_keys import certificate_key, cohort_key, parse_certificate_key, preview_key, resolve_certificate_key
+from s3_client import get_s3_client, get_s3_metrics
+from stage_memory import BufferReader, stage_memory, utf8_size
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Only needed when preview images are enabled
+    pdfium = None
 
 logger = logging.getLogger(__name__)
 
+# Shared by every generator in the process so batch threads, worker loops and
+# warm Lambda invocations all coalesce duplicate requests for the same certificate
+certificate_flight = SingleFlight(result_ttl=float(os.getenv('COALESCE_TTL_SECONDS', '30')))
+
+# Input fields that appear in the rendered certificate
+FINGERPRINT_FIELDS = ('recipient_name', 'course_title', 'tier_level', 'tier_name', 'completion_date', 'certificate_number')
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.woff', '.woff2')
+
+# Stands in for the tier color when cohort PDFs extract the template's accent rules
+ACCENT_PLACEHOLDER = '#ACCE17'
+
+# Preview images rasterized from the first page of the rendered PDF, as (width, height).
+# A height of None keeps the page's aspect ratio; otherwise the page is centered on a canvas.
+PREVIEW_PRESETS = {
+    'thumbnail': (320, None),   # WordPress dashboard
+    'share': (1200, 627)        # LinkedIn / Open Graph
+}
+PREVIEW_BACKGROUND = '#f5f7fa'
+
+# WeasyPrint options per PDF size optimization level
+PDF_OPTIMIZATION_LEVELS = {
+    # Fonts embedded whole and content streams left uncompressed
+    'none': {'full_fonts': True, 'uncompressed_pdf': True},
+    # Fonts subset to the glyphs used, compressed streams, losslessly optimized images
+    'standard': {'optimize_images': True},
+    # Additionally re-encode images as JPEG and downsample them to 150 dpi
+    'max': {'optimize_images': True, 'jpeg_quality': 80, 'dpi': 150}
+}
+PDF_OPTIMIZATION = os.getenv('PDF_OPTIMIZATION', 'standard')
+
+# Also serialize every PDF with WeasyPrint's default options, as before optimization levels, to record the size change
+PDF_SIZE_REPORT = os.getenv('PDF_SIZE_REPORT', 'false').lower() == 'true'
+
+# Comma-separated presets generated with every certificate, e.g. "thumbnail,share"
+CERTIFICATE_PREVIEWS = tuple(name.strip() for name in os.getenv('CERTIFICATE_PREVIEWS', '').split(',') if name.strip())
+
 class CertificateGenerator:
     """
     Handles certificate PDF generation and S3 upload operations.
@@ -24,9 +75,9 @@ class CertificateGenerator:
         self.s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
         self.s3_region = os.getenv('S3_REGION', 'us-east-1')
         
-        # Initialize S3 client
+        # Use the process-wide S3 client so all generators share one adaptive rate limiter
         try:
-            self.s3_client = boto3.client('s3', region_name=self.s3_region)
+            self.s3_client = get_s3_client(self.s3_region)
         except Exception as e:
             logger.error(f"Failed to initialize S3 client: {str(e)}")
             raise
@@ -41,11 +92,38 @@ class CertificateGenerator:
             2: '#95A5A6',  # Silver/Gray for Mastery  
             3: '#F39C12'   # Gold for Elite
         }
+        
+        self.tier_names = {
+            1: 'Foundation Program',
+            2: 'Mastery Program',
+            3: 'Elite Program'
+        }
+        
+        if PDF_OPTIMIZATION not in PDF_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown PDF optimization level: {PDF_OPTIMIZATION}")
+        self.pdf_optimization = PDF_OPTIMIZATION
+        
+        self.template_hash = self._compute_template_hash()
+        self.render_fingerprint = self._compute_render_fingerprint(template_dir)
+        
+        unknown = [name for name in CERTIFICATE_PREVIEWS if name not in PREVIEW_PRESETS]
+        if unknown:
+            raise ValueError(f"Unknown preview presets: {', '.join(unknown)}")
+        self.preview_presets = CERTIFICATE_PREVIEWS
+        
+        # Images are loaded once per process and embedded once per PDF
+        self.image_cache = {}
+        self.pdf_size_metrics = {'level': self.pdf_optimization, 'pdfs': 0, 'bytes': 0, 'baseline_pdfs': 0, 'baseline_bytes': 0}
+        self._metrics_lock = threading.Lock()
     
     def generate_certificate(self, certificate_data):
         """
         Generate a certificate PDF and upload to S3.
         
+        Concurrent or rapidly repeated requests for the same user, course,
+        template and render inputs are coalesced: only the first one renders
+        and uploads, the others receive its result.
+        
         Args:
             certificate_data (dict): Certificate information including recipient name, course, etc.
             
@@ -53,36 +131,384 @@ class CertificateGenerator:
             dict: Result containing success status, certificate URL, or error message
         """
         try:
-            logger.info(f"Generating certificate for {certificate_data['recipient_name']}")
+            flight_key = (certificate_data['user_id'], certificate_data['course_id'],
+                          self.certificate_fingerprint(certificate_data), self.preview_presets)
+            result, shared = certificate_flight.do(flight_key, self._render_and_upload, certificate_data)
             
-            # Add color scheme based on tier
-            certificate_data['accent_color'] = self.tier_colors.get(certificate_data['tier_level'], '#4A90E2')
+            if shared:
+                logger.info(f"Reused in-flight certificate for user {flight_key[0]}, course {flight_key[1]}")
             
-            # Generate HTML from template
-            html_content = self._render_template(certificate_data)
+            if stage_memory.profiling:
+                logger.info(f"Memory profile: {json.dumps(stage_memory.profile_report())}")
             
-            # Convert HTML to PDF
-            pdf_content = self._html_to_pdf(html_content)
+            return dict(result)
             
-            # Upload to S3
-            s3_key = self._generate_s3_key(certificate_data)
-            certificate_url = self._upload_to_s3(pdf_content, s3_key)
+        except Exception as e:
+            logger.error(f"Certificate generation failed: {str(e)}", exc_info=True)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _render_and_upload(self, certificate_data):
+        """
+        Render the certificate PDF and upload it to S3.
+        
+        Args:
+            certificate_data (dict): Certificate information including recipient name, course, etc.
+            
+        Returns:
+            dict: Successful result with certificate URL and S3 key
+        """
+        logger.info(f"Generating certificate for {certificate_data['recipient_name']}")
+        
+        # The upload reads the render buffer in place instead of a bytes copy of it
+        buffer = io.BytesIO()
+        pdf_size = self.render_pdf_into(certificate_data, buffer)
+        
+        with stage_memory.track('pdf', pdf_size), stage_memory.profile('upload'):
+            pdf_view = buffer.getbuffer()
+            try:
+                result = self.upload_certificate(pdf_view, certificate_data)
+            finally:
+                pdf_view.release()
+        
+        logger.info(f"Certificate generated successfully: {result['certificate_url']}")
+        return result
+    
+    def render_pdf(self, certificate_data):
+        """
+        Render a certificate PDF without uploading it.
+        
+        Args:
+            certificate_data (dict): Certificate information including recipient name, course, etc.
             
-            logger.info(f"Certificate generated successfully: {certificate_url}")
+        Returns:
+            bytes: PDF content
+        """
+        buffer = io.BytesIO()
+        self.render_pdf_into(certificate_data, buffer)
+        return buffer.getvalue()
+    
+    def render_pdf_into(self, certificate_data, buffer):
+        """
+        Render a certificate PDF into a writable file-like object.
+        
+        Args:
+            certificate_data (dict): Certificate information including recipient name, course, etc.
+            buffer: Writable binary file-like object, e.g. io.BytesIO
+            
+        Returns:
+            int: Bytes written
+        """
+        # Add color scheme and tier name based on tier
+        certificate_data['accent_color'] = self.tier_colors.get(certificate_data['tier_level'], '#4A90E2')
+        certificate_data.setdefault('tier_name', self.tier_names.get(certificate_data['tier_level'], 'Unknown Program'))
+        
+        # Generate HTML from template and convert it to PDF; the HTML is dropped once laid out
+        return self._html_to_pdf(self._render_template(certificate_data), buffer)
+    
+    def upload_certificate(self, pdf_content, certificate_data, previews=None):
+        """
+        Upload a rendered certificate PDF to its S3 key.
+        
+        When preview presets are enabled, the first page is rasterized while
+        the PDF uploads and every image is uploaded in parallel.
+        
+        Args:
+            pdf_content (bytes): PDF content from render_pdf, or a buffer such as a memoryview of the render buffer
+            certificate_data (dict): Certificate data containing user_id, course_id and certificate_number
+            previews (tuple): Preview presets to generate; defaults to CERTIFICATE_PREVIEWS
+            
+        Returns:
+            dict: Successful result with certificate URL and S3 key, plus a
+                'previews' mapping of preset to S3 key and URL when enabled
+        """
+        s3_key = self._generate_s3_key(certificate_data)
+        fingerprint = self.certificate_fingerprint(certificate_data)
+        previews = self.preview_presets if previews is None else previews
+        
+        if not previews:
+            with BufferReader(pdf_content) as pdf_reader:
+                certificate_url = self._upload_to_s3(pdf_reader, s3_key, fingerprint)
             
             return {
                 'success': True,
                 'certificate_url': certificate_url,
                 's3_key': s3_key
             }
+        
+        with ThreadPoolExecutor(max_workers=1 + len(previews)) as executor, BufferReader(pdf_content) as pdf_reader:
+            pdf_upload = executor.submit(self._upload_to_s3, pdf_reader, s3_key, fingerprint)
+            
+            image_uploads = {}
+            for name, image in self.render_previews(pdf_content, previews).items():
+                image_key = preview_key(
+                    certificate_data['user_id'], certificate_data['course_id'], certificate_data['certificate_number'], name
+                )
+                image_uploads[name] = (image_key, executor.submit(self._upload_to_s3, image, image_key, fingerprint, 'image/png'))
+            
+            certificate_url = pdf_upload.result()
+            preview_results = {
+                name: {'s3_key': image_key, 'url': upload.result()}
+                for name, (image_key, upload) in image_uploads.items()
+            }
+        
+        return {
+            'success': True,
+            'certificate_url': certificate_url,
+            's3_key': s3_key,
+            'previews': preview_results
+        }
+    
+    def render_previews(self, pdf_content, presets):
+        """
+        Rasterize the first page of a rendered PDF into preview images.
+        
+        The page is rasterized once, at the resolution the largest preset
+        needs, and scaled down for the others. The certificate is not laid
+        out again.
+        
+        Args:
+            pdf_content (bytes): PDF content from render_pdf, or a buffer over it
+            presets (tuple): Names from PREVIEW_PRESETS
+            
+        Returns:
+            dict: Preset name to PNG bytes
+        """
+        if pdfium is None:
+            raise Exception("pypdfium2 is required for certificate previews")
+        
+        # Reads the PDF through its own reader so it can run while the PDF uploads
+        with BufferReader(pdf_content) as pdf_reader:
+            pdf = pdfium.PdfDocument(pdf_reader)
+            try:
+                page = pdf[0]
+                page_width, page_height = page.get_size()
+                
+                scales = {name: self._preview_scale(PREVIEW_PRESETS[name], page_width, page_height) for name in presets}
+                max_scale = max(scales.values())
+                page_image = page.render(scale=max_scale).to_pil().convert('RGB')
+                page.close()
+            finally:
+                pdf.close()
+        
+        images = {}
+        for name in presets:
+            width, height = PREVIEW_PRESETS[name]
+            ratio = scales[name] / max_scale
+            image = page_image.resize(
+                (max(1, round(page_image.width * ratio)), max(1, round(page_image.height * ratio))),
+                Image.LANCZOS
+            )
+            
+            if height is not None:
+                canvas = Image.new('RGB', (width, height), PREVIEW_BACKGROUND)
+                canvas.paste(image, ((width - image.width) // 2, (height - image.height) // 2))
+                image = canvas
+            
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG', optimize=True)
+            images[name] = buffer.getvalue()
+        
+        logger.info(f"Rendered previews: {', '.join(f'{name} ({len(data)} bytes)' for name, data in images.items())}")
+        return images
+    
+    def _preview_scale(self, size, page_width, page_height):
+        """Return the scale from PDF points to pixels that fits a page into a preset size."""
+        width, height = size
+        if height is None:
+            return width / page_width
+        return min(width / page_width, height / page_height)
+    
+    def render_cohort_pdf(self, certificates):
+        """
+        Render the certificates of a whole cohort into one multi-page PDF.
+        
+        Args:
+            certificates (list): Certificate data dicts, in page order
+            
+        Returns:
+            bytes: PDF content
+        """
+        buffer = io.BytesIO()
+        self.render_cohort_pdf_into(certificates, buffer)
+        return buffer.getvalue()
+    
+    def render_cohort_pdf_into(self, certificates, buffer):
+        """
+        Render the certificates of a whole cohort into one multi-page PDF in a buffer.
+        
+        All recipients are laid out as a single HTML document with one page
+        each, so the stylesheet is parsed and fonts are subset and embedded
+        once instead of once per certificate. Each page carries a ``tier-N``
+        class that selects its accent color, so mixed-tier cohorts in any
+        order still render as one document.
+        
+        Args:
+            certificates (list): Certificate data dicts, in page order; they are not modified
+            buffer: Writable binary file-like object, e.g. io.BytesIO
+            
+        Returns:
+            int: Bytes written
+        """
+        if not certificates:
+            raise ValueError("A cohort needs at least one certificate")
+        
+        cohort = []
+        for certificate_data in certificates:
+            certificate_data = dict(certificate_data)
+            certificate_data['accent_color'] = self.tier_colors.get(certificate_data['tier_level'], '#4A90E2')
+            certificate_data.setdefault('tier_name', self.tier_names.get(certificate_data['tier_level'], 'Unknown Program'))
+            cohort.append(certificate_data)
+        tier_levels = list(dict.fromkeys(certificate_data['tier_level'] for certificate_data in cohort))
+        
+        try:
+            logger.info(f"Rendering cohort PDF with {len(cohort)} certificates in {len(tier_levels)} tier(s)")
+            
+            stylesheets = [
+                CSS(string=self._get_pdf_css()),
+                CSS(string=self._get_cohort_css()),
+                CSS(string=self._get_cohort_tier_css(tier_levels))
+            ]
+            document = HTML(string=self._render_cohort_html(cohort)).render(stylesheets=stylesheets, **self._pdf_options())
+            pdf_size = self._write_pdf(document, buffer)
+            
+            logger.info(f"Cohort PDF generated successfully, {len(document.pages)} pages, size: {pdf_size} bytes")
+            return pdf_size
+            
+        except Exception as e:
+            logger.error(f"Cohort PDF generation failed: {str(e)}")
+            raise Exception(f"Failed to generate cohort PDF: {str(e)}")
+    
+    def generate_cohort_certificate(self, course_id, cohort_id, certificates):
+        """
+        Render a cohort PDF and upload it once to S3.
+        
+        Args:
+            course_id: Course ID
+            cohort_id (str): Label of the course run, e.g. 2024-10
+            certificates (list): Certificate data dicts, in page order
+            
+        Returns:
+            dict: Result containing success status, certificate URL, page count and size, or error message
+        """
+        try:
+            buffer = io.BytesIO()
+            pdf_size = self.render_cohort_pdf_into(certificates, buffer)
+            s3_key = cohort_key(course_id, cohort_id)
+            
+            with stage_memory.track('cohort_pdf', pdf_size), BufferReader(buffer.getbuffer()) as pdf_reader:
+                certificate_url = self._upload_to_s3(pdf_reader, s3_key)
+            
+            return {
+                'success': True,
+                'certificate_url': certificate_url,
+                's3_key': s3_key,
+                'page_count': len(certificates),
+                'size_bytes': pdf_size
+            }
             
         except Exception as e:
-            logger.error(f"Certificate generation failed: {str(e)}", exc_info=True)
+            logger.error(f"Cohort certificate generation failed: {str(e)}", exc_info=True)
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def _compute_template_hash(self):
+        """
+        Hash the certificate template and PDF stylesheet.
+        
+        Returns:
+            str: Short hex digest identifying the current template version
+        """
+        source, _, _ = self.template_env.loader.get_source(self.template_env, 'certificate_template.html')
+        digest = hashlib.sha256(source.encode('utf-8'))
+        digest.update(self._get_pdf_css().encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def _compute_render_fingerprint(self, template_dir):
+        """
+        Hash everything besides the input fields that affects the rendered PDF.
+        
+        Covers the template and stylesheet, tier colors and names, any font
+        files shipped next to the template, the WeasyPrint version and the
+        PDF optimization level.
+        
+        Args:
+            template_dir (str): Directory holding the certificate template
+            
+        Returns:
+            str: Hex digest of the render environment
+        """
+        digest = hashlib.sha256(self.template_hash.encode('utf-8'))
+        digest.update(json.dumps([self.tier_colors, self.tier_names], sort_keys=True).encode('utf-8'))
+        digest.update(WEASYPRINT_VERSION.encode('utf-8'))
+        digest.update(json.dumps(PDF_OPTIMIZATION_LEVELS[self.pdf_optimization], sort_keys=True).encode('utf-8'))
+        
+        for root, _, files in sorted(os.walk(template_dir)):
+            for name in sorted(files):
+                if name.lower().endswith(FONT_EXTENSIONS):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        digest.update(name.encode('utf-8'))
+                        digest.update(f.read())
+        
+        return digest.hexdigest()
+    
+    def certificate_fingerprint(self, certificate_data):
+        """
+        Fingerprint the output a certificate would have if rendered now.
+        
+        Two renders with the same fingerprint produce the same PDF, so a
+        stored certificate whose fingerprint matches does not need
+        regenerating.
+        
+        Args:
+            certificate_data (dict): Certificate information including recipient name, course, etc.
+            
+        Returns:
+            str: Hex fingerprint stored in the object's S3 metadata
+        """
+        fields = {field: str(certificate_data.get(field, '')) for field in FINGERPRINT_FIELDS}
+        if not certificate_data.get('tier_name'):
+            fields['tier_name'] = self.tier_names.get(certificate_data['tier_level'], 'Unknown Program')
+        
+        digest = hashlib.sha256(self.render_fingerprint.encode('utf-8'))
+        digest.update(json.dumps(fields, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()[:32]
+    
+    def get_stored_fingerprint(self, certificate_data):
+        """
+        Read the fingerprint of the stored certificate with a HEAD request.
+        
+        Args:
+            certificate_data (dict): Certificate data containing user_id, course_id and certificate_number
+            
+        Returns:
+            str: Stored fingerprint, or None if the object is missing or predates fingerprints
+        """
+        try:
+            response = self.s3_client.head_object(Bucket=self.s3_bucket, Key=self._generate_s3_key(certificate_data))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        
+        return response.get('Metadata', {}).get('fingerprint')
+    
+    def is_current(self, certificate_data):
+        """
+        Check whether the stored certificate already matches the current template and inputs.
+        
+        Args:
+            certificate_data (dict): Certificate information including recipient name, course, etc.
+            
+        Returns:
+            bool: True if regenerating would produce the same PDF
+        """
+        return self.get_stored_fingerprint(certificate_data) == self.certificate_fingerprint(certificate_data)
+    
     def _render_template(self, certificate_data):
         """
         Render the certificate HTML template with the provided data.
@@ -107,15 +533,101 @@ class CertificateGenerator:
             logger.error(f"Template rendering failed: {str(e)}")
             raise Exception(f"Failed to render certificate template: {str(e)}")
     
-    def _html_to_pdf(self, html_content):
+    def _render_cohort_html(self, certificates):
+        """
+        Render the certificates of a cohort into a single HTML document.
+        
+        The template is rendered per recipient and the certificate markup of
+        every body is placed under the head of the first one. Accent colors
+        of other tiers come from _get_cohort_tier_css.
+        
+        Args:
+            certificates (list): Certificate data dicts with their accent color set
+            
+        Returns:
+            str: HTML content with one certificate per page
+        """
+        bodies = []
+        head = tail = ''
+        
+        for certificate_data in certificates:
+            html_content = self._render_template(certificate_data)
+            before, _, rest = html_content.partition('<body>')
+            body, _, after = rest.rpartition('</body>')
+            if not head:
+                head, tail = before, after
+            bodies.append(body)
+        
+        return f"{head}<body>{''.join(bodies)}</body>{tail}"
+    
+    def _get_cohort_tier_css(self, tier_levels):
+        """
+        Return the template's accent-color rules once per tier, scoped to that tier's pages.
+        
+        The template's stylesheet is rendered with a placeholder color, and
+        every declaration using it is repeated under ``.certificate.tier-N``
+        with the tier's color, which outranks the unscoped rule in the head.
+        
+        Args:
+            tier_levels (list): Tier levels present in the cohort
+            
+        Returns:
+            str: CSS content for cohort PDFs
+        """
+        template = self.template_env.get_template('certificate_template.html')
+        style = template.render(accent_color=ACCENT_PLACEHOLDER).partition('<style>')[2].partition('</style>')[0]
+        style = re.sub(r'/\*.*?\*/', '', style, flags=re.DOTALL)
+        
+        accent_rules = []
+        for selector, declarations in re.findall(r'([^{};]+)\{([^{}]*)\}', style):
+            accent = [declaration.strip() for declaration in declarations.split(';') if ACCENT_PLACEHOLDER in declaration]
+            if accent:
+                accent_rules.append(([part.strip() for part in selector.split(',')], '; '.join(accent)))
+        
+        css = []
+        for tier_level in tier_levels:
+            scope = f".certificate.tier-{tier_level}"
+            color = self.tier_colors.get(tier_level, '#4A90E2')
+            for selectors, declarations in accent_rules:
+                scoped = ', '.join(
+                    scope + selector[len('.certificate'):] if selector.startswith('.certificate') else f"{scope} {selector}"
+                    for selector in selectors
+                )
+                css.append(f"{scoped} {{ {declarations.replace(ACCENT_PLACEHOLDER, color)} }}")
+        
+        return '\n'.join(css)
+    
+    def _get_cohort_css(self):
+        """
+        Return CSS that places each certificate of a cohort document on its own page.
+        
+        Returns:
+            str: CSS content for cohort PDFs
+        """
+        return """
+        body {
+            display: block;
+        }
+        
+        .certificate {
+            break-after: page;
+        }
+        
+        .certificate:last-child {
+            break-after: auto;
+        }
+        """
+    
+    def _html_to_pdf(self, html_content, buffer):
         """
         Convert HTML content to PDF using WeasyPrint.
         
         Args:
             html_content (str): HTML content to convert
+            buffer: Writable binary file-like object the PDF is written into
             
         Returns:
-            bytes: PDF content as bytes
+            int: PDF size in bytes
         """
         try:
             logger.info("Converting HTML to PDF")
@@ -123,17 +635,65 @@ class CertificateGenerator:
             # Create CSS for better styling
             css_content = CSS(string=self._get_pdf_css())
             
-            # Generate PDF
-            html_doc = HTML(string=html_content)
-            pdf_bytes = html_doc.write_pdf(stylesheets=[css_content])
+            # Lay out once, then serialize with the configured optimization level
+            with stage_memory.profile('render'), stage_memory.track('html', utf8_size(html_content)):
+                document = HTML(string=html_content).render(stylesheets=[css_content], **self._pdf_options())
+            del html_content
+            
+            with stage_memory.profile('pdf'):
+                pdf_size = self._write_pdf(document, buffer)
             
-            logger.info(f"PDF generated successfully, size: {len(pdf_bytes)} bytes")
-            return pdf_bytes
+            logger.info(f"PDF generated successfully, size: {pdf_size} bytes")
+            return pdf_size
             
         except Exception as e:
             logger.error(f"PDF generation failed: {str(e)}")
             raise Exception(f"Failed to generate PDF: {str(e)}")
     
+    def _pdf_options(self):
+        """
+        Return the WeasyPrint options for the configured optimization level.
+        
+        Returns:
+            dict: Options accepted by HTML.render and Document.write_pdf
+        """
+        return dict(PDF_OPTIMIZATION_LEVELS[self.pdf_optimization], cache=self.image_cache)
+    
+    def _write_pdf(self, document, buffer):
+        """
+        Serialize a laid-out document into a buffer and record its size.
+        
+        With PDF_SIZE_REPORT enabled the same document is also serialized
+        with WeasyPrint's default options, as every PDF was written before
+        optimization levels existed, so before and after sizes come from one
+        layout.
+        
+        Args:
+            document: WeasyPrint Document from HTML.render
+            buffer: Writable binary file-like object
+            
+        Returns:
+            int: PDF size in bytes
+        """
+        start = buffer.tell()
+        document.write_pdf(buffer, **self._pdf_options())
+        pdf_size = buffer.tell() - start
+        baseline_size = None
+        
+        if PDF_SIZE_REPORT:
+            baseline_size = len(document.write_pdf())
+            logger.info(f"PDF size optimization ({self.pdf_optimization}): {baseline_size} bytes with default options "
+                        f"-> {pdf_size} bytes ({100 - pdf_size * 100 / baseline_size:.0f}% smaller)")
+        
+        with self._metrics_lock:
+            self.pdf_size_metrics['pdfs'] += 1
+            self.pdf_size_metrics['bytes'] += pdf_size
+            if baseline_size is not None:
+                self.pdf_size_metrics['baseline_pdfs'] += 1
+                self.pdf_size_metrics['baseline_bytes'] += baseline_size
+        
+        return pdf_size
+    
     def _get_pdf_css(self):
         """
         Return additional CSS for PDF generation optimization.
@@ -180,15 +740,17 @@ class CertificateGenerator:
         course_id = certificate_data['course_id']
         cert_number = certificate_data['certificate_number']
         
-        return f"certificates/{user_id}/{course_id}/cert-{cert_number}.pdf"
+        return certificate_key(user_id, course_id, cert_number, 'pdf')
     
-    def _upload_to_s3(self, pdf_content, s3_key):
+    def _upload_to_s3(self, pdf_content, s3_key, fingerprint=None, content_type='application/pdf'):
         """
         Upload PDF content to S3 and return signed URL.
         
         Args:
-            pdf_content (bytes): PDF content to upload
+            pdf_content: PDF content to upload, as bytes or a readable file-like object
             s3_key (str): S3 key for the file
+            fingerprint (str): Render fingerprint to store in the object metadata
+            content_type (str): MIME type, e.g. image/png for previews
             
         Returns:
             str: Signed URL for the uploaded certificate
@@ -201,11 +763,12 @@ class CertificateGenerator:
                 Bucket=self.s3_bucket,
                 Key=s3_key,
                 Body=pdf_content,
-                ContentType='application/pdf',
+                ContentType=content_type,
                 ServerSideEncryption='AES256',
                 Metadata={
                     'generated_at': datetime.now().isoformat(),
-                    'generator': 'clarity-aws-ghl-lambda'
+                    'generator': 'clarity-aws-ghl-lambda',
+                    'fingerprint': fingerprint or ''
                 }
             )
             
@@ -217,6 +780,11 @@ class CertificateGenerator:
             )
             
             logger.info(f"Certificate uploaded successfully: {signed_url}")
+            
+            s3_metrics = self.get_s3_metrics()
+            if s3_metrics.get('throttled_responses'):
+                logger.info(f"S3 throttling metrics: {s3_metrics}")
+            
             return signed_url
             
         except NoCredentialsError:
@@ -238,6 +806,44 @@ class CertificateGenerator:
             logger.error(f"Unexpected error during S3 upload: {str(e)}")
             raise Exception(f"Failed to upload certificate to S3: {str(e)}")
     
+    def get_s3_metrics(self):
+        """
+        Get send-rate and throttling metrics for the shared S3 client.
+        
+        Returns:
+            dict: Attempt and throttle counts plus the adaptive limiter's current send rate
+        """
+        return get_s3_metrics(self.s3_region)
+    
+    def get_memory_metrics(self):
+        """
+        Get per-stage memory accounting for this process.
+        
+        Returns:
+            dict: Artifact sizes per stage ('html', 'pdf', 'cohort_pdf', plus 'upload' from the HTML handler)
+                and the peak bytes held by all stages at once
+        """
+        return stage_memory.snapshot()
+    
+    def get_pdf_size_metrics(self):
+        """
+        Get PDF output size metrics for this generator.
+        
+        Returns:
+            dict: Optimization level, number and total bytes of PDFs written,
+                and with PDF_SIZE_REPORT the total for the same PDFs written with default options
+        """
+        with self._metrics_lock:
+            metrics = dict(self.pdf_size_metrics)
+        
+        if metrics['pdfs']:
+            metrics['average_bytes'] = round(metrics['bytes'] / metrics['pdfs'])
+        if metrics['baseline_pdfs']:
+            metrics['average_baseline_bytes'] = round(metrics['baseline_bytes'] / metrics['baseline_pdfs'])
+            metrics['size_reduction_percent'] = round(100 - metrics['average_bytes'] * 100 / metrics['average_baseline_bytes'], 1)
+        
+        return metrics
+    
     def test_s3_connection(self):
         """
         Test S3 connection and permissions.
@@ -274,32 +880,59 @@ class CertificateGenerator:
                 'error': str(e)
             }
     
+    def get_certificate_url(self, user_id, course_id, certificate_number):
+        """
+        Return a fresh signed URL for an existing certificate in either key layout.
+        
+        Args:
+            user_id: WordPress user ID
+            course_id: Course ID
+            certificate_number (str): Certificate number
+            
+        Returns:
+            str: Signed URL, or None if the certificate does not exist
+        """
+        s3_key = resolve_certificate_key(self.s3_client, self.s3_bucket, user_id, course_id, certificate_number)
+        if s3_key is None:
+            return None
+        
+        return self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.s3_bucket, 'Key': s3_key},
+            ExpiresIn=7 * 24 * 3600  # 7 days in seconds
+        )
+    
     def get_certificate_stats(self):
         """
         Get statistics about generated certificates in S3.
         
+        Counts certificates in both the legacy and hash-partitioned key layouts.
+        
         Returns:
             dict: Statistics about certificates
         """
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.s3_bucket,
-                Prefix='certificates/'
-            )
+            paginator = self.s3_client.get_paginator('list_objects_v2')
             
-            if 'Contents' not in response:
-                return {
-                    'total_certificates': 0,
-                    'total_size_mb': 0
-                }
+            total_certificates = 0
+            total_size = 0
+            by_layout = {'legacy': 0, 'hashed': 0}
+            
+            for page in paginator.paginate(Bucket=self.s3_bucket, Prefix='certificates/'):
+                for obj in page.get('Contents', []):
+                    parsed = parse_certificate_key(obj['Key'])
+                    if parsed is None:
+                        continue
+                    total_certificates += 1
+                    total_size += obj['Size']
+                    by_layout[parsed['layout']] += 1
             
-            total_certificates = len(response['Contents'])
-            total_size = sum(obj['Size'] for obj in response['Contents'])
             total_size_mb = round(total_size / (1024 * 1024), 2)
             
             return {
                 'total_certificates': total_certificates,
                 'total_size_mb': total_size_mb,
+                'certificates_by_layout': by_layout,
                 'bucket': self.s3_bucket
             }
             
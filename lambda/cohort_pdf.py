@@ -0,0 +1,126 @@
+"""
+Cohort PDF
+Builds one printable multi-page PDF with every certificate of a course run.
+
+Reads the same enrollments export as backfill.py, keeps the rows of one
+course (optionally only those completed within a date range), and renders
+them as a single WeasyPrint document with one page per recipient, sorted by
+name. The result is uploaded once to cohorts/{course_id}/cohort-{cohort}.pdf,
+or written locally with --output.
+
+With --compare, every certificate is also rendered as a separate PDF and
+the total size and render time are reported next to the cohort PDF's.
+
+Usage:
+    python cohort_pdf.py enrollments.csv --course-id 456 --cohort 2024-10 [--from 2024-10-01] [--to 2024-10-31]
+                         [--output cohort.pdf] [--compare]
+"""
+
+import argparse
+import logging
+import time
+
+from backfill import build_certificate_data, read_enrollments
+from certificate_generator import CertificateGenerator
+
+logger = logging.getLogger('cohort_pdf')
+
+
+def load_cohort(path, course_id, date_from=None, date_to=None, input_format=None):
+    """
+    Collect the certificate data of one course run from an enrollments export.
+
+    Args:
+        path (str): CSV or NDJSON export of the enrollments table
+        course_id: Course ID
+        date_from (str): Earliest completion date, YYYY-mm-dd
+        date_to (str): Latest completion date, YYYY-mm-dd
+        input_format (str): 'csv' or 'ndjson'; inferred from the extension when omitted
+
+    Returns:
+        list: Certificate data dicts sorted by recipient name
+    """
+    certificates = []
+
+    for row in read_enrollments(path, input_format):
+        if str(row.get('course_id')) != str(course_id):
+            continue
+
+        completed = str(row.get('completion_date', ''))[:10]
+        if (date_from and completed < date_from) or (date_to and completed > date_to):
+            continue
+
+        try:
+            certificate_data = build_certificate_data(row)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid enrollment row {row}: {e}")
+            continue
+
+        if certificate_data is not None:
+            certificates.append(certificate_data)
+
+    return sorted(certificates, key=lambda data: data['recipient_name'].lower())
+
+
+def compare_with_separate(generator, certificates):
+    """
+    Render every certificate as its own PDF for comparison.
+
+    Returns:
+        tuple: (total bytes, seconds)
+    """
+    start = time.monotonic()
+    total = sum(len(generator.render_pdf(dict(certificate_data))) for certificate_data in certificates)
+    return total, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render every certificate of a course run into one PDF')
+    parser.add_argument('input', help='CSV or NDJSON export of the enrollments table')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from extension)')
+    parser.add_argument('--course-id', required=True, help='Course to include')
+    parser.add_argument('--cohort', required=True, help='Label of the course run, used in the S3 key')
+    parser.add_argument('--from', dest='date_from', help='Earliest completion date (YYYY-mm-dd)')
+    parser.add_argument('--to', dest='date_to', help='Latest completion date (YYYY-mm-dd)')
+    parser.add_argument('--output', help='Write the PDF to this path instead of uploading it')
+    parser.add_argument('--compare', action='store_true', help='Also render separate PDFs and report size and time')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    logging.getLogger('certificate_generator').setLevel(logging.WARNING)
+
+    certificates = load_cohort(args.input, args.course_id, args.date_from, args.date_to, args.format)
+    if not certificates:
+        logger.error(f"No issued certificates found for course {args.course_id}")
+        raise SystemExit(1)
+
+    generator = CertificateGenerator()
+
+    start = time.monotonic()
+    if args.output:
+        pdf_content = generator.render_cohort_pdf([dict(certificate_data) for certificate_data in certificates])
+        with open(args.output, 'wb') as f:
+            f.write(pdf_content)
+        cohort_size = len(pdf_content)
+        logger.info(f"Wrote {len(certificates)} pages to {args.output}")
+    else:
+        result = generator.generate_cohort_certificate(
+            args.course_id, args.cohort, [dict(certificate_data) for certificate_data in certificates]
+        )
+        if not result['success']:
+            logger.error(result['error'])
+            raise SystemExit(1)
+        cohort_size = result['size_bytes']
+        logger.info(f"Uploaded {result['page_count']} pages to {result['s3_key']}: {result['certificate_url']}")
+    cohort_seconds = time.monotonic() - start
+
+    logger.info(f"Cohort PDF: {cohort_size / 1024:.1f} KB in {cohort_seconds:.1f}s")
+
+    if args.compare:
+        separate_size, separate_seconds = compare_with_separate(generator, certificates)
+        logger.info(f"Separate PDFs: {separate_size / 1024:.1f} KB in {separate_seconds:.1f}s "
+                    f"({separate_size / max(cohort_size, 1):.1f}x larger, {separate_seconds / max(cohort_seconds, 1e-9):.1f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
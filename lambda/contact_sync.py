@@ -0,0 +1,152 @@
+"""
+Contact Sync
+Bulk-syncs GHL contacts from stored webhook events into the plugin's clarity_ghl_contacts table.
+
+The plugin upserts contacts one webhook at a time, with a lookup query per
+event. For initial imports and catch-ups this job:
+
+1. reads the contact events (every event type routed as a contact event
+   in webhook_routing) of a date range from archive parts, segments and
+   uncompacted webhooks/ objects (see webhook_replay.ArchiveReader);
+2. collapses them in memory to the latest state per ghl_contact_id;
+3. writes the result with multi-row upserts of --batch-size rows per
+   statement and transaction (see ghl_contacts).
+
+Rerunning a range is safe, since upserts are keyed by ghl_contact_id.
+
+Usage:
+    python contact_sync.py --from 2025-09-01 [--to 2025-09-30] [--db sqlite:///contacts.db] [--batch-size 500] [--dry-run]
+"""
+
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from ghl_contacts import CONTACT_UPSERT_BATCH_SIZE, ContactsDatabase, collapse_contacts
+from webhook_replay import ArchiveReader, parse_time
+from webhook_routing import ROUTES
+
+logger = logging.getLogger('contact_sync')
+
+# Event types that carry contact data
+CONTACT_EVENT_TYPES = sorted(event_type for event_type, route in ROUTES.items() if route.is_contact)
+
+
+def sync_contacts(start, end, database=None, batch_size=CONTACT_UPSERT_BATCH_SIZE, fetch_workers=32, dry_run=False):
+    """
+    Upsert the latest state of every contact with events received in [start, end).
+
+    Args:
+        start (datetime): Earliest receive time (UTC)
+        end (datetime): Receive time to stop before (UTC)
+        database (ContactsDatabase): Target database; defaults to CONTACTS_DB_URL
+        batch_size (int): Rows per upsert statement
+        fetch_workers (int): Concurrent S3 reads
+        dry_run (bool): Collapse but do not write
+
+    Returns:
+        dict: Event and contact counts and timings
+    """
+    started = time.perf_counter()
+    events = 0
+
+    def counted(records):
+        nonlocal events
+        for record in records:
+            events += 1
+            yield record
+
+    reader = ArchiveReader(fetch_workers)
+    contacts = collapse_contacts(counted(reader.events(start, end, CONTACT_EVENT_TYPES)))
+    read_seconds = time.perf_counter() - started
+
+    written = 0
+    if not dry_run and contacts:
+        written = (database or ContactsDatabase()).upsert_contacts(list(contacts.values()), batch_size)
+    write_seconds = time.perf_counter() - started - read_seconds
+
+    logger.info(f"{events} contact events -> {len(contacts)} contacts; wrote {written} rows in "
+                f"{write_seconds:.2f}s ({written / write_seconds if write_seconds else 0:.0f} rows/s)")
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'events': events,
+        'contacts': len(contacts),
+        'rows_written': written,
+        'read_seconds': round(read_seconds, 2),
+        'write_seconds': round(write_seconds, 2)
+    }
+
+
+def contact_sync_handler(event, context):
+    """
+    Lambda entry point for scheduled contact catch-ups.
+
+    Syncs {"from": ..., "to": ...} (YYYY-mm-dd or ISO datetimes), or
+    yesterday (UTC) when no start is given.
+    """
+    try:
+        body = event.get('body', event) if isinstance(event, dict) else {}
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        if body.get('from'):
+            start = parse_time(body['from'])
+            end = parse_time(body['to'], end=True) if body.get('to') else parse_time(body['from'][:10], end=True)
+        else:
+            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            start, end = today - timedelta(days=1), today
+
+        result = sync_contacts(start, end, batch_size=int(body.get('batch_size', CONTACT_UPSERT_BATCH_SIZE)))
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': True, **result})
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': f'Invalid parameter: {str(e)}'})
+        }
+    except Exception as e:
+        logger.error(f"Contact sync failed: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': False,
+                'error': 'Internal server error occurred while syncing contacts'
+            })
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-sync GHL contacts from stored webhooks into clarity_ghl_contacts')
+    parser.add_argument('--from', dest='start', required=True, help='Earliest receive time (YYYY-mm-dd or ISO datetime, UTC)')
+    parser.add_argument('--to', dest='end', help='Latest receive time; a bare date includes that day (default: end of --from day)')
+    parser.add_argument('--db', help='Database URL (default: CONTACTS_DB_URL)')
+    parser.add_argument('--batch-size', type=int, default=CONTACT_UPSERT_BATCH_SIZE, help='Rows per upsert statement')
+    parser.add_argument('--fetch-workers', type=int, default=32, help='Concurrent S3 reads')
+    parser.add_argument('--dry-run', action='store_true', help='Only count events and contacts')
+    parser.add_argument('--local-s3', help='Read webhooks from this directory instead of S3')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.local_s3:
+        from local_s3 import LocalS3
+        LocalS3(args.local_s3).install()
+
+    start = parse_time(args.start)
+    end = parse_time(args.end, end=True) if args.end else parse_time(args.start[:10], end=True)
+    database = None if args.dry_run else ContactsDatabase(args.db)
+    print(json.dumps(sync_contacts(start, end, database, args.batch_size, args.fetch_workers, args.dry_run), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,17 +3,44 @@ Simplified Lambda Function for Certificate Generation
 This version generates HTML certificates and uploads to S3 for immediate testing.
 """
 
+import io
 import json
+import gzip
+import hashlib
 import logging
 import os
-import boto3
 from datetime import datetime
-from botocore.exceptions import ClientError, NoCredentialsError
+from botocore.exceptions import ClientError
+from single_flight import SingleFlight
+from s3_keys import certificate_key
+from s3_client import get_s3_client
+from stage_memory import EncodedTextReader, stage_memory
+from invocation_profiler import profile_invocation
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Coalesces duplicate requests (double-clicks, regenerate retries) within a warm container
+certificate_flight = SingleFlight(result_ttl=float(os.getenv('COALESCE_TTL_SECONDS', '30')))
+
+# Store HTML certificates gzip-compressed (served with Content-Encoding: gzip)
+HTML_GZIP = os.getenv('HTML_GZIP', 'false').lower() == 'true'
+
+# 'linked' references a shared, immutable per-tier stylesheet instead of inlining ~6 KB of CSS.
+# Linked stylesheets must be publicly readable, e.g. through CloudFront at STYLESHEET_BASE_URL.
+HTML_STYLESHEET_MODE = os.getenv('HTML_STYLESHEET_MODE', 'inline')
+STYLESHEET_BASE_URL = os.getenv('STYLESHEET_BASE_URL', '')
+STYLESHEET_PREFIX = 'certificate-assets/css'
+
+# Level 5 stays within ~2% of level 9's ratio on certificate HTML at roughly half
+# of the CPU time (see benchmark_compression.py)
+GZIP_LEVEL = 5
+
+# Characters encoded at a time when streaming HTML into the gzip writer
+ENCODE_CHUNK_SIZE = 64 * 1024
+
+@profile_invocation
 def lambda_handler(event, context):
     """
     Simplified Lambda handler that generates HTML certificates.
@@ -22,13 +49,14 @@ def lambda_handler(event, context):
         logger.info(f"Certificate generation request received: {json.dumps(event)}")
         
         # Parse the request body
-        if 'body' in event:
-            if isinstance(event['body'], str):
-                body = json.loads(event['body'])
+        with stage_memory.profile('parse'):
+            if 'body' in event:
+                if isinstance(event['body'], str):
+                    body = json.loads(event['body'])
+                else:
+                    body = event['body']
             else:
-                body = event['body']
-        else:
-            body = event
+                body = event
             
         # Validate required fields
         required_fields = ['recipient_name', 'course_title', 'tier_level', 'completion_date', 'user_id', 'course_id']
@@ -45,9 +73,6 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Generate certificate number
-        certificate_number = generate_certificate_number()
-        
         # Map tier level to tier name
         tier_names = {1: "Foundation Program", 2: "Mastery Program", 3: "Elite Program"}
         tier_name = tier_names.get(body['tier_level'], "Unknown Program")
@@ -67,28 +92,18 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Prepare certificate data
-        certificate_data = {
-            'recipient_name': body['recipient_name'].strip(),
-            'course_title': body['course_title'].strip(),
-            'tier_level': body['tier_level'],
-            'tier_name': tier_name,
-            'completion_date': formatted_date,
-            'certificate_number': certificate_number,
-            'user_id': body['user_id'],
-            'course_id': body['course_id'],
-            'accent_color': get_tier_color(body['tier_level']),
-            'current_year': datetime.now().year
-        }
-        
-        # Generate HTML certificate
-        html_content = generate_html_certificate(certificate_data)
-        
-        # Upload to S3
-        s3_key = f"certificates/{body['user_id']}/{body['course_id']}/cert-{certificate_number}.html"
-        certificate_url = upload_to_s3(html_content, s3_key, 'text/html')
+        # Generate and upload once per user, course, template and render inputs, sharing the result with
+        # duplicates; a corrected name, title or tier within the TTL renders a new certificate
+        render_inputs = {field: str(body[field]).strip() for field in ('recipient_name', 'course_title', 'tier_level', 'completion_date')}
+        flight_key = (body['user_id'], body['course_id'], html_fingerprint(render_inputs, HTML_STYLESHEET_MODE))
+        issued, shared = certificate_flight.do(flight_key, issue_html_certificate, body, tier_name, formatted_date)
+        certificate_url = issued['certificate_url']
+        certificate_number = issued['certificate_number']
         
-        logger.info(f"Certificate generated successfully: {certificate_number}")
+        if shared:
+            logger.info(f"Reused in-flight certificate: {certificate_number}")
+        else:
+            logger.info(f"Certificate generated successfully: {certificate_number}")
         
         return {
             'statusCode': 200,
@@ -112,6 +127,61 @@ def lambda_handler(event, context):
                 'error': 'Internal server error occurred while generating certificate'
             })
         }
+    
+    finally:
+        if stage_memory.profiling:
+            logger.info(f"Memory profile: {json.dumps(stage_memory.profile_report())}")
+
+def issue_html_certificate(body, tier_name, formatted_date):
+    """
+    Render an HTML certificate and upload it to S3.
+    
+    Args:
+        body (dict): Validated request body
+        tier_name (str): Display name of the tier
+        formatted_date (str): Human-readable completion date
+        
+    Returns:
+        dict: Certificate URL and certificate number
+    """
+    certificate_number = generate_certificate_number()
+    
+    # Prepare certificate data
+    certificate_data = {
+        'recipient_name': body['recipient_name'].strip(),
+        'course_title': body['course_title'].strip(),
+        'tier_level': body['tier_level'],
+        'tier_name': tier_name,
+        'completion_date': formatted_date,
+        'certificate_number': certificate_number,
+        'user_id': body['user_id'],
+        'course_id': body['course_id'],
+        'accent_color': get_tier_color(body['tier_level']),
+        'current_year': datetime.now().year
+    }
+    
+    # Link the shared tier stylesheet when configured, otherwise inline it
+    stylesheet_url = None
+    if HTML_STYLESHEET_MODE == 'linked':
+        if STYLESHEET_BASE_URL:
+            stylesheet_url = publish_tier_stylesheet(body['tier_level'])
+        else:
+            logger.warning("HTML_STYLESHEET_MODE is 'linked' but STYLESHEET_BASE_URL is not set; inlining CSS")
+    
+    # Generate HTML certificate
+    with stage_memory.profile('render'):
+        html_content = generate_html_certificate(certificate_data, stylesheet_url)
+    
+    # Upload to S3
+    s3_key = certificate_key(body['user_id'], body['course_id'], certificate_number, 'html')
+    fingerprint = html_fingerprint(certificate_data, stylesheet_url)
+    with stage_memory.profile('upload'):
+        certificate_url = upload_to_s3(html_content, s3_key, 'text/html', fingerprint=fingerprint)
+    
+    return {
+        'certificate_url': certificate_url,
+        'certificate_number': certificate_number
+    }
 
 def generate_certificate_number():
     """Generate a unique certificate number."""
@@ -125,16 +195,7 @@ def get_tier_color(tier_level):
     colors = {1: '#4A90E2', 2: '#95A5A6', 3: '#F39C12'}
     return colors.get(tier_level, '#4A90E2')
 
-def generate_html_certificate(certificate_data):
-    """Generate HTML certificate content."""
-    template_content = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Certificate of Completion - {{ certificate_number }}</title>
-    <style>
+CERTIFICATE_STYLESHEET = """
         @import url('https://fonts.googleapis.com/css2?family=Playfair+Display:wght@400;700&family=Crimson+Text:wght@400;600&display=swap');
         
         body {
@@ -330,7 +391,16 @@ def generate_html_certificate(certificate_data):
                 border-radius: 0;
             }
         }
-    </style>
+"""
+
+CERTIFICATE_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Certificate of Completion - {{ certificate_number }}</title>
+    {{ stylesheet }}
 </head>
 <body>
     <div class="certificate">
@@ -362,33 +432,168 @@ def generate_html_certificate(certificate_data):
     </div>
 </body>
 </html>
+"""
+
+# Identifies the template version for request coalescing
+TEMPLATE_HASH = hashlib.sha256((CERTIFICATE_STYLESHEET + CERTIFICATE_TEMPLATE).encode('utf-8')).hexdigest()[:16]
+
+# Rendered stylesheet per tier level, and public URL per tier once published
+_tier_stylesheets = {}
+_published_stylesheets = {}
+
+def render_tier_stylesheet(tier_level):
+    """Return the certificate stylesheet for a tier, rendering it once per container."""
+    stylesheet = _tier_stylesheets.get(tier_level)
+    if stylesheet is None:
+        stylesheet = CERTIFICATE_STYLESHEET.replace('{{ accent_color }}', get_tier_color(tier_level))
+        _tier_stylesheets[tier_level] = stylesheet
+    return stylesheet
+
+def get_stylesheet_key(tier_level):
+    """Build the versioned, content-hashed S3 key for a tier stylesheet."""
+    content_hash = hashlib.sha256(render_tier_stylesheet(tier_level).encode('utf-8')).hexdigest()[:12]
+    return f"{STYLESHEET_PREFIX}/tier-{tier_level}.{content_hash}.css"
+
+def publish_tier_stylesheet(tier_level):
+    """
+    Upload a tier stylesheet once and return its public URL.
+    
+    Keys are content-hashed, so an existing object never changes and can be
+    cached by browsers indefinitely. Each container checks S3 at most once per
+    tier and only uploads when the object is missing.
+    
+    Args:
+        tier_level (int): Tier level whose stylesheet to publish
+        
+    Returns:
+        str: Public URL of the stylesheet
+    """
+    url = _published_stylesheets.get(tier_level)
+    if url is not None:
+        return url
+    
+    s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+    s3_client = get_s3_client()
+    s3_key = get_stylesheet_key(tier_level)
+    
+    try:
+        s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise Exception(f"Failed to check stylesheet {s3_key}: {str(e)}")
+        
+        body = render_tier_stylesheet(tier_level).encode('utf-8')
+        encoding_args = {}
+        if HTML_GZIP:
+            body = compress_content(body)
+            encoding_args['ContentEncoding'] = 'gzip'
+        
+        s3_client.put_object(
+            Bucket=s3_bucket,
+            Key=s3_key,
+            Body=body,
+            ContentType='text/css; charset=utf-8',
+            CacheControl='public, max-age=31536000, immutable',
+            ServerSideEncryption='AES256',
+            **encoding_args
+        )
+        logger.info(f"Published tier {tier_level} stylesheet: {s3_key}")
+    
+    url = f"{STYLESHEET_BASE_URL.rstrip('/')}/{s3_key}"
+    _published_stylesheets[tier_level] = url
+    return url
+
+def generate_html_certificate(certificate_data, stylesheet_url=None):
     """
+    Generate HTML certificate content.
     
+    Args:
+        certificate_data (dict): Certificate fields to substitute into the template
+        stylesheet_url (str): Link this shared stylesheet instead of inlining the tier CSS
+        
+    Returns:
+        str: Rendered HTML
+    """
     # Simple template rendering without Jinja2
-    html = template_content
+    html = CERTIFICATE_TEMPLATE
     for key, value in certificate_data.items():
         html = html.replace('{{ ' + key + ' }}', str(value))
     
-    return html
+    if stylesheet_url:
+        stylesheet = f'<link rel="stylesheet" href="{stylesheet_url}">'
+    else:
+        stylesheet = '<style>' + render_tier_stylesheet(certificate_data['tier_level']) + '    </style>'
+    
+    return html.replace('{{ stylesheet }}', stylesheet)
+
+def compress_content(data):
+    """Gzip-compress bytes once with the preset level and a fixed header timestamp."""
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def html_fingerprint(certificate_data, stylesheet_url=None):
+    """Fingerprint the template version, stylesheet link and input fields of an HTML certificate."""
+    fields = {key: str(value) for key, value in certificate_data.items() if key != 'current_year'}
+    digest = hashlib.sha256(TEMPLATE_HASH.encode('utf-8'))
+    digest.update(json.dumps([fields, stylesheet_url], sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:32]
 
-def upload_to_s3(content, s3_key, content_type='text/html'):
-    """Upload content to S3 and return signed URL."""
+def upload_to_s3(content, s3_key, content_type='text/html', compress=None, fingerprint=None):
+    """
+    Upload content to S3 and return signed URL.
+    
+    When compression is enabled the object is stored gzip-compressed with
+    Content-Encoding: gzip, so browsers following the presigned URL decode it
+    transparently.
+    
+    Args:
+        content (str): Text content to upload
+        s3_key (str): S3 key for the file
+        content_type (str): MIME type of the uncompressed content
+        compress (bool): Store gzip-compressed; defaults to the HTML_GZIP setting
+        fingerprint (str): Render fingerprint to store in the object metadata
+        
+    Returns:
+        str: Signed URL for the uploaded certificate
+    """
     try:
         s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
+        
+        if compress is None:
+            compress = HTML_GZIP
+        
+        encoding_args = {}
+        if compress:
+            # Encode in chunks straight into the gzip stream instead of holding a full encoded copy
+            body = io.BytesIO()
+            content_size = 0
+            with gzip.GzipFile(fileobj=body, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as gzip_file:
+                for start in range(0, len(content), ENCODE_CHUNK_SIZE):
+                    content_size += gzip_file.write(content[start:start + ENCODE_CHUNK_SIZE].encode('utf-8'))
+            body_size = body.tell()
+            body.seek(0)
+            encoding_args['ContentEncoding'] = 'gzip'
+            logger.info(f"Compressed certificate from {content_size} to {body_size} bytes")
+        else:
+            # Encoded a chunk at a time as the upload reads it, instead of one full encoded copy
+            body = EncodedTextReader(content)
+            content_size = body_size = len(body)
         
         # Upload to S3
-        s3_client.put_object(
-            Bucket=s3_bucket,
-            Key=s3_key,
-            Body=content.encode('utf-8'),
-            ContentType=content_type,
-            ServerSideEncryption='AES256',
-            Metadata={
-                'generated_at': datetime.now().isoformat(),
-                'generator': 'clarity-aws-ghl-lambda-simple'
-            }
-        )
+        with stage_memory.track('html', content_size), stage_memory.track('upload', body_size):
+            s3_client.put_object(
+                Bucket=s3_bucket,
+                Key=s3_key,
+                Body=body,
+                ContentType=f'{content_type}; charset=utf-8',
+                ServerSideEncryption='AES256',
+                Metadata={
+                    'generated_at': datetime.now().isoformat(),
+                    'generator': 'clarity-aws-ghl-lambda-simple',
+                    'fingerprint': fingerprint or ''
+                },
+                **encoding_args
+            )
         
         # Generate signed URL with 7-day expiration
         signed_url = s3_client.generate_presigned_url(
@@ -0,0 +1,128 @@
+"""
+Invocation Profiler Module
+Captures cProfile profiles of sampled or slow Lambda invocations.
+
+Wrap a handler with ``@profile_invocation``. Invocations are profiled when
+they are sampled (PROFILE_SAMPLE_RATE) and the profile is kept when the
+invocation took at least PROFILE_LATENCY_MS. Kept profiles are written in
+pstats format to PROFILE_DESTINATION, either a local directory or an
+``s3://`` diagnostics prefix in the bucket, and the top functions by
+cumulative time are logged.
+
+A profile cannot be started retroactively, so setting only a latency
+threshold profiles every invocation and keeps the slow ones. With neither
+setting the decorator returns the handler unchanged, so there is no
+overhead at all.
+
+Load a profile with ``python -m pstats <file>`` or snakeviz.
+"""
+
+import os
+import io
+import uuid
+import time
+import random
+import pstats
+import cProfile
+import logging
+import functools
+from datetime import datetime
+
+from s3_client import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+# Fraction of invocations run under cProfile (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+
+# Keep only profiles of invocations at least this slow (0 keeps every profiled invocation)
+PROFILE_LATENCY_MS = float(os.getenv('PROFILE_LATENCY_MS', '0'))
+
+# Local directory, or s3://<bucket>/<prefix> (s3:// alone uses S3_BUCKET and diagnostics/profiles)
+PROFILE_DESTINATION = os.getenv('PROFILE_DESTINATION', '/tmp/profiles')
+
+# Functions listed in the logged summary
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', '20'))
+
+DEFAULT_PROFILE_PREFIX = 'diagnostics/profiles'
+
+
+def profile_invocation(handler):
+    """
+    Decorate a Lambda handler with sampled and latency-triggered profiling.
+
+    Args:
+        handler: Lambda handler function taking (event, context)
+
+    Returns:
+        The profiling wrapper, or ``handler`` itself when profiling is disabled
+    """
+    if PROFILE_SAMPLE_RATE <= 0 and PROFILE_LATENCY_MS <= 0:
+        return handler
+
+    # A threshold on its own has to profile everything to catch the slow invocations
+    sample_rate = PROFILE_SAMPLE_RATE if PROFILE_SAMPLE_RATE > 0 else 1.0
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if random.random() >= sample_rate:
+            return handler(event, context)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if elapsed_ms >= PROFILE_LATENCY_MS:
+                request_id = getattr(context, 'aws_request_id', None) or uuid.uuid4().hex
+                try:
+                    save_profile(profiler, handler.__module__, request_id, elapsed_ms)
+                except Exception as e:
+                    # Diagnostics must never fail the invocation
+                    logger.error(f"Failed to save profile for {request_id}: {str(e)}")
+
+    return wrapper
+
+
+def save_profile(profiler, name, request_id, elapsed_ms):
+    """
+    Write a profile in pstats format and log its top functions.
+
+    Args:
+        profiler (cProfile.Profile): Finished profiler
+        name (str): Handler module name, used in the file name
+        request_id (str): Lambda request ID
+        elapsed_ms (float): Invocation duration
+
+    Returns:
+        str: Local path or S3 URI of the saved profile
+    """
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+    filename = f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{request_id}.pstats"
+
+    if PROFILE_DESTINATION.startswith('s3://'):
+        bucket, _, prefix = PROFILE_DESTINATION[len('s3://'):].partition('/')
+        bucket = bucket or os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        prefix = prefix.strip('/') or DEFAULT_PROFILE_PREFIX
+        s3_key = f"{prefix}/{datetime.now().strftime('%Y/%m/%d')}/{filename}"
+
+        local_path = os.path.join('/tmp', filename)
+        profiler.dump_stats(local_path)
+        try:
+            get_s3_client().upload_file(local_path, bucket, s3_key, ExtraArgs={'ServerSideEncryption': 'AES256'})
+        finally:
+            os.remove(local_path)
+        location = f"s3://{bucket}/{s3_key}"
+    else:
+        os.makedirs(PROFILE_DESTINATION, exist_ok=True)
+        location = os.path.join(PROFILE_DESTINATION, filename)
+        profiler.dump_stats(location)
+
+    logger.info(f"Profiled invocation {request_id} ({elapsed_ms:.0f} ms) saved to {location}\n{summary.getvalue()}")
+    return location
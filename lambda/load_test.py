@@ -0,0 +1,149 @@
+"""
+Load Test
+Replays test-payload.json variants against the local API Gateway emulator at a target rate.
+
+Requests are sent open-loop: request i is due at start + i / rps, whether or
+not earlier requests have finished. Latency is measured from that due time,
+so queueing shows up in the percentiles instead of being hidden by a slower
+send rate. Payloads come from --corpus or, by default, the same
+test-payload.json variants memory_sweep.py uses. Each request gets its own
+user_id so duplicate coalescing does not hide render cost; use
+--repeat-users to measure coalescing instead.
+
+Usage:
+    python local_api.py --workers 4 &
+    python load_test.py [--url http://127.0.0.1:3000/certificates] [--rps 20] [--duration 30] [--output report.json]
+"""
+
+import json
+import time
+import argparse
+import itertools
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_sweep import load_corpus, percentile
+
+
+def send(url, payload, due, timeout):
+    """
+    POST one payload and time it from its due time.
+
+    Returns:
+        dict: Status (0 for connection errors), latency in ms, handler duration and worker
+    """
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status, headers = response.status, response.headers
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, headers = e.code, e.headers
+    except (urllib.error.URLError, OSError):
+        status, headers = 0, {}
+
+    return {
+        'status': status,
+        'latency_ms': (time.monotonic() - due) * 1000,
+        'handler_ms': float(headers.get('X-Local-Duration-Ms') or 0) or None,
+        'worker': headers.get('X-Local-Worker')
+    }
+
+
+def run_load(url, variants, rps, duration, concurrency, timeout, repeat_users=False):
+    """
+    Send ``rps * duration`` requests open-loop and collect the results.
+
+    Returns:
+        tuple: (results, elapsed seconds)
+    """
+    total = int(rps * duration)
+    payloads = itertools.cycle(variants)
+    results = []
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for i in range(total):
+            due = start + i / rps
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            payload = dict(next(payloads))
+            if not repeat_users:
+                payload['user_id'] = 100000 + i
+            futures.append(executor.submit(send, url, payload, due, timeout))
+
+        for future in futures:
+            results.append(future.result())
+
+    return results, time.monotonic() - start
+
+
+def summarize(results, elapsed):
+    """Build the latency, throughput and error report."""
+    latencies = [result['latency_ms'] for result in results]
+    handler_times = [result['handler_ms'] for result in results if result['handler_ms']]
+    errors = [result for result in results if not 200 <= result['status'] < 300]
+
+    report = {
+        'requests': len(results),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'error_rate': round(len(errors) / len(results), 4),
+        'status_counts': dict(Counter(str(result['status']) for result in results)),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 1),
+            'p95': round(percentile(latencies, 0.95), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(max(latencies), 1)
+        },
+        'workers_used': len({result['worker'] for result in results if result['worker']})
+    }
+    if handler_times:
+        report['handler_ms'] = {
+            'p50': round(percentile(handler_times, 0.50), 1),
+            'p99': round(percentile(handler_times, 0.99), 1)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open-loop load test against the local API Gateway emulator')
+    parser.add_argument('--url', default='http://127.0.0.1:3000/certificates', help='Endpoint to POST to')
+    parser.add_argument('--corpus', help='JSON array or NDJSON file of request bodies (default: test-payload.json variants)')
+    parser.add_argument('--rps', type=float, default=20, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to send for')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=35, help='Client timeout per request in seconds')
+    parser.add_argument('--repeat-users', action='store_true', help='Reuse the payload user_id so duplicates coalesce')
+    parser.add_argument('--output', help='Also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    variants = load_corpus(args.corpus)
+    print(f"{int(args.rps * args.duration)} requests at {args.rps} req/s to {args.url} ({len(variants)} payload variants)")
+
+    results, elapsed = run_load(args.url, variants, args.rps, args.duration, args.concurrency, args.timeout,
+                                args.repeat_users)
+    report = summarize(results, elapsed)
+
+    latency = report['latency_ms']
+    print(f"throughput {report['throughput_rps']} req/s | errors {report['error_rate']:.2%} {report['status_counts']}")
+    print(f"latency p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms | max {latency['max']} ms")
+    if 'handler_ms' in report:
+        print(f"handler p50 {report['handler_ms']['p50']} ms | p99 {report['handler_ms']['p99']} ms "
+              f"across {report['workers_used']} workers")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
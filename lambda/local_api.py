@@ -0,0 +1,239 @@
+"""
+Local API Gateway
+Serves a Lambda handler over HTTP the way API Gateway's proxy integration invokes it, fully offline.
+
+Each HTTP request is translated into a REST API proxy event and run in one
+of --workers worker processes. Like Lambda containers, each worker imports
+the handler once, keeps its module state warm between invocations, and
+runs one invocation at a time. S3 is answered by local_s3.LocalS3 from
+--s3-dir, which every worker shares.
+
+Handler errors answer 502, as API Gateway does. Invocations longer than
+--timeout answer 504. Responses carry X-Local-Duration-Ms and X-Local-Worker
+headers for load testing.
+
+Usage:
+    python local_api.py [--handler handler.lambda_handler] [--port 3000] [--workers 4] [--s3-dir ./local-s3]
+"""
+
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import argparse
+import importlib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger('local_api')
+
+# Per-process handler loaded by the worker initializer
+_handler = None
+
+
+class LambdaContext:
+    """Subset of the Lambda context object handlers use."""
+
+    def __init__(self, request_id, function_name, timeout_seconds, memory_limit_in_mb=1024):
+        self.aws_request_id = request_id
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:000000000000:function:{function_name}"
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def build_proxy_event(method, raw_path, headers, body, stage='local', request_id=None):
+    """
+    Build an API Gateway REST API (v1) proxy integration event.
+
+    Args:
+        method (str): HTTP method
+        raw_path (str): Request path including the query string
+        headers (dict): Request headers
+        body (bytes): Request body
+        stage (str): API stage name
+        request_id (str): Request ID; generated when omitted
+
+    Returns:
+        dict: Proxy event
+    """
+    parts = urlsplit(raw_path)
+    query = parse_qs(parts.query, keep_blank_values=True)
+
+    try:
+        body_text, is_base64 = (body.decode('utf-8'), False) if body else (None, False)
+    except UnicodeDecodeError:
+        body_text, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    now = datetime.now(timezone.utc)
+    return {
+        'resource': '/{proxy+}',
+        'path': parts.path,
+        'httpMethod': method,
+        'headers': dict(headers),
+        'multiValueHeaders': {name: [value] for name, value in headers.items()},
+        'queryStringParameters': {name: values[-1] for name, values in query.items()} or None,
+        'multiValueQueryStringParameters': query or None,
+        'pathParameters': {'proxy': parts.path.lstrip('/')},
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': '/{proxy+}',
+            'httpMethod': method,
+            'path': f"/{stage}{parts.path}",
+            'stage': stage,
+            'requestId': request_id or str(uuid.uuid4()),
+            'requestTime': now.strftime('%d/%b/%Y:%H:%M:%S +0000'),
+            'requestTimeEpoch': int(now.timestamp() * 1000),
+            'identity': {'sourceIp': '127.0.0.1', 'userAgent': headers.get('User-Agent')}
+        },
+        'body': body_text,
+        'isBase64Encoded': is_base64
+    }
+
+
+def _init_worker(handler_path, s3_dir):
+    """Load the handler once per worker process, with S3 answered locally."""
+    global _handler
+
+    # botocore signs requests even though nothing leaves the machine
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    from local_s3 import LocalS3
+    LocalS3(s3_dir).install()
+
+    module_name, _, function_name = handler_path.rpartition('.')
+    _handler = getattr(importlib.import_module(module_name), function_name)
+
+
+def _invoke(event, function_name, timeout_seconds):
+    """Run one invocation in a worker process."""
+    context = LambdaContext(event['requestContext']['requestId'], function_name, timeout_seconds)
+    start = time.perf_counter()
+    try:
+        response = _handler(event, context)
+        error = None
+    except Exception as e:
+        response, error = None, f"{type(e).__name__}: {e}"
+    return response, error, (time.perf_counter() - start) * 1000, os.getpid()
+
+
+class LocalApiServer(ThreadingHTTPServer):
+    """HTTP server that forwards every request to a pool of warm handler processes."""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler_path, workers, s3_dir, timeout_seconds):
+        super().__init__(address, ProxyRequestHandler)
+        self.function_name = handler_path.rpartition('.')[0]
+        self.timeout_seconds = timeout_seconds
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(handler_path, s3_dir)
+        )
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProxyRequestHandler(BaseHTTPRequestHandler):
+    """Translates HTTP requests into proxy events and handler responses back into HTTP."""
+
+    def do_GET(self):
+        self._proxy()
+
+    def do_POST(self):
+        self._proxy()
+
+    def do_PUT(self):
+        self._proxy()
+
+    def do_DELETE(self):
+        self._proxy()
+
+    def do_OPTIONS(self):
+        self._proxy()
+
+    def _proxy(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        request_id = str(uuid.uuid4())
+        event = build_proxy_event(self.command, self.path, dict(self.headers.items()), body, request_id=request_id)
+
+        future = self.server.executor.submit(_invoke, event, self.server.function_name, self.server.timeout_seconds)
+        try:
+            response, error, duration_ms, worker = future.result(timeout=self.server.timeout_seconds)
+        except TimeoutError:
+            self._send(504, {'Content-Type': 'application/json'}, b'{"message": "Endpoint request timed out"}', request_id)
+            return
+
+        if error or not isinstance(response, dict) or 'statusCode' not in response:
+            logger.error(f"Malformed Lambda proxy response for {request_id}: {error or response!r}")
+            self._send(502, {'Content-Type': 'application/json'}, b'{"message": "Internal server error"}', request_id,
+                       duration_ms, worker)
+            return
+
+        headers = dict(response.get('headers') or {})
+        for name, values in (response.get('multiValueHeaders') or {}).items():
+            headers[name] = ', '.join(str(value) for value in values)
+
+        body = response.get('body') or ''
+        body = base64.b64decode(body) if response.get('isBase64Encoded') else str(body).encode('utf-8')
+        self._send(int(response['statusCode']), headers, body, request_id, duration_ms, worker)
+
+    def _send(self, status, headers, body, request_id, duration_ms=None, worker=None):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, str(value))
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-amzn-RequestId', request_id)
+        if duration_ms is not None:
+            self.send_header('X-Local-Duration-Ms', f"{duration_ms:.1f}")
+            self.send_header('X-Local-Worker', str(worker))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a Lambda handler locally behind an API Gateway proxy emulator')
+    parser.add_argument('--handler', default='handler.lambda_handler', help='module.function of the Lambda handler')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=3000, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Warm handler processes')
+    parser.add_argument('--s3-dir', default='local-s3', help='Directory backing the local S3 stand-in')
+    parser.add_argument('--timeout', type=float, default=29, help='Seconds before answering 504, like API Gateway')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    os.makedirs(args.s3_dir, exist_ok=True)
+    server = LocalApiServer((args.host, args.port), args.handler, args.workers, os.path.abspath(args.s3_dir), args.timeout)
+    logger.info(f"Serving {args.handler} on http://{args.host}:{args.port} with {args.workers} workers, "
+                f"S3 in {os.path.abspath(args.s3_dir)}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
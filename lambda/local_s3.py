@@ -0,0 +1,302 @@
+"""
+Local S3 Module
+Offline stand-in for the certificate bucket, answering S3 requests from a local directory.
+
+``LocalS3(root).install()`` registers a before-send hook on the default
+boto3 session, so every client created afterwards, including the shared
+client from s3_client, is answered locally instead of by AWS. Objects are
+stored as files under ``root/<bucket>/<key>``, so several worker processes
+can share one directory.
+
+Supports PutObject, GetObject (including byte ranges), HeadObject,
+DeleteObject, DeleteObjects and ListObjectsV2 (prefix, delimiter,
+continuation). Other operations answer 501 NotImplemented. Presigned URLs
+are generated offline by botocore as usual.
+"""
+
+import io
+import os
+import json
+import hashlib
+import tempfile
+from email.utils import formatdate
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+S3_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+# Sidecar directory holding content type, encoding and user metadata per object
+META_DIR = '.meta'
+
+
+class RawBody:
+    """Minimal raw response body accepted by AWSResponse and StreamingBody."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, amt=None, **kwargs):
+        return self._data.read(amt)
+
+    def stream(self, **kwargs):
+        yield self._data.read()
+
+    def close(self):
+        pass
+
+
+class LocalS3:
+    """
+    Answers S3 requests from files under a local directory.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or tempfile.mkdtemp(prefix='local-s3-')
+
+    def install(self, session=None):
+        """
+        Route S3 requests of clients created from ``session`` to this directory.
+
+        Args:
+            session: botocore or boto3 session; defaults to boto3's default session
+
+        Returns:
+            LocalS3: self
+        """
+        if session is None:
+            if boto3.DEFAULT_SESSION is None:
+                boto3.setup_default_session()
+            session = boto3.DEFAULT_SESSION
+        session.events.register('before-send.s3', self.handle)
+        return self
+
+    def handle(self, request, **kwargs):
+        """before-send hook that answers an S3 request locally."""
+        bucket, key = self._parse_target(request.url)
+        query = parse_qs(urlsplit(request.url).query, keep_blank_values=True)
+        method = request.method.upper()
+
+        if method == 'PUT' and key and not query:
+            return self._put(request, bucket, key)
+        if method in ('GET', 'HEAD') and key and not query:
+            return self._get(request, bucket, key, head=(method == 'HEAD'))
+        if method == 'DELETE' and key and not query:
+            self._delete(bucket, key)
+            return AWSResponse(request.url, 204, {}, RawBody(b''))
+        if method == 'GET' and not key and query.get('list-type') == ['2']:
+            return self._list(request, bucket, query)
+        if method == 'POST' and not key and 'delete' in query:
+            return self._delete_many(request, bucket)
+
+        return self._error(request, 501, 'NotImplemented', f'{method} {request.url} is not supported by the local S3 stand-in')
+
+    def _parse_target(self, url):
+        """Return (bucket, key) for virtual-hosted or path-style URLs."""
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        path = unquote(parts.path.lstrip('/'))
+
+        if host.startswith('s3.') or host.startswith('s3-') or host in ('localhost', '127.0.0.1'):
+            bucket, _, key = path.partition('/')
+            return bucket, key
+        return host.split('.')[0], path
+
+    def _object_path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def _meta_path(self, bucket, key):
+        return os.path.join(self.root, META_DIR, bucket, *key.split('/')) + '.json'
+
+    def _put(self, request, bucket, key):
+        body = request.body
+        if body is None:
+            data = b''
+        elif isinstance(body, (bytes, bytearray)):
+            data = bytes(body)
+        elif isinstance(body, str):
+            data = body.encode('utf-8')
+        else:
+            data = body.read()
+
+        headers = {name.lower(): value.decode() if isinstance(value, bytes) else value for name, value in request.headers.items()}
+
+        # Newer botocore streams file bodies with aws-chunked encoding and a checksum trailer
+        encodings = [encoding.strip() for encoding in headers.get('content-encoding', '').split(',') if encoding.strip()]
+        if 'aws-chunked' in encodings:
+            data = self._decode_aws_chunked(data)
+            encodings.remove('aws-chunked')
+
+        meta = {
+            'content_type': headers.get('content-type', 'binary/octet-stream'),
+            'content_encoding': ', '.join(encodings) or None,
+            'cache_control': headers.get('cache-control'),
+            'metadata': {name: value for name, value in headers.items() if name.startswith('x-amz-meta-')},
+            'etag': hashlib.md5(data).hexdigest()
+        }
+
+        self._write_atomic(self._object_path(bucket, key), data)
+        self._write_atomic(self._meta_path(bucket, key), json.dumps(meta).encode('utf-8'))
+
+        return AWSResponse(request.url, 200, {'ETag': f'"{meta["etag"]}"'}, RawBody(b''))
+
+    def _decode_aws_chunked(self, data):
+        """Strip aws-chunked framing ('<hex size>[;ext]\\r\\n<data>\\r\\n' ... '0\\r\\n<trailers>')."""
+        decoded = bytearray()
+        position = 0
+        while True:
+            line_end = data.index(b'\r\n', position)
+            size = int(data[position:line_end].split(b';')[0], 16)
+            if size == 0:
+                return bytes(decoded)
+            start = line_end + 2
+            decoded += data[start:start + size]
+            position = start + size + 2
+
+    def _get(self, request, bucket, key, head=False):
+        path = self._object_path(bucket, key)
+        if not os.path.isfile(path):
+            if head:
+                return AWSResponse(request.url, 404, {}, RawBody(b''))
+            return self._error(request, 404, 'NoSuchKey', 'The specified key does not exist.')
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        meta = self._read_meta(bucket, key, data)
+
+        headers = {
+            'Content-Type': meta['content_type'],
+            'ETag': f'"{meta["etag"]}"',
+            'Last-Modified': formatdate(os.path.getmtime(path), usegmt=True),
+            'Accept-Ranges': 'bytes'
+        }
+        if meta.get('content_encoding'):
+            headers['Content-Encoding'] = meta['content_encoding']
+        if meta.get('cache_control'):
+            headers['Cache-Control'] = meta['cache_control']
+        headers.update(meta.get('metadata', {}))
+
+        status = 200
+        range_header = request.headers.get('Range')
+        if range_header:
+            range_header = range_header.decode() if isinstance(range_header, bytes) else range_header
+            start, end = self._parse_range(range_header, len(data))
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+            data = data[start:end + 1]
+            status = 206
+
+        headers['Content-Length'] = str(len(data))
+        return AWSResponse(request.url, status, headers, RawBody(b'' if head else data))
+
+    def _parse_range(self, header, size):
+        """Parse a single 'bytes=a-b', 'bytes=a-' or 'bytes=-n' range."""
+        first, _, last = header.split('=', 1)[1].partition('-')
+        if not first:
+            return max(0, size - int(last)), size - 1
+        return int(first), min(size - 1, int(last)) if last else size - 1
+
+    def _delete(self, bucket, key):
+        for path in (self._object_path(bucket, key), self._meta_path(bucket, key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _delete_many(self, request, bucket):
+        body = request.body if isinstance(request.body, (bytes, bytearray)) else request.body.read()
+        document = ElementTree.fromstring(body)
+        keys = [element.text for element in document.iter(f'{{{S3_NAMESPACE}}}Key')] or \
+            [element.text for element in document.iter('Key')]
+
+        for key in keys:
+            self._delete(bucket, key)
+
+        deleted = ''.join(f'<Deleted><Key>{escape(key)}</Key></Deleted>' for key in keys)
+        xml = f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{S3_NAMESPACE}">{deleted}</DeleteResult>'
+        return AWSResponse(request.url, 200, {'Content-Type': 'application/xml'}, RawBody(xml.encode('utf-8')))
+
+    def _list(self, request, bucket, query):
+        prefix = query.get('prefix', [''])[0]
+        delimiter = query.get('delimiter', [''])[0]
+        max_keys = int(query.get('max-keys', ['1000'])[0])
+        after = query.get('continuation-token', query.get('start-after', ['']))[0]
+
+        keys = sorted(key for key in self._all_keys(bucket) if key.startswith(prefix) and key > after)
+
+        contents, common_prefixes, last = [], [], None
+        for key in keys:
+            if len(contents) + len(common_prefixes) >= max_keys:
+                break
+            if delimiter and delimiter in key[len(prefix):]:
+                common = prefix + key[len(prefix):].split(delimiter, 1)[0] + delimiter
+                if common_prefixes and common_prefixes[-1] == common:
+                    last = key
+                    continue
+                common_prefixes.append(common)
+            else:
+                contents.append(key)
+            last = key
+
+        truncated = last is not None and last != keys[-1]
+
+        parts = [
+            f'<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>',
+            f'<KeyCount>{len(contents) + len(common_prefixes)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>',
+            f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>'
+        ]
+        if delimiter:
+            parts.append(f'<Delimiter>{escape(delimiter)}</Delimiter>')
+        if truncated:
+            parts.append(f'<NextContinuationToken>{escape(last)}</NextContinuationToken>')
+        for key in contents:
+            path = self._object_path(bucket, key)
+            modified = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            etag = self._read_etag(bucket, key, path)
+            parts.append(
+                f'<Contents><Key>{escape(key)}</Key><LastModified>{modified}</LastModified>'
+                f'<ETag>&quot;{etag}&quot;</ETag><Size>{os.path.getsize(path)}</Size>'
+                f'<StorageClass>STANDARD</StorageClass></Contents>'
+            )
+        for common in common_prefixes:
+            parts.append(f'<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>')
+
+        xml = f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{S3_NAMESPACE}">{"".join(parts)}</ListBucketResult>'
+        return AWSResponse(request.url, 200, {'Content-Type': 'application/xml'}, RawBody(xml.encode('utf-8')))
+
+    def _all_keys(self, bucket):
+        bucket_root = os.path.join(self.root, bucket)
+        for directory, _, files in os.walk(bucket_root):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                yield os.path.relpath(os.path.join(directory, name), bucket_root).replace(os.sep, '/')
+
+    def _read_meta(self, bucket, key, data):
+        try:
+            with open(self._meta_path(bucket, key), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'content_type': 'binary/octet-stream', 'metadata': {}, 'etag': hashlib.md5(data).hexdigest()}
+
+    def _read_etag(self, bucket, key, path):
+        try:
+            with open(self._meta_path(bucket, key), encoding='utf-8') as f:
+                return json.load(f)['etag']
+        except (FileNotFoundError, KeyError):
+            with open(path, 'rb') as f:
+                return hashlib.md5(f.read()).hexdigest()
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _error(self, request, status, code, message):
+        xml = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+        return AWSResponse(request.url, status, {'Content-Type': 'application/xml'}, RawBody(xml.encode('utf-8')))
@@ -0,0 +1,200 @@
+"""
+Memory Sweep
+Replays a corpus of certificate payloads offline and recommends a Lambda memory size.
+
+Every payload runs in a fresh process, like a cold Lambda container, and is
+rendered --warm times in a row to include warm-container growth. Nothing is
+uploaded. The peak RSS of each process is collected, and the recommended
+memory setting is the p99 peak plus headroom, rounded up to a 64 MB step.
+These runs do not profile, since tracemalloc's own bookkeeping would
+inflate the RSS. The heaviest payload is then rendered once more in a
+separate process with stage profiling, and its profile printed.
+
+The corpus is a JSON array or NDJSON file of request bodies shaped like
+test-payload.json. Without --corpus, variants of test-payload.json are built
+across every tier and several name and course title lengths.
+
+Usage:
+    python memory_sweep.py [--target pdf] [--corpus payloads.ndjson] [--warm 3] [--processes 4] [--headroom 1.3]
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+from benchmark_compression import COURSES, RECIPIENTS
+
+# Lambda memory settings are 128 MB to 10240 MB; CPU scales with memory (1769 MB = 1 vCPU)
+LAMBDA_MIN_MB = 128
+LAMBDA_MAX_MB = 10240
+LAMBDA_STEP_MB = 64
+LAMBDA_MB_PER_VCPU = 1769
+
+
+def load_corpus(path=None):
+    """
+    Load request bodies from a corpus file, or build variants of test-payload.json.
+
+    Args:
+        path (str): JSON array or NDJSON file of request bodies
+
+    Returns:
+        list: Request body dicts
+    """
+    if path:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        if text.lstrip().startswith('['):
+            return json.loads(text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test-payload.json'), encoding='utf-8') as f:
+        base = json.load(f)
+
+    return [
+        dict(base, recipient_name=recipient_name, course_title=course_title, tier_level=tier_level)
+        for tier_level in (1, 2, 3)
+        for recipient_name in RECIPIENTS
+        for course_title in COURSES
+    ]
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def recommend_memory_mb(peak_bytes, headroom):
+    """
+    Round a peak RSS with headroom up to a valid Lambda memory setting.
+
+    Args:
+        peak_bytes (int): Peak resident set size
+        headroom (float): Safety multiplier
+
+    Returns:
+        int: Memory size in MB
+    """
+    needed_mb = peak_bytes * headroom / (1024 * 1024)
+    steps = math.ceil(needed_mb / LAMBDA_STEP_MB)
+    return min(LAMBDA_MAX_MB, max(LAMBDA_MIN_MB, steps * LAMBDA_STEP_MB))
+
+
+def _run_payload(target, payload, warm, profile=False):
+    """
+    Render one payload ``warm`` times in this process and report its memory.
+
+    Runs in a fresh worker process.
+
+    Args:
+        target (str): 'pdf' or 'html'
+        payload (dict): Request body
+        warm (int): Renders in a row
+        profile (bool): Enable stage profiling; the peak RSS then includes tracemalloc's overhead
+
+    Returns:
+        dict: Payload label, peak RSS and, when profiling, the stage profiles of the last run
+    """
+    from stage_memory import peak_rss, stage_memory
+    stage_memory.profiling = profile
+
+    completion_date = datetime.strptime(payload['completion_date'], '%Y-%m-%d').strftime('%B %d, %Y')
+
+    if target == 'pdf':
+        from certificate_generator import CertificateGenerator
+        generator = CertificateGenerator()
+        for _ in range(warm):
+            stage_memory.profile_report()
+            generator.render_pdf({
+                'recipient_name': payload['recipient_name'],
+                'course_title': payload['course_title'],
+                'tier_level': int(payload['tier_level']),
+                'completion_date': completion_date,
+                'certificate_number': 'CERT-2024-0847',
+                'user_id': payload['user_id'],
+                'course_id': payload['course_id']
+            })
+    else:
+        from handler import generate_html_certificate, get_tier_color
+        tier_names = {1: "Foundation Program", 2: "Mastery Program", 3: "Elite Program"}
+        for _ in range(warm):
+            stage_memory.profile_report()
+            with stage_memory.profile('render'):
+                generate_html_certificate({
+                    'recipient_name': payload['recipient_name'],
+                    'course_title': payload['course_title'],
+                    'tier_level': payload['tier_level'],
+                    'tier_name': tier_names.get(payload['tier_level'], "Unknown Program"),
+                    'completion_date': completion_date,
+                    'certificate_number': 'CERT-2024-0847',
+                    'user_id': payload['user_id'],
+                    'course_id': payload['course_id'],
+                    'accent_color': get_tier_color(payload['tier_level']),
+                    'current_year': datetime.now().year
+                })
+
+    return {
+        'label': f"tier {payload['tier_level']}, {len(payload['recipient_name'])}-char name, "
+                 f"{len(payload['course_title'])}-char course",
+        'peak_rss_bytes': peak_rss(),
+        'stages': stage_memory.profile_report()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommend a Lambda memory size from the p99 peak RSS of a payload corpus')
+    parser.add_argument('--target', choices=['pdf', 'html'], default='pdf', help='Render path to measure')
+    parser.add_argument('--corpus', help='JSON array or NDJSON file of request bodies (default: test-payload.json variants)')
+    parser.add_argument('--warm', type=int, default=3, help='Renders per process, to include warm-container growth')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2, help='Payloads measured in parallel')
+    parser.add_argument('--headroom', type=float, default=1.3, help='Multiplier applied to the p99 peak')
+    args = parser.parse_args()
+
+    payloads = load_corpus(args.corpus)
+    print(f"Measuring {len(payloads)} payloads on the {args.target} path, {args.warm} renders per process")
+
+    # One process per payload so every peak starts from a cold process
+    results = []
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=get_context('spawn'), max_tasks_per_child=1) as executor:
+        futures = [executor.submit(_run_payload, args.target, payload, args.warm) for payload in payloads]
+        for future in futures:
+            results.append(future.result())
+
+    peaks = [result['peak_rss_bytes'] for result in results if result['peak_rss_bytes']]
+    if not peaks:
+        print("Peak RSS is not available on this platform")
+        return
+
+    mb = 1024 * 1024
+    p99 = percentile(peaks, 0.99)
+    print()
+    print(f"peak RSS  p50 {percentile(peaks, 0.50) / mb:.0f} MB | p95 {percentile(peaks, 0.95) / mb:.0f} MB | "
+          f"p99 {p99 / mb:.0f} MB | max {max(peaks) / mb:.0f} MB | mean {statistics.mean(peaks) / mb:.0f} MB")
+
+    # Profile the heaviest payload on its own, so tracemalloc does not skew the peaks above
+    heaviest_index = max(range(len(results)), key=lambda index: results[index]['peak_rss_bytes'] or 0)
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        heaviest = executor.submit(_run_payload, args.target, payloads[heaviest_index], args.warm, True).result()
+    print()
+    print(f"Heaviest payload: {heaviest['label']} (stage profile from a separate profiled run)")
+    for stage, profiles in heaviest['stages'].items():
+        profile = profiles[-1]
+        print(f"  {stage:<8} traced peak {profile['traced_peak_bytes'] / 1024:.0f} KB, "
+              f"RSS after {(profile['rss_after_bytes'] or 0) / mb:.0f} MB")
+        for allocator in profile['top_allocators']:
+            print(f"           {allocator['size_bytes'] / 1024:>8.1f} KB  {allocator['location']}")
+
+    memory_mb = recommend_memory_mb(p99, args.headroom)
+    print()
+    print(f"Recommended Lambda memory: {memory_mb} MB "
+          f"(p99 x {args.headroom}, {memory_mb / LAMBDA_MB_PER_VCPU:.2f} vCPU)")
+
+
+if __name__ == '__main__':
+    main()
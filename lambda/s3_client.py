@@ -0,0 +1,159 @@
+"""
+S3 Client Module
+Provides the process-wide S3 client with adaptive retries and a shared client-side rate limiter.
+
+botocore's adaptive retry mode adds a token bucket in front of every request
+that slows the client down as soon as S3 starts answering 503 SlowDown. The
+bucket belongs to the client, so every handler, CertificateGenerator and
+upload thread in a process uses the same client and therefore backs off
+together instead of each retrying on its own.
+"""
+
+import os
+import logging
+import threading
+import boto3
+from botocore.config import Config
+from botocore.retries import adaptive, standard
+
+logger = logging.getLogger(__name__)
+
+# 'adaptive' (token-bucket rate limiting on top of standard retries), 'standard' or 'legacy'
+S3_RETRY_MODE = os.getenv('S3_RETRY_MODE', 'adaptive')
+S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', '10'))
+
+# Enough pooled connections for thread-pool uploads sharing the client
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '50'))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+class S3Metrics:
+    """
+    Counts requests and throttling responses for one client and reports the
+    adaptive rate limiter's current send rate.
+    """
+
+    def __init__(self, retry_mode, rate_limiter=None):
+        self.retry_mode = retry_mode
+        self.rate_limiter = rate_limiter
+        self.requests_sent = 0
+        self.throttled_responses = 0
+        self._detector = standard.ThrottlingErrorDetector(standard.RetryEventAdapter())
+        self._lock = threading.Lock()
+
+    def on_sending_request(self, **kwargs):
+        """Count every HTTP attempt, including retries."""
+        with self._lock:
+            self.requests_sent += 1
+
+    def on_receiving_response(self, **kwargs):
+        """Count responses that botocore classifies as throttling (e.g. 503 SlowDown)."""
+        if self._detector.is_throttling_error(**kwargs):
+            with self._lock:
+                self.throttled_responses += 1
+
+    def snapshot(self):
+        """
+        Return the current counters.
+
+        Returns:
+            dict: Retry mode, attempt and throttle counts, and for adaptive mode
+                whether rate limiting is active, the allowed send rate and the
+                measured send rate in requests per second
+        """
+        with self._lock:
+            metrics = {
+                'retry_mode': self.retry_mode,
+                'requests_sent': self.requests_sent,
+                'throttled_responses': self.throttled_responses
+            }
+
+        if self.rate_limiter is not None:
+            # botocore keeps the limiter state private; read it defensively
+            token_bucket = getattr(self.rate_limiter, '_token_bucket', None)
+            rate_clocker = getattr(self.rate_limiter, '_rate_clocker', None)
+            metrics['rate_limiting_enabled'] = getattr(self.rate_limiter, '_enabled', False)
+            metrics['send_rate_limit'] = round(token_bucket.max_rate, 2) if token_bucket else None
+            metrics['measured_send_rate'] = round(rate_clocker.measured_rate, 2) if rate_clocker else None
+
+        return metrics
+
+
+def create_s3_client(region=None, retry_mode=None, max_attempts=None, session=None):
+    """
+    Create an S3 client with the configured retry mode and attach metrics.
+
+    Adaptive mode is registered explicitly (standard retries plus
+    botocore's adaptive rate limiter) so the limiter can be reported.
+
+    Args:
+        region (str): AWS region; defaults to the environment's region
+        retry_mode (str): 'adaptive', 'standard' or 'legacy'; defaults to S3_RETRY_MODE
+        max_attempts (int): Total attempts per request; defaults to S3_MAX_ATTEMPTS
+        session: Optional boto3 session
+
+    Returns:
+        botocore client: S3 client with a ``clarity_metrics`` attribute
+    """
+    retry_mode = retry_mode or S3_RETRY_MODE
+    max_attempts = max_attempts or S3_MAX_ATTEMPTS
+
+    config = Config(
+        retries={
+            'mode': 'standard' if retry_mode == 'adaptive' else retry_mode,
+            'total_max_attempts': max_attempts
+        },
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS
+    )
+    client = (session or boto3).client('s3', region_name=region, config=config)
+
+    rate_limiter = adaptive.register_retry_handler(client) if retry_mode == 'adaptive' else None
+
+    metrics = S3Metrics(retry_mode, rate_limiter)
+    client.meta.events.register('before-send.s3', metrics.on_sending_request)
+    client.meta.events.register('needs-retry.s3', metrics.on_receiving_response)
+    client.clarity_metrics = metrics
+
+    return client
+
+
+def get_s3_client(region=None):
+    """
+    Return the shared S3 client for a region, creating it on first use.
+
+    boto3 clients are thread-safe, so batch, worker and thread-pool code
+    should all call this rather than creating their own clients.
+
+    Args:
+        region (str): AWS region; defaults to the environment's region
+
+    Returns:
+        botocore client: Shared S3 client
+    """
+    client = _clients.get(region)
+    if client is None:
+        with _lock:
+            client = _clients.get(region)
+            if client is None:
+                client = create_s3_client(region)
+                _clients[region] = client
+                logger.info(f"Created shared S3 client (retry mode: {S3_RETRY_MODE}, max attempts: {S3_MAX_ATTEMPTS})")
+    return client
+
+
+def get_s3_metrics(region=None):
+    """
+    Return send-rate and throttling metrics for the shared client.
+
+    Args:
+        region (str): AWS region of the shared client
+
+    Returns:
+        dict: Metrics snapshot, or an empty dict if no client has been created
+    """
+    client = _clients.get(region)
+    if client is None:
+        return {}
+    return client.clarity_metrics.snapshot()
@@ -0,0 +1,372 @@
+"""
+S3 Key Layout Module
+Builds and parses S3 keys for certificates, in either layout, and webhook archives.
+
+The legacy layout groups certificate keys by sequential IDs:
+
+    certificates/{user_id}/{course_id}/cert-{certificate_number}.pdf
+
+The hashed layout inserts a short hash partition so writes for adjacent
+users spread across many S3 prefixes:
+
+    certificates/{hash}/{user_id}/{course_id}/cert-{certificate_number}.pdf
+
+Partitions are derived from the user ID so all of a user's certificates
+still share one prefix.
+
+The plugin stores single webhook events by day, and those keys are only
+read here:
+
+    webhooks/YYYY/mm/dd/webhook-{contact_id}-{time}.json
+
+Batched webhook segments are partitioned by event type and day instead, so
+a scan of one event type or day only lists its own prefix:
+
+    webhook-segments/event={event_type}/dt=YYYY-mm-dd/{HHMMSS}-{segment_id}.ndjson.gz
+    webhook-archive/event={event_type}/dt=YYYY-mm-dd/part-{part_id}.ndjson.gz
+
+Each segment and archive part has a contact index next to it, with the
+same name ending in .contacts.json instead of .ndjson.gz.
+"""
+
+import os
+import re
+import hashlib
+import logging
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_LEGACY = 'legacy'
+LAYOUT_HASHED = 'hashed'
+
+# Layout used for new keys; existing keys in either layout are still resolved
+KEY_LAYOUT = os.getenv('S3_KEY_LAYOUT', LAYOUT_LEGACY)
+
+# Hex characters in the partition prefix (2 = 256 partitions)
+HASH_PREFIX_LENGTH = int(os.getenv('S3_KEY_HASH_LENGTH', '2'))
+
+CERTIFICATE_ROOT = 'certificates'
+COHORT_ROOT = 'cohorts'
+PREVIEW_ROOT = 'certificate-previews'
+WEBHOOK_ROOT = 'webhooks'
+WEBHOOK_SEGMENT_ROOT = 'webhook-segments'
+WEBHOOK_SEEN_ROOT = 'webhook-dedupe'
+WEBHOOK_ARCHIVE_ROOT = 'webhook-archive'
+WEBHOOK_METRICS_ROOT = 'webhook-metrics'
+
+
+def partition_for(identity):
+    """
+    Return the hash partition for an identity.
+
+    Args:
+        identity: Value the partition is derived from, e.g. a user ID
+
+    Returns:
+        str: Lowercase hex prefix of HASH_PREFIX_LENGTH characters
+    """
+    return hashlib.sha256(str(identity).encode('utf-8')).hexdigest()[:HASH_PREFIX_LENGTH]
+
+
+def _is_partition(segment):
+    """Return True if a key segment looks like a hash partition."""
+    return len(segment) == HASH_PREFIX_LENGTH and all(c in '0123456789abcdef' for c in segment)
+
+
+def certificate_prefix(user_id, layout=None):
+    """
+    Return the prefix that holds all certificates for a user.
+
+    Args:
+        user_id: WordPress user ID
+        layout (str): Key layout; defaults to KEY_LAYOUT
+
+    Returns:
+        str: Key prefix ending in '/'
+    """
+    if (layout or KEY_LAYOUT) == LAYOUT_HASHED:
+        return f"{CERTIFICATE_ROOT}/{partition_for(user_id)}/{user_id}/"
+    return f"{CERTIFICATE_ROOT}/{user_id}/"
+
+
+def certificate_key(user_id, course_id, certificate_number, extension='pdf', layout=None):
+    """
+    Build the S3 key for a certificate.
+
+    Args:
+        user_id: WordPress user ID
+        course_id: Course ID
+        certificate_number (str): Certificate number, e.g. CERT-2024-0847
+        extension (str): File extension without the dot
+        layout (str): Key layout; defaults to KEY_LAYOUT
+
+    Returns:
+        str: S3 key
+    """
+    return f"{certificate_prefix(user_id, layout)}{course_id}/cert-{certificate_number}.{extension}"
+
+
+def preview_key(user_id, course_id, certificate_number, preset, layout=None):
+    """
+    Build the S3 key for a certificate preview image.
+
+    Previews mirror the certificate's key under their own root so listings
+    of certificates/ only return certificates.
+
+    Args:
+        user_id: WordPress user ID
+        course_id: Course ID
+        certificate_number (str): Certificate number
+        preset (str): Preview preset, e.g. thumbnail
+        layout (str): Key layout; defaults to KEY_LAYOUT
+
+    Returns:
+        str: S3 key
+    """
+    certificate_path = certificate_key(user_id, course_id, f"{certificate_number}-{preset}", 'png', layout)
+    return f"{PREVIEW_ROOT}/{certificate_path[len(CERTIFICATE_ROOT) + 1:]}"
+
+
+def cohort_key(course_id, cohort_id):
+    """
+    Build the S3 key for a merged cohort PDF.
+
+    Cohort PDFs are written rarely, so they are not hash-partitioned.
+
+    Args:
+        course_id: Course ID
+        cohort_id (str): Label of the course run
+
+    Returns:
+        str: S3 key
+    """
+    return f"{COHORT_ROOT}/{course_id}/cohort-{cohort_id}.pdf"
+
+
+def parse_certificate_key(s3_key):
+    """
+    Parse a certificate key in either layout.
+
+    Args:
+        s3_key (str): S3 key
+
+    Returns:
+        dict: user_id, course_id, certificate_number, extension and layout,
+            or None if the key is not a certificate
+    """
+    parts = s3_key.split('/')
+    if not parts or parts[0] != CERTIFICATE_ROOT:
+        return None
+
+    if len(parts) == 5 and _is_partition(parts[1]):
+        layout = LAYOUT_HASHED
+        user_id, course_id, filename = parts[2:]
+    elif len(parts) == 4:
+        layout = LAYOUT_LEGACY
+        user_id, course_id, filename = parts[1:]
+    else:
+        return None
+
+    if not filename.startswith('cert-') or '.' not in filename:
+        return None
+
+    certificate_number, extension = filename[len('cert-'):].rsplit('.', 1)
+
+    return {
+        'user_id': user_id,
+        'course_id': course_id,
+        'certificate_number': certificate_number,
+        'extension': extension,
+        'layout': layout
+    }
+
+
+def resolve_certificate_key(s3_client, bucket, user_id, course_id, certificate_number, extension='pdf'):
+    """
+    Find the stored key for a certificate, checking the current layout first.
+
+    Args:
+        s3_client: Boto3 S3 client
+        bucket (str): Bucket name
+        user_id: WordPress user ID
+        course_id: Course ID
+        certificate_number (str): Certificate number
+        extension (str): File extension without the dot
+
+    Returns:
+        str: Existing S3 key, or None if the certificate is not stored in either layout
+    """
+    other = LAYOUT_LEGACY if KEY_LAYOUT == LAYOUT_HASHED else LAYOUT_HASHED
+
+    for layout in (KEY_LAYOUT, other):
+        s3_key = certificate_key(user_id, course_id, certificate_number, extension, layout)
+        try:
+            s3_client.head_object(Bucket=bucket, Key=s3_key)
+            return s3_key
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+
+    logger.info(f"Certificate {certificate_number} not found in any key layout")
+    return None
+
+
+def webhook_day_prefix(day):
+    """
+    Return the prefix holding a day's single-event webhook objects.
+
+    Args:
+        day (date): Day to list
+
+    Returns:
+        str: Key prefix ending in '/'
+    """
+    return f"{WEBHOOK_ROOT}/{day.strftime('%Y/%m/%d')}/"
+
+
+def parse_webhook_key(s3_key):
+    """
+    Parse the key of a single-event webhook object written by the plugin.
+
+    Args:
+        s3_key (str): S3 key
+
+    Returns:
+        dict: date ('YYYY-mm-dd') and filename, or None if the key is not a webhook object
+    """
+    parts = s3_key.split('/')
+    if len(parts) != 5 or parts[0] != WEBHOOK_ROOT:
+        return None
+
+    year, month, day, filename = parts[1:]
+    return {
+        'date': f"{year}-{month}-{day}",
+        'filename': filename
+    }
+
+
+def safe_key_segment(value, max_length=64):
+    """
+    Reduce a value from a payload, e.g. an event type, to a safe key segment.
+
+    Args:
+        value: Value to embed in a key
+        max_length (int): Maximum segment length
+
+    Returns:
+        str: Letters, digits, '.', '_' and '-' only; 'unknown' if nothing is left
+    """
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('._')[:max_length] or 'unknown'
+
+
+def webhook_segment_key(event_type, bucket_start, segment_id):
+    """
+    Build the S3 key for a batched webhook segment.
+
+    Args:
+        event_type (str): GHL event type, e.g. contact_created
+        bucket_start (datetime): Start of the segment's time bucket (UTC)
+        segment_id (str): Unique segment ID, e.g. writer ID and sequence number
+
+    Returns:
+        str: S3 key
+    """
+    return (f"{WEBHOOK_SEGMENT_ROOT}/event={safe_key_segment(event_type)}/"
+            f"dt={bucket_start.strftime('%Y-%m-%d')}/{bucket_start.strftime('%H%M%S')}-{segment_id}.ndjson.gz")
+
+
+def webhook_seen_prefix(window_start):
+    """
+    Return the prefix holding every writer's seen-set for a dedupe window.
+
+    Args:
+        window_start (datetime): Start of the dedupe window (UTC)
+
+    Returns:
+        str: Key prefix ending in '/'
+    """
+    return f"{WEBHOOK_SEEN_ROOT}/{window_start.strftime('%Y%m%dT%H%M%S')}/"
+
+
+def webhook_seen_key(window_start, writer_id):
+    """
+    Build the S3 key for one writer's seen-set of webhook deliveries.
+
+    Args:
+        window_start (datetime): Start of the dedupe window (UTC)
+        writer_id (str): ID of the process that saw the deliveries
+
+    Returns:
+        str: S3 key
+    """
+    return f"{webhook_seen_prefix(window_start)}{writer_id}.bin"
+
+
+def webhook_archive_key(event_type, day, part_id):
+    """
+    Build the S3 key for one part of a compacted day of webhooks.
+
+    Args:
+        event_type (str): GHL event type
+        day (date): Day the webhooks were received
+        part_id (str): Unique part ID, e.g. compaction run ID and part number
+
+    Returns:
+        str: S3 key
+    """
+    return f"{WEBHOOK_ARCHIVE_ROOT}/event={safe_key_segment(event_type)}/dt={day.strftime('%Y-%m-%d')}/part-{part_id}.ndjson.gz"
+
+
+def webhook_archive_index_key(day):
+    """
+    Build the S3 key of the index listing a compacted day's archive parts.
+
+    Args:
+        day (date): Day the webhooks were received
+
+    Returns:
+        str: S3 key
+    """
+    return f"{WEBHOOK_ARCHIVE_ROOT}/index/dt={day.strftime('%Y-%m-%d')}.json"
+
+
+def webhook_contact_index_key(object_key):
+    """
+    Return the key of the contact index stored next to a segment or archive part.
+
+    Args:
+        object_key (str): Key of a .ndjson.gz segment or archive part
+
+    Returns:
+        str: S3 key
+    """
+    return f"{object_key[:-len('.ndjson.gz')]}.contacts.json"
+
+
+def webhook_metrics_prefix(day):
+    """
+    Return the prefix holding every writer's webhook metric rollups for a day.
+
+    Args:
+        day (date): UTC day the rollups' minutes fall on
+
+    Returns:
+        str: Key prefix ending in '/'
+    """
+    return f"{WEBHOOK_METRICS_ROOT}/dt={day.isoformat()}/"
+
+
+def webhook_metrics_key(day, flushed_at, writer_id):
+    """
+    Build the S3 key for one flush of a writer's webhook metric rollups of a day.
+
+    Args:
+        day (date): UTC day the rollups' minutes fall on
+        flushed_at (datetime): Flush time (UTC)
+        writer_id (str): ID of the process that collected the rollups
+
+    Returns:
+        str: S3 key
+    """
+    return f"{webhook_metrics_prefix(day)}{flushed_at.strftime('%Y%m%dT%H%M%S')}-{writer_id}.json"
@@ -0,0 +1,111 @@
+"""
+Single-Flight Module
+Coalesces concurrent duplicate certificate requests so only one render and upload runs per key.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """In-flight call shared between the leader and any waiting followers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and briefly caches the result.
+
+    The first caller for a key (the leader) executes the function. Callers that
+    arrive while it is running (followers) block until the leader finishes and
+    receive the same result or exception. Successful results are kept for
+    ``result_ttl`` seconds so retries that arrive just after completion are
+    served without rendering again.
+    """
+
+    def __init__(self, result_ttl=30):
+        """
+        Initialize the coalescer.
+
+        Args:
+            result_ttl (float): Seconds to keep successful results after completion
+        """
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Execute ``fn`` once for ``key``, sharing the outcome with duplicate callers.
+
+        Args:
+            key (hashable): Identity of the work, e.g. (user_id, course_id, template_hash)
+            fn (callable): Function to run if no call for ``key`` is in flight or cached
+
+        Returns:
+            tuple: (result, shared) where ``shared`` is True if the result came from
+                another caller's in-flight run or the result cache
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                expires_at, result = cached
+                if expires_at > time.monotonic():
+                    logger.info(f"Serving cached result for {key}")
+                    return result, True
+                del self._results[key]
+
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                leader = True
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            logger.info(f"Waiting on in-flight request for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.result_ttl > 0:
+                    self._results[key] = (time.monotonic() + self.result_ttl, call.result)
+                self._purge_expired()
+            call.done.set()
+
+        return call.result, False
+
+    def forget(self, key):
+        """
+        Drop any cached result for ``key`` so the next call renders again.
+
+        Args:
+            key (hashable): Key to invalidate
+        """
+        with self._lock:
+            self._results.pop(key, None)
+
+    def _purge_expired(self):
+        """Remove expired cache entries. Caller must hold the lock."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._results.items() if expires_at <= now]
+        for key in expired:
+            del self._results[key]
@@ -0,0 +1,304 @@
+"""
+Stage Memory Module
+Accounts for the bytes each certificate pipeline stage holds and shares rendered output without copying it.
+
+Every stage that holds an artifact (rendered HTML, the PDF buffer, an upload
+body) wraps that period in ``stage_memory.track(stage, nbytes)``. The
+process-wide ``stage_memory`` then reports per-stage sizes plus the bytes
+held by all stages at once and their peak, which is what limits how many
+renders fit in one container.
+
+With MEMORY_PROFILE=true, ``stage_memory.profile(stage)`` also records a
+tracemalloc snapshot diff, the traced peak and the process RSS around each
+stage, together with the top allocating source lines. When the flag is off
+``profile`` returns a shared no-op context and tracemalloc is never started.
+"""
+
+import io
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows development machines
+    resource = None
+
+MEMORY_PROFILE = os.getenv('MEMORY_PROFILE', 'false').lower() == 'true'
+
+# Allocating source lines reported per stage
+MEMORY_PROFILE_TOP = int(os.getenv('MEMORY_PROFILE_TOP', '5'))
+
+_NO_PROFILE = nullcontext()
+
+# Leave the profiler's own allocations out of the reports
+_PROFILER_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+
+def current_rss():
+    """Return the resident set size of this process in bytes, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageMemory:
+    """
+    Tracks artifact sizes per pipeline stage and the bytes live across all stages.
+    """
+
+    def __init__(self, profiling=MEMORY_PROFILE):
+        self.stages = {}
+        self.live_bytes = 0
+        self.peak_live_bytes = 0
+        self.profiling = profiling
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, stage, nbytes):
+        """
+        Count ``nbytes`` as held by ``stage`` for the duration of the block.
+
+        Args:
+            stage (str): Stage name, e.g. 'html', 'pdf' or 'upload'
+            nbytes (int): Size of the artifact the stage holds
+        """
+        with self._lock:
+            stats = self.stages.setdefault(stage, {'count': 0, 'total_bytes': 0, 'max_bytes': 0})
+            stats['count'] += 1
+            stats['total_bytes'] += nbytes
+            stats['max_bytes'] = max(stats['max_bytes'], nbytes)
+            self.live_bytes += nbytes
+            self.peak_live_bytes = max(self.peak_live_bytes, self.live_bytes)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.live_bytes -= nbytes
+
+    def profile(self, stage):
+        """
+        Profile memory around a stage when MEMORY_PROFILE is enabled.
+
+        Profiles use process-wide tracemalloc state, so stages must not be
+        nested and are only meaningful for one request at a time.
+
+        Args:
+            stage (str): Stage name, e.g. 'parse', 'render', 'pdf' or 'upload'
+
+        Returns:
+            Context manager; a no-op when profiling is disabled
+        """
+        if not self.profiling:
+            return _NO_PROFILE
+        return self._profile(stage)
+
+    @contextmanager
+    def _profile(self, stage):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        traced_start = tracemalloc.get_traced_memory()[0]
+        rss_before = current_rss()
+
+        try:
+            yield
+        finally:
+            traced_end, traced_peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(_PROFILER_FILTERS)
+            before = before.filter_traces(_PROFILER_FILTERS)
+
+            top_allocators = [
+                {
+                    'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    'size_bytes': stat.size_diff,
+                    'blocks': stat.count_diff
+                }
+                for stat in after.compare_to(before, 'lineno')[:MEMORY_PROFILE_TOP]
+            ]
+
+            report = {
+                'traced_peak_bytes': traced_peak - traced_start,
+                'traced_delta_bytes': traced_end - traced_start,
+                'rss_before_bytes': rss_before,
+                'rss_after_bytes': current_rss(),
+                'peak_rss_bytes': peak_rss(),
+                'top_allocators': top_allocators
+            }
+
+            with self._lock:
+                self._profiles.setdefault(stage, []).append(report)
+
+    def profile_report(self):
+        """
+        Return and clear the stage profiles recorded since the last call.
+
+        Returns:
+            dict: Stage name to list of profiles, in the order they ran
+        """
+        with self._lock:
+            profiles, self._profiles = self._profiles, {}
+        return profiles
+
+    def snapshot(self):
+        """
+        Return per-stage and overall memory accounting.
+
+        Returns:
+            dict: For each stage the number of artifacts and their average and
+                largest size, plus the bytes currently held and the peak held at once
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': stats['count'],
+                    'average_bytes': round(stats['total_bytes'] / stats['count']),
+                    'max_bytes': stats['max_bytes']
+                }
+                for stage, stats in self.stages.items()
+            }
+            return {
+                'stages': stages,
+                'live_bytes': self.live_bytes,
+                'peak_live_bytes': self.peak_live_bytes
+            }
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Independent, seekable reader over a shared buffer.
+
+    Lets the S3 upload and preview rasterization read the same rendered PDF
+    at the same time, each with its own position, without copying it.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        chunk = self._view[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = len(self._view) + offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def __len__(self):
+        return len(self._view)
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+# Characters encoded at a time when text is measured or streamed as UTF-8
+ENCODE_CHUNK_CHARS = 64 * 1024
+
+
+def utf8_size(text):
+    """Return the UTF-8 size of a string in bytes, encoding it a chunk at a time."""
+    if text.isascii():
+        return len(text)
+    return sum(len(text[start:start + ENCODE_CHUNK_CHARS].encode('utf-8'))
+               for start in range(0, len(text), ENCODE_CHUNK_CHARS))
+
+
+class EncodedTextReader(io.RawIOBase):
+    """
+    Seekable UTF-8 reader over a string, encoding it a chunk at a time.
+
+    Lets a rendered HTML certificate be uploaded without holding a second,
+    fully encoded copy of it.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._size = utf8_size(text)
+        self._rewind()
+
+    def _rewind(self):
+        self._next_char = 0
+        self._pending = b''
+        self._pending_offset = 0
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        if self._pending_offset == len(self._pending):
+            if self._next_char >= len(self._text):
+                return 0
+            self._pending = self._text[self._next_char:self._next_char + ENCODE_CHUNK_CHARS].encode('utf-8')
+            self._pending_offset = 0
+            self._next_char += ENCODE_CHUNK_CHARS
+
+        count = min(len(target), len(self._pending) - self._pending_offset)
+        target[:count] = self._pending[self._pending_offset:self._pending_offset + count]
+        self._pending_offset += count
+        self._position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset >= self._size:
+            # The end is known from the cached size, so e.g. measuring the body encodes nothing
+            self._next_char = len(self._text)
+            self._pending = b''
+            self._pending_offset = 0
+            self._position = self._size
+            return self._position
+        # Encoded offsets are only known by encoding up to them, so seeking back starts over
+        if offset < self._position:
+            self._rewind()
+        while self._position < offset and self.read(min(offset - self._position, ENCODE_CHUNK_CHARS)):
+            pass
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def __len__(self):
+        return self._size
+
+
+# Shared by every generator and handler in the process
+stage_memory = StageMemory()
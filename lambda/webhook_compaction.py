@@ -0,0 +1,378 @@
+"""
+Webhook Compaction
+Compacts a day of single-event webhook objects into a few compressed archives per event type.
+
+The plugin's upload_webhook_data stores every GHL event as its own object
+under webhooks/YYYY/mm/dd/. For each day this job:
+
+1. lists the day's prefix. A day that does not fit in one listing page is
+   split into key ranges that are listed concurrently.
+2. fetches the objects concurrently, in the order of the receive time in
+   their names, with a bounded number in flight.
+3. streams them into gzip NDJSON parts partitioned by event type, in the
+   same record format as webhook_ingest's segments. Full parts are
+   uploaded as they fill up, so memory holds one open part per event type
+   rather than the day:
+   webhook-archive/event={type}/dt=YYYY-mm-dd/part-{run}-{n}.ndjson.gz
+4. writes a per-day index, webhook-archive/index/dt=YYYY-mm-dd.json, with
+   every part's key, event count, size and time range. Each part also gets
+   a contact index for webhook_lookup.
+5. deletes the originals with delete_objects in 1,000-key batches.
+
+Originals are only deleted once the archives and the index are written.
+Each record keeps its source_key. If a run is repeated for a day that
+already has an index, objects that are already archived are deleted
+without being archived twice. The run ID is a digest of the keys a run
+archives, so a run that crashed before writing the index is redone under
+the same part names and overwrites its parts instead of orphaning them.
+
+Usage:
+    python webhook_compaction.py --date 2025-09-27 [--to 2025-09-30] [--fetch-workers 32] [--keep-originals]
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from s3_client import get_s3_client
+from s3_keys import (
+    parse_webhook_key, webhook_archive_index_key, webhook_archive_key, webhook_contact_index_key,
+    webhook_day_prefix, WEBHOOK_ROOT
+)
+from webhook_routing import route_event
+from webhook_segments import Segment
+
+logger = logging.getLogger('webhook_compaction')
+
+# Concurrent list_objects_v2 paginations
+LIST_WORKERS = int(os.getenv('COMPACTION_LIST_WORKERS', '16'))
+
+# Concurrent GETs of single-event objects
+FETCH_WORKERS = int(os.getenv('COMPACTION_FETCH_WORKERS', '32'))
+
+# Start a new archive part once the current one has this many compressed bytes
+ARCHIVE_PART_BYTES = int(os.getenv('WEBHOOK_ARCHIVE_PART_BYTES', str(64 * 1024 * 1024)))
+
+# delete_objects accepts at most 1,000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Range boundaries within a day prefix for listing it concurrently, by the first character
+# of the contact ID in webhook-* names; every key sorts into exactly one range
+DAY_SHARD_BOUNDARIES = tuple(f"webhook-{c}" for c in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+
+
+class WebhookCompactor:
+    """
+    Compacts days of single-event webhook objects.
+    """
+
+    def __init__(self, list_workers=LIST_WORKERS, fetch_workers=FETCH_WORKERS, delete_originals=True):
+        self.s3_client = get_s3_client()
+        self.s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.list_workers = list_workers
+        self.fetch_workers = fetch_workers
+        self.delete_originals = delete_originals
+
+    def compact_day(self, day):
+        """
+        Compact one day of webhook objects.
+
+        Args:
+            day (date): Day to compact
+
+        Returns:
+            dict: Summary with object counts, archive parts and deletion results
+        """
+        keys = self.list_day(day)
+        index_key = webhook_archive_index_key(day)
+        index = self._read_index(index_key)
+
+        already_archived = self._archived_source_keys(index) if index else set()
+        pending = [key for key in keys if key not in already_archived]
+        logger.info(f"{day}: {len(keys)} webhook objects, {len(keys) - len(pending)} already archived")
+
+        pending.sort(key=lambda key: (self._key_received_at(key), key))
+        run_id = hashlib.sha256('\n'.join(pending).encode('utf-8')).hexdigest()[:16]
+        parts = []
+        if pending:
+            parts = self._write_parts(day, self.fetch_records(pending), run_id)
+
+            index = index or {'date': day.isoformat(), 'partitions': {}, 'runs': []}
+            for part in parts:
+                index['partitions'].setdefault(part['event_type'], []).append(
+                    {name: value for name, value in part.items() if name != 'event_type'}
+                )
+            index['runs'].append({'run_id': run_id, 'source_objects': len(pending), 'compacted_at': datetime.now(timezone.utc).isoformat()})
+            self._put(index_key, json.dumps(index, indent=2).encode('utf-8'), 'application/json')
+
+        deleted, errors = (self._delete(keys) if self.delete_originals else (0, []))
+
+        return {
+            'date': day.isoformat(),
+            'source_objects': len(keys),
+            'archived_objects': len(pending),
+            'parts': [part['key'] for part in parts],
+            'index_key': index_key if index else None,
+            'deleted_objects': deleted,
+            'delete_errors': errors[:20]
+        }
+
+    def list_day(self, day):
+        """
+        List every single-event webhook object of a day.
+
+        Args:
+            day (date): Day to list
+
+        Returns:
+            list: Sorted S3 keys
+        """
+        prefix = webhook_day_prefix(day)
+
+        # Most days fit in one page; only larger days are split into key ranges
+        first_page = self.s3_client.list_objects_v2(Bucket=self.s3_bucket, Prefix=prefix)
+        keys = [obj['Key'] for obj in first_page.get('Contents', [])]
+
+        if first_page.get('IsTruncated'):
+            boundaries = [keys[-1]] + [prefix + b for b in DAY_SHARD_BOUNDARIES if prefix + b > keys[-1]] + [None]
+            with ThreadPoolExecutor(max_workers=self.list_workers) as executor:
+                listed = executor.map(lambda r: self._list_range(prefix, *r), zip(boundaries, boundaries[1:]))
+                keys += [key for batch in listed for key in batch]
+
+        return sorted(key for key in keys if self._is_webhook_object(key))
+
+    def _list_range(self, prefix, start_after=None, end_before=None):
+        """List keys under ``prefix`` in (start_after, end_before)."""
+        params = {'Bucket': self.s3_bucket, 'Prefix': prefix}
+        if start_after:
+            # StartAfter is exclusive; the boundary itself is not a valid webhook key
+            params['StartAfter'] = start_after
+
+        keys = []
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(**params):
+            for obj in page.get('Contents', []):
+                if end_before and obj['Key'] >= end_before:
+                    return keys
+                keys.append(obj['Key'])
+        return keys
+
+    def _is_webhook_object(self, key):
+        parsed = parse_webhook_key(key)
+        return bool(parsed) and parsed['filename'].startswith('webhook-') and parsed['filename'].endswith('.json')
+
+    def fetch_records(self, keys):
+        """
+        Fetch webhook objects concurrently and yield their records in key order.
+
+        At most four times fetch_workers objects are in flight or waiting to
+        be consumed, however many keys there are.
+
+        Args:
+            keys (list): S3 keys
+
+        Yields:
+            dict: Archive records from fetch_record()
+        """
+        window = self.fetch_workers * 4
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            in_flight = deque()
+            for key in keys:
+                in_flight.append(executor.submit(self.fetch_record, key))
+                if len(in_flight) >= window:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    def _key_received_at(self, key):
+        """Return the receive time (epoch seconds) in a webhook object's name, or 0 if it has none."""
+        name_time = parse_webhook_key(key)['filename'][:-len('.json')].rpartition('-')[2]
+        return int(name_time) if name_time.isdigit() else 0
+
+    def fetch_record(self, key):
+        """Download one webhook object and turn it into an archive record."""
+        obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+        body = obj['Body'].read()
+
+        filename = parse_webhook_key(key)['filename'][len('webhook-'):-len('.json')]
+        name_contact, _, name_time = filename.rpartition('-')
+        try:
+            received_at = datetime.fromtimestamp(int(name_time), timezone.utc)
+        except ValueError:
+            received_at = obj['LastModified'].astimezone(timezone.utc)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+
+        event_type, contact_id = 'unknown', None
+        if isinstance(payload, dict):
+            _, event_type, contact_id = route_event(payload)
+
+        record = {
+            'received_at': received_at.isoformat(),
+            'event_type': event_type,
+            'contact_id': contact_id or name_contact or None,
+            'payload': payload,
+            'source_key': key
+        }
+        if payload is None:
+            record['payload_text'] = body.decode('utf-8', errors='replace')
+        return record
+
+    def _write_parts(self, day, records, run_id):
+        """Stream records, in receive-time order, into gzip NDJSON parts per event type."""
+        day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        parts = []
+        part_count = 0
+        # event type -> [segment, first received_at, last received_at]
+        open_parts = {}
+
+        for record in records:
+            event_type = record['event_type']
+            part = open_parts.get(event_type)
+            if part is None:
+                part_id = f"{run_id}-{part_count:04d}"
+                part_count += 1
+                part = open_parts[event_type] = [
+                    Segment(event_type, day_start, webhook_archive_key(event_type, day, part_id)),
+                    record['received_at'], None
+                ]
+            segment = part[0]
+            segment.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n',
+                           record['contact_id'])
+            # Names without a receive time fall back to LastModified, which may be out of order
+            part[1] = min(part[1], record['received_at'])
+            part[2] = max(part[2] or record['received_at'], record['received_at'])
+            if segment.compressed_bytes >= ARCHIVE_PART_BYTES:
+                parts.append(self._upload_part(*open_parts.pop(event_type)))
+
+        for part in open_parts.values():
+            parts.append(self._upload_part(*part))
+        return parts
+
+    def _upload_part(self, segment, first_received_at, last_received_at):
+        body = segment.finish()
+        self._put(segment.s3_key, body, 'application/x-ndjson', content_encoding='gzip')
+        contacts_key = webhook_contact_index_key(segment.s3_key)
+        self._put(contacts_key, json.dumps(segment.contact_index(), separators=(',', ':')).encode('utf-8'), 'application/json')
+        logger.info(f"Wrote {segment.s3_key}: {segment.event_count} events, {segment.raw_bytes} -> {len(body)} bytes")
+        return {
+            'event_type': segment.event_type,
+            'key': segment.s3_key,
+            'contacts_key': contacts_key,
+            'events': segment.event_count,
+            'raw_bytes': segment.raw_bytes,
+            'compressed_bytes': len(body),
+            'first_received_at': first_received_at,
+            'last_received_at': last_received_at
+        }
+
+    def _read_index(self, index_key):
+        try:
+            return json.loads(self.s3_client.get_object(Bucket=self.s3_bucket, Key=index_key)['Body'].read())
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+    def _archived_source_keys(self, index):
+        """Collect the source keys of every part already listed in an index."""
+        source_keys = set()
+        for parts in index['partitions'].values():
+            for part in parts:
+                body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=part['key'])['Body'].read()
+                for line in gzip.decompress(body).splitlines():
+                    source_key = json.loads(line).get('source_key')
+                    if source_key:
+                        source_keys.add(source_key)
+        return source_keys
+
+    def _delete(self, keys):
+        """Delete keys in concurrent 1,000-key batches; returns (deleted count, errors)."""
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+
+        def delete_batch(batch):
+            response = self.s3_client.delete_objects(
+                Bucket=self.s3_bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            return response.get('Errors', [])
+
+        with ThreadPoolExecutor(max_workers=self.list_workers) as executor:
+            errors = [error for batch_errors in executor.map(delete_batch, batches) for error in batch_errors]
+
+        for error in errors[:5]:
+            logger.error(f"Failed to delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        return len(keys) - len(errors), errors
+
+    def _put(self, key, body, content_type, content_encoding=None):
+        params = {
+            'Bucket': self.s3_bucket,
+            'Key': key,
+            'Body': body,
+            'ContentType': content_type,
+            'ServerSideEncryption': 'AES256'
+        }
+        if content_encoding:
+            params['ContentEncoding'] = content_encoding
+        self.s3_client.put_object(**params)
+
+
+def compaction_handler(event, context):
+    """
+    Lambda entry point for scheduled compaction.
+
+    Compacts {"date": "YYYY-mm-dd"}, or yesterday (UTC) when no date is given,
+    so a daily EventBridge schedule needs no input.
+    """
+    try:
+        body = event.get('body', event) if isinstance(event, dict) else {}
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        day = date.fromisoformat(body['date']) if body.get('date') else datetime.now(timezone.utc).date() - timedelta(days=1)
+        result = WebhookCompactor(delete_originals=not body.get('keep_originals')).compact_day(day)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': True, **result})
+        }
+
+    except Exception as e:
+        logger.error(f"Webhook compaction failed: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': False,
+                'error': 'Internal server error occurred while compacting webhooks'
+            })
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Compact single-event {WEBHOOK_ROOT}/ objects into daily archives')
+    parser.add_argument('--date', required=True, type=date.fromisoformat, help='First day to compact (YYYY-mm-dd)')
+    parser.add_argument('--to', type=date.fromisoformat, help='Last day to compact, inclusive (default: --date)')
+    parser.add_argument('--list-workers', type=int, default=LIST_WORKERS, help='Concurrent listings and delete batches')
+    parser.add_argument('--fetch-workers', type=int, default=FETCH_WORKERS, help='Concurrent object downloads')
+    parser.add_argument('--keep-originals', action='store_true', help='Write archives but keep the single-event objects')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    compactor = WebhookCompactor(args.list_workers, args.fetch_workers, not args.keep_originals)
+    day = args.date
+    while day <= (args.to or args.date):
+        print(json.dumps(compactor.compact_day(day), indent=2))
+        day += timedelta(days=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Webhook Dedupe Module
+Drops repeated GHL webhook deliveries before they are written anywhere.
+
+GHL retries deliveries it did not see acknowledged in time, and every copy
+carries the same body. Each delivery is identified by a 16-byte digest of
+its event ID when the payload has one, otherwise of its raw body.
+
+Digests are remembered in two places:
+
+- an in-memory LRU with a TTL per container (WEBHOOK_DEDUPE_CACHE_SIZE,
+  WEBHOOK_DEDUPE_TTL_SECONDS), which catches retries that reach the same
+  container;
+- a seen-set in the bucket, one small binary object of packed digests per
+  container and TTL window under webhook-dedupe/. Ingestion containers
+  load the other containers' seen-sets every WEBHOOK_DEDUPE_SYNC_SECONDS,
+  and on their first delivery.
+
+A delivery is only remembered once it is safe: the ingestion container
+adds it to its LRU after the event was queued, and the archive effect adds
+it to the bucket's seen-set, uploaded right away, once the event's segment
+is in S3 (see webhook_effects). A delivery that failed before that is not
+remembered, so GHL's retry gets through.
+
+Cross-container dedupe is eventual. A retry that reaches another container
+before the original is archived, or within one sync interval of that, can
+still get through.
+"""
+
+import os
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from s3_client import get_s3_client
+from s3_keys import webhook_seen_key, webhook_seen_prefix
+
+logger = logging.getLogger(__name__)
+
+# Deliveries remembered per container
+DEDUPE_CACHE_SIZE = int(os.getenv('WEBHOOK_DEDUPE_CACHE_SIZE', '50000'))
+
+# How long a delivery is remembered; also the width of the persisted windows
+DEDUPE_TTL_SECONDS = int(os.getenv('WEBHOOK_DEDUPE_TTL_SECONDS', '3600'))
+
+# Minimum interval between seen-set uploads and reloads
+DEDUPE_SYNC_SECONDS = float(os.getenv('WEBHOOK_DEDUPE_SYNC_SECONDS', '30'))
+
+# Share seen-sets between containers through the bucket
+DEDUPE_PERSIST = os.getenv('WEBHOOK_DEDUPE_PERSIST', 'true').lower() == 'true'
+
+DIGEST_BYTES = 16
+
+# Top-level payload fields that identify one event across retries
+EVENT_ID_FIELDS = ('webhookId', 'eventId', 'event_id', 'deliveryId')
+
+
+def delivery_digest(raw_body, data=None):
+    """
+    Return the dedupe digest of a delivery.
+
+    Args:
+        raw_body (bytes): Raw request body
+        data (dict): Parsed payload, if available
+
+    Returns:
+        bytes: DIGEST_BYTES-long digest of the event ID, or of the body if there is none
+    """
+    if data:
+        for field in EVENT_ID_FIELDS:
+            if data.get(field):
+                return hashlib.sha256(f"id:{data[field]}".encode('utf-8')).digest()[:DIGEST_BYTES]
+    return hashlib.sha256(raw_body).digest()[:DIGEST_BYTES]
+
+
+class TTLCache:
+    """
+    Bounded LRU set whose entries expire after a fixed TTL.
+    """
+
+    def __init__(self, capacity, ttl_seconds):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._expiry = OrderedDict()
+
+    def contains(self, key, now):
+        """
+        Report whether ``key`` is remembered and not expired.
+
+        Returns:
+            bool: True if ``key`` was present and not expired
+        """
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at > now:
+            self._expiry.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key, now):
+        """Remember ``key`` for the TTL, evicting the least recently used keys beyond capacity."""
+        self._expiry[key] = now + self.ttl_seconds
+        self._expiry.move_to_end(key)
+        while len(self._expiry) > self.capacity:
+            self._expiry.popitem(last=False)
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+class DeliveryFilter:
+    """
+    Recognizes webhook deliveries this container or another one has already accepted.
+    """
+
+    def __init__(self, s3_client=None, s3_bucket=None, persist=DEDUPE_PERSIST, cache_size=DEDUPE_CACHE_SIZE,
+                 ttl_seconds=DEDUPE_TTL_SECONDS, sync_seconds=DEDUPE_SYNC_SECONDS):
+        self.persist = persist
+        self.s3_client = (s3_client or get_s3_client()) if persist else None
+        self.s3_bucket = s3_bucket or os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.ttl_seconds = ttl_seconds
+        self.sync_seconds = sync_seconds
+        self.writer_id = uuid.uuid4().hex[:12]
+        self.duplicates = 0
+        self._cache = TTLCache(cache_size, ttl_seconds)
+        self._own = {}
+        self._remote = {}
+        self._remote_etags = {}
+        self._dirty = set()
+        self._last_sync = None
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, digest):
+        """
+        Check whether a delivery was already accepted, without remembering it.
+
+        Args:
+            digest (bytes): Digest from delivery_digest()
+
+        Returns:
+            bool: True if the delivery was seen before and should be dropped
+        """
+        now = time.time()
+        window = self._window(now)
+
+        with self._lock:
+            duplicate = self._cache.contains(digest, now)
+            if not duplicate and self.persist:
+                duplicate = any(digest in self._remote.get(w, ()) for w in (window, window - self.ttl_seconds))
+            if duplicate:
+                self.duplicates += 1
+        return duplicate
+
+    def remember(self, digests, persist=True):
+        """
+        Remember deliveries that have been safely accepted.
+
+        Args:
+            digests (iterable): Digests from delivery_digest()
+            persist (bool): Also add them to this container's seen-set, for publish()
+        """
+        now = time.time()
+        window = self._window(now)
+
+        with self._lock:
+            for digest in digests:
+                self._cache.add(digest, now)
+                if persist and self.persist:
+                    self._own.setdefault(window, set()).add(digest)
+                    self._dirty.add(window)
+
+    def publish(self):
+        """
+        Upload this container's seen-set windows that changed since the last upload.
+
+        Failures are logged and retried on the next publish or sync.
+        """
+        if not self.persist:
+            return
+
+        with self._lock:
+            live = self._prune()
+            uploads = {window: b''.join(sorted(self._own[window])) for window in self._dirty if window in live}
+            self._dirty = set()
+
+        try:
+            for window, packed in uploads.items():
+                self.s3_client.put_object(
+                    Bucket=self.s3_bucket,
+                    Key=webhook_seen_key(self._window_start(window), self.writer_id),
+                    Body=packed,
+                    ContentType='application/octet-stream',
+                    ServerSideEncryption='AES256'
+                )
+        except Exception as e:
+            logger.error(f"Webhook seen-set upload failed: {str(e)}")
+            with self._lock:
+                self._dirty.update(uploads)
+
+    def sync(self, force=False):
+        """
+        Publish this container's new digests and load other containers' seen-sets, when due.
+
+        Failures are logged and retried on the next sync; dedupe then falls
+        back to the in-memory cache.
+
+        Args:
+            force (bool): Sync even if the last sync was recent
+        """
+        if not self.persist:
+            return
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_seconds:
+            return
+        self._last_sync = now
+
+        self.publish()
+        with self._lock:
+            live = self._prune()
+            live_prefixes = tuple(webhook_seen_prefix(self._window_start(window)) for window in live)
+            self._remote_etags = {key: etag for key, etag in self._remote_etags.items() if key.startswith(live_prefixes)}
+
+        try:
+            for window in live:
+                self._load_window(window)
+        except Exception as e:
+            logger.error(f"Webhook seen-set sync failed: {str(e)}")
+
+    def _prune(self):
+        """Drop windows older than the TTL; returns the live windows. Caller holds the lock."""
+        current = self._window(time.time())
+        live = (current - self.ttl_seconds, current)
+        for window in [w for w in self._own if w not in live]:
+            del self._own[window]
+        for window in [w for w in self._remote if w not in live]:
+            del self._remote[window]
+        return live
+
+    def _load_window(self, window):
+        """Merge the seen-sets other containers wrote for a window."""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        own_key = webhook_seen_key(self._window_start(window), self.writer_id)
+
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=webhook_seen_prefix(self._window_start(window))):
+            for obj in page.get('Contents', []):
+                if obj['Key'] == own_key or self._remote_etags.get(obj['Key']) == obj['ETag']:
+                    continue
+                packed = self.s3_client.get_object(Bucket=self.s3_bucket, Key=obj['Key'])['Body'].read()
+                digests = {packed[i:i + DIGEST_BYTES] for i in range(0, len(packed), DIGEST_BYTES)}
+                with self._lock:
+                    self._remote.setdefault(window, set()).update(digests)
+                self._remote_etags[obj['Key']] = obj['ETag']
+
+    def _window(self, timestamp):
+        return int(timestamp) // self.ttl_seconds * self.ttl_seconds
+
+    def _window_start(self, window):
+        return datetime.fromtimestamp(window, timezone.utc)
+
+
+# Created on first use so importing the module does not create an S3 client
+_deliveries = None
+
+
+def get_delivery_filter():
+    """Return the container's duplicate-delivery filter."""
+    global _deliveries
+    if _deliveries is None:
+        _deliveries = DeliveryFilter()
+    return _deliveries
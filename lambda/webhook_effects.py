@@ -0,0 +1,370 @@
+"""
+Webhook Effects
+Runs the side effects of accepted GHL webhooks off the acknowledgement path.
+
+Clarity_GHL_Webhook uploads the event to S3, upserts the contact and sends
+the notification email before it answers GHL, so a slow dependency turns
+into GHL timeouts and retries. webhook_ingest only puts accepted events on
+a work queue (see webhook_queue). This module consumes the queue, batch by
+batch, and runs each event's effects:
+
+- archive: append the event to a webhook segment (see webhook_segments).
+  Consuming WEBHOOK_QUEUE_URL, every batch ends by uploading its segments,
+  so a queue message is only settled once its event is in S3. Without the
+  queue, segments are uploaded when they are full or old enough, and at
+  exit. Once a segment is in S3, its deliveries are published to the
+  shared dedupe seen-set;
+- contact: upsert the contact into clarity_ghl_contacts, for contact
+  events when CONTACTS_DB_URL is set. A batch's contacts are collapsed
+  and written with one multi-row upsert (see ghl_contacts);
+- notify: email WEBHOOK_NOTIFICATION_EMAIL through SES, for important
+  events.
+
+Which effects an event needs comes from its route (see webhook_routing).
+Every effect has its own thread pool, so a slow mail server never holds up
+archiving. Failed effects are retried in place with backoff. Effects that
+still fail are sent back to the queue, on their own and with a delay, up to
+WEBHOOK_EFFECT_MAX_DEFERRALS times. After that the message is reported as
+failed so SQS's redrive policy can dead-letter it.
+
+Deploy effects_handler as the SQS-triggered consumer of WEBHOOK_QUEUE_URL
+with ReportBatchItemFailures enabled.
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+
+from ghl_contacts import CONTACT_COLUMNS, CONTACTS_DB_URL, ContactsDatabase, collapse_rows, contact_row
+from webhook_dedupe import get_delivery_filter
+from webhook_queue import WEBHOOK_QUEUE_URL
+from webhook_segments import SegmentBuffer
+
+logger = logging.getLogger(__name__)
+
+# In-place attempts per effect before it is deferred
+EFFECT_ATTEMPTS = int(os.getenv('WEBHOOK_EFFECT_ATTEMPTS', '3'))
+
+# Times failed effects are sent back to the queue before the message is dead-lettered
+EFFECT_MAX_DEFERRALS = int(os.getenv('WEBHOOK_EFFECT_MAX_DEFERRALS', '5'))
+
+# Concurrent workers per effect
+ARCHIVE_CONCURRENCY = int(os.getenv('WEBHOOK_ARCHIVE_CONCURRENCY', '4'))
+CONTACT_CONCURRENCY = int(os.getenv('WEBHOOK_CONTACT_CONCURRENCY', '2'))
+NOTIFY_CONCURRENCY = int(os.getenv('WEBHOOK_NOTIFY_CONCURRENCY', '2'))
+
+# Notification recipient for important events, as the plugin's notification_email; notifications are off when unset
+NOTIFICATION_EMAIL = os.getenv('WEBHOOK_NOTIFICATION_EMAIL', '')
+
+# SES-verified sender of notifications; defaults to the recipient
+NOTIFICATION_FROM = os.getenv('WEBHOOK_NOTIFICATION_FROM', '') or NOTIFICATION_EMAIL
+
+# SQS caps DelaySeconds at 15 minutes
+MAX_DEFERRAL_DELAY_SECONDS = 900
+
+
+def effects_for(route):
+    """
+    Return the effects an event of a route needs, in the plugin's order.
+
+    Args:
+        route (EventRoute): Route from webhook_routing.route_event()
+
+    Returns:
+        list: Effect names
+    """
+    effects = ['archive']
+    if route.is_contact:
+        effects.append('contact')
+    if route.is_important:
+        effects.append('notify')
+    return effects
+
+
+class Effect:
+    """
+    One kind of side effect with its own concurrency limit and retry budget.
+
+    ``run(message)`` performs the effect for one message and returns a
+    result. ``settle(results)``, if given, runs once per batch after every
+    ``run`` has finished and returns the results whose effect did not take
+    hold after all. ``flush()``, if given, completes buffered work when the
+    runner is flushed, e.g. at exit.
+    """
+
+    def __init__(self, name, run, concurrency=1, attempts=EFFECT_ATTEMPTS, settle=None, flush=None):
+        self.name = name
+        self.run = run
+        self.settle = settle
+        self.flush = flush
+        self.attempts = attempts
+        # Batches using the same effect run one at a time, so a settle only sees its own batch
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"effect-{name}")
+
+    def run_with_retries(self, message):
+        for attempt in range(self.attempts):
+            try:
+                return self.run(message)
+            except Exception as e:
+                if attempt == self.attempts - 1:
+                    raise
+                logger.warning(f"Webhook effect {self.name} failed (attempt {attempt + 1}), retrying: {str(e)}")
+                time.sleep(min(0.2 * 2 ** attempt, 5))
+
+
+class EffectRunner:
+    """
+    Runs the effects of queued webhook messages, one batch at a time.
+    """
+
+    def __init__(self, effects=None):
+        self.effects = {effect.name: effect for effect in (effects if effects is not None else default_effects())}
+
+    def process_batch(self, messages):
+        """
+        Run every effect each message asks for, and settle the batch.
+
+        Effects the runner does not have, e.g. contact upserts without
+        CONTACTS_DB_URL, are skipped. Batches that share no effect run
+        concurrently.
+
+        Args:
+            messages (list): Queue messages with 'record' and 'effects'
+
+        Returns:
+            list: (message, failed effect names) for messages with failures
+        """
+        names = sorted({name for message in messages for name in message['effects'] if name in self.effects})
+        with ExitStack() as locks:
+            for name in names:
+                locks.enter_context(self.effects[name].lock)
+
+            futures = []
+            for index, message in enumerate(messages):
+                for name in message['effects']:
+                    effect = self.effects.get(name)
+                    if effect is not None:
+                        futures.append((index, effect, effect.executor.submit(effect.run_with_retries, message)))
+
+            failed = {}
+            results = {}
+            for index, effect, future in futures:
+                try:
+                    results.setdefault(effect.name, []).append((index, future.result()))
+                except Exception as e:
+                    logger.error(f"Webhook effect {effect.name} failed for {messages[index]['record']['event_type']}: {str(e)}")
+                    failed.setdefault(index, []).append(effect.name)
+
+            for name, effect_results in results.items():
+                effect = self.effects[name]
+                if effect.settle is None:
+                    continue
+                try:
+                    unsettled = effect.settle([result for _, result in effect_results])
+                except Exception as e:
+                    logger.error(f"Settling webhook effect {name} failed: {str(e)}")
+                    unsettled = {result for _, result in effect_results}
+                for index, result in effect_results:
+                    if result in unsettled:
+                        failed.setdefault(index, []).append(name)
+
+        return [(messages[index], failed_names) for index, failed_names in sorted(failed.items())]
+
+    def flush(self):
+        """Complete every effect's buffered work, e.g. upload open webhook segments."""
+        for effect in self.effects.values():
+            if effect.flush is None:
+                continue
+            with effect.lock:
+                try:
+                    effect.flush()
+                except Exception as e:
+                    logger.error(f"Flushing webhook effect {effect.name} failed: {str(e)}")
+
+
+def archive_effect(segments=None, deliveries=None, upload_each_batch=None):
+    """
+    Append events to webhook segments.
+
+    With upload_each_batch, every batch's segments are uploaded before it
+    settles, and events of segments that failed to upload are reported as
+    failed. Otherwise segments are uploaded once full or old enough, and by
+    the runner's flush; failed uploads are retried by the next flush. Once a
+    segment is in S3, its deliveries are added to the shared seen-set (see
+    webhook_dedupe).
+
+    Args:
+        segments (SegmentBuffer): Segment buffer; defaults to a new one
+        deliveries (DeliveryFilter): Dedupe filter; defaults to the container's
+        upload_each_batch (bool): Defaults to True when consuming WEBHOOK_QUEUE_URL
+    """
+    segments = segments or SegmentBuffer()
+    deliveries = deliveries or get_delivery_filter()
+    if upload_each_batch is None:
+        upload_each_batch = bool(WEBHOOK_QUEUE_URL)
+    # Segment key -> digests of the deliveries in it, published once the segment is in S3
+    unarchived = {}
+
+    def run(message):
+        record = message['record']
+        segment_key = segments.append(record['event_type'], record, datetime.fromisoformat(record['received_at']))
+        return segment_key, message.get('digest')
+
+    def archived(segment_keys):
+        digests = [bytes.fromhex(digest) for segment_key in segment_keys for digest in unarchived.pop(segment_key, ())]
+        if digests:
+            deliveries.remember(digests)
+            deliveries.publish()
+
+    def settle(results):
+        for segment_key, digest in results:
+            if digest:
+                unarchived.setdefault(segment_key, []).append(digest)
+
+        if not upload_each_batch:
+            archived(segments.flush_due())
+            return set()
+
+        # Failed segments are redelivered through the queue rather than retried here,
+        # so their events are not archived twice
+        archived(segments.flush_all())
+        failed = set(segments.discard_failed())
+        for segment_key in failed:
+            unarchived.pop(segment_key, None)
+        return {result for result in results if result[0] in failed}
+
+    def flush():
+        archived(segments.flush_all())
+
+    return Effect('archive', run, ARCHIVE_CONCURRENCY, settle=settle, flush=flush)
+
+
+def contact_effect(database=None):
+    """Upsert contact events into clarity_ghl_contacts, collapsed into one multi-row upsert per batch."""
+    database = database or ContactsDatabase()
+
+    def run(message):
+        row = contact_row(message['record'])
+        if row is None:
+            return None
+        return message['record']['received_at'], tuple(row[column] for column in CONTACT_COLUMNS)
+
+    def settle(results):
+        ordered = sorted((result for result in results if result), key=lambda result: result[0])
+        rows = [dict(zip(CONTACT_COLUMNS, values)) for _, values in ordered]
+        database.upsert_contacts(list(collapse_rows(rows).values()))
+        return set()
+
+    return Effect('contact', run, CONTACT_CONCURRENCY, settle=settle)
+
+
+def notify_effect(recipient=NOTIFICATION_EMAIL, sender=NOTIFICATION_FROM, ses_client=None):
+    """Email important events through SES, in the plugin's notification format."""
+    ses_client = ses_client or boto3.client('ses', region_name=os.getenv('S3_REGION') or None)
+
+    def run(message):
+        record = message['record']
+        body = (
+            "A new GoHighLevel webhook event was received:\n\n"
+            f"Event Type: {record['event_type']}\n"
+            f"Contact ID: {record.get('contact_id') or 'N/A'}\n"
+            f"Timestamp: {record['received_at']}\n\n"
+            f"Data: {json.dumps(record.get('payload'), indent=4)}"
+        )
+        ses_client.send_email(
+            Source=sender,
+            Destination={'ToAddresses': [recipient]},
+            Message={
+                'Subject': {'Data': f"[GHL Webhook] New {record['event_type']} Event"},
+                'Body': {'Text': {'Data': body}}
+            }
+        )
+
+    return Effect('notify', run, NOTIFY_CONCURRENCY)
+
+
+def default_effects():
+    """Return the effects enabled by the environment; archiving is always on."""
+    effects = [archive_effect()]
+    if CONTACTS_DB_URL:
+        effects.append(contact_effect())
+    if NOTIFICATION_EMAIL:
+        effects.append(notify_effect())
+    return effects
+
+
+def defer_failures(queue, failures):
+    """
+    Send failed effects back to the queue on their own, with a growing delay.
+
+    Args:
+        queue: Work queue from webhook_queue
+        failures (list): (message, failed effect names) from EffectRunner.process_batch()
+
+    Returns:
+        list: Messages that could not be deferred and should be redelivered as a whole
+    """
+    undeferred = []
+    for message, names in failures:
+        deferrals = message.get('deferrals', 0)
+        if deferrals >= EFFECT_MAX_DEFERRALS:
+            logger.error(f"Giving up on effects {names} of {message['record']['event_type']} "
+                         f"received at {message['record']['received_at']}")
+            undeferred.append(message)
+            continue
+        try:
+            queue.send(dict(message, effects=names, deferrals=deferrals + 1),
+                       delay_seconds=min(30 * 2 ** deferrals, MAX_DEFERRAL_DELAY_SECONDS))
+        except Exception as e:
+            logger.error(f"Deferring webhook effects {names} failed: {str(e)}")
+            undeferred.append(message)
+    return undeferred
+
+
+# Created on first use so importing the module does not create clients; flushed when the process exits
+_runner = None
+
+
+def get_effect_runner():
+    """Return the container's effect runner."""
+    global _runner
+    if _runner is None:
+        _runner = EffectRunner()
+        atexit.register(_runner.flush)
+    return _runner
+
+
+def effects_handler(event, context):
+    """
+    Lambda entry point for the SQS trigger of the webhook work queue.
+
+    Returns:
+        dict: Partial batch response listing the messages SQS should redeliver
+    """
+    from webhook_queue import get_work_queue
+
+    messages, message_ids = [], []
+    for sqs_record in event.get('Records', []):
+        messages.append(json.loads(sqs_record['body']))
+        message_ids.append(sqs_record['messageId'])
+
+    failures = get_effect_runner().process_batch(messages)
+    undeferred = {id(message) for message in defer_failures(get_work_queue(), failures)}
+
+    logger.info(f"Processed {len(messages)} webhook messages, {len(failures)} with failed effects, "
+                f"{len(undeferred)} returned to the queue")
+    return {
+        'batchItemFailures': [
+            {'itemIdentifier': message_id}
+            for message, message_id in zip(messages, message_ids) if id(message) in undeferred
+        ]
+    }
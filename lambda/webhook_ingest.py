@@ -0,0 +1,244 @@
+"""
+Webhook Ingestion Lambda
+Accepts GoHighLevel webhooks and acknowledges them as soon as they are queued, leaving side effects to consumers.
+
+The WordPress plugin's Clarity_GHL_Webhook PUTs every event to S3,
+upserts the contact and sends a notification before it answers GHL, so
+any slow dependency delays the answer. This entry point verifies and
+parses the event, classifies it with the routing table in webhook_routing,
+and puts one message with the event record and the effects it needs on the
+work queue (see webhook_queue). It answers as soon as the queue has the
+message. The consumers in webhook_effects then append the event to a
+compressed NDJSON segment, upsert the contact and send the notification.
+
+Repeated deliveries of the same event are acknowledged but dropped before
+they are queued (see webhook_dedupe), except for replays marked with
+X-Clarity-Replay: 1 by webhook_replay. A delivery only counts as seen once
+it was queued, and across containers once it was archived.
+
+When GHL_WEBHOOK_SECRET is set, requests are verified by webhook_signature
+before the body is parsed; oversized bodies are always rejected.
+
+Every request's event type, outcome, size and latency is added to the
+container's per-minute rollups (see webhook_metrics).
+
+Without WEBHOOK_QUEUE_URL there is no durable queue. Each event is then
+appended to its in-memory segment before it is acknowledged, and its
+other effects run from an in-process queue (see webhook_queue). Segments
+are uploaded when full or old enough, checked on every request, and when
+the process exits.
+
+Usage (replays fixtures locally):
+    python webhook_ingest.py ../tests/mock-ghl-*.json [--local-s3 ./local-s3]
+"""
+
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timezone
+
+from webhook_dedupe import delivery_digest, get_delivery_filter
+from webhook_effects import defer_failures, effects_for, get_effect_runner
+from webhook_metrics import get_metrics
+from webhook_queue import MessageTooLarge, get_work_queue
+from webhook_routing import route_event
+from webhook_signature import WebhookRejected, WebhookVerifier
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Same accepted types as Clarity_GHL_Webhook::is_valid_content_type
+VALID_CONTENT_TYPES = ('application/json', 'application/json; charset=utf-8', 'text/json')
+
+# Sent by webhook_replay; replayed events are processed again even if their delivery was already seen
+REPLAY_HEADER = 'x-clarity-replay'
+
+# Keyed once per container; verification is cheap enough to run before anything else
+verifier = WebhookVerifier()
+
+def webhook_handler(event, context):
+    """
+    Lambda entry point for GHL webhooks behind API Gateway.
+    """
+    start_time = time.perf_counter()
+    response, event_type, status = _ingest(event, start_time)
+
+    try:
+        metrics = get_metrics()
+        metrics.record(event_type, status or ('rejected' if response['statusCode'] < 500 else 'error'),
+                       payload_bytes(event), (time.perf_counter() - start_time) * 1000)
+        metrics.flush_due()
+    except Exception as e:
+        logger.error(f"Recording webhook metrics failed: {str(e)}")
+
+    return response
+
+
+def _ingest(event, start_time):
+    """
+    Verify, classify and queue one webhook.
+
+    Returns:
+        tuple: (response, event type, metrics status or None for error responses)
+    """
+    event_type = 'unknown'
+
+    try:
+        headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+        content_type = (headers.get('content-type') or '').strip().lower()
+        if content_type not in VALID_CONTENT_TYPES:
+            return error_response(400, 'Invalid content type. Expected application/json'), event_type, None
+
+        try:
+            raw_body = verifier.verify(event, headers)
+        except WebhookRejected as e:
+            logger.warning(f"Webhook rejected: {e.message}")
+            return error_response(e.status_code, e.message), event_type, None
+
+        try:
+            data = json.loads(raw_body)
+        except ValueError as e:
+            return error_response(400, f'Invalid JSON: {str(e)}'), event_type, None
+        if not isinstance(data, dict):
+            return error_response(400, 'Invalid JSON: expected an object'), event_type, None
+
+        route, event_type, contact_id = route_event(data)
+        received_at = datetime.now(timezone.utc)
+
+        # GHL retries are acknowledged again but not stored again; replays are meant to be
+        deliveries = get_delivery_filter()
+        deliveries.sync()
+        digest = delivery_digest(raw_body, data)
+        if headers.get(REPLAY_HEADER) != '1' and deliveries.is_duplicate(digest):
+            logger.info(f"Duplicate {event_type} delivery ignored")
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'success': True,
+                    'message': 'Duplicate delivery ignored',
+                    'duplicate': True,
+                    'event_type': event_type,
+                    'contact_id': contact_id,
+                    'timestamp': received_at.isoformat()
+                })
+            }, event_type, 'duplicate'
+
+        message = {
+            'record': {
+                'received_at': received_at.isoformat(),
+                'event_type': event_type,
+                'contact_id': contact_id,
+                'payload': data
+            },
+            'effects': effects_for(route),
+            # Added to the shared seen-set once the event is archived
+            'digest': digest.hex()
+        }
+        message_id = enqueue(message)
+        deliveries.remember([digest], persist=False)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': True,
+                'message': 'Webhook accepted',
+                'event_type': event_type,
+                'contact_id': contact_id,
+                'message_id': message_id,
+                'processing_time_ms': round((time.perf_counter() - start_time) * 1000, 2),
+                'timestamp': received_at.isoformat()
+            })
+        }, event_type, 'success'
+
+    except Exception as e:
+        logger.error(f"Webhook ingestion failed: {str(e)}", exc_info=True)
+        return error_response(500, 'Internal server error'), event_type, None
+
+
+def payload_bytes(event):
+    """Return the request body size in bytes."""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        return len(body) * 3 // 4
+    return len(body.encode('utf-8')) if isinstance(body, str) else len(body)
+
+
+def enqueue(message):
+    """
+    Hand an accepted event to the work queue.
+
+    When the queue is not durable, the event is appended to its webhook
+    segment before the webhook is answered, and only its other effects are
+    queued. Events too large for a queue message run every effect before
+    the webhook is answered.
+
+    Args:
+        message (dict): Message with the event record and its effects
+
+    Returns:
+        str: Queue message ID, or None if the effects already ran
+    """
+    work_queue = get_work_queue()
+    if work_queue.durable:
+        try:
+            return work_queue.send(message)
+        except MessageTooLarge:
+            logger.warning(f"{message['record']['event_type']} event too large to queue, processing it inline")
+            failures = get_effect_runner().process_batch([message])
+            if failures and ('archive' in failures[0][1] or defer_failures(work_queue, failures)):
+                raise Exception(f"Webhook effects failed: {', '.join(failures[0][1])}")
+            return None
+
+    if get_effect_runner().process_batch([dict(message, effects=['archive'])]):
+        raise Exception('Webhook effect archive failed')
+    deferred = [name for name in message['effects'] if name != 'archive']
+    return work_queue.send(dict(message, effects=deferred)) if deferred else None
+
+
+def error_response(status_code, message):
+    """Return an error in the plugin's webhook error format."""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'success': False,
+            'error': message,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        })
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay GHL webhook payloads through the ingestion handler')
+    parser.add_argument('payloads', nargs='+', help='JSON files shaped like tests/mock-ghl-*.json')
+    parser.add_argument('--local-s3', help='Write segments to this directory instead of S3')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.local_s3:
+        from local_s3 import LocalS3
+        LocalS3(args.local_s3).install()
+
+    for path in args.payloads:
+        with open(path, 'rb') as f:
+            raw_body = f.read()
+        headers = {'Content-Type': 'application/json'}
+        if verifier.enabled:
+            headers['X-GHL-Signature'] = verifier.sign(raw_body)
+        event = {'headers': headers, 'body': raw_body.decode('utf-8')}
+        response = webhook_handler(event, None)
+        print(f"{path}: {response['statusCode']} {response['body']}")
+
+    work_queue = get_work_queue()
+    if not work_queue.durable:
+        work_queue.drain()
+        get_effect_runner().flush()
+        print('Processed every deferred effect and uploaded open segments')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Webhook Lookup
+Finds every stored webhook of one contact through the contact indexes, using ranged GETs instead of scans.
+
+Every ingestion segment and compaction archive part is a series of
+independently decompressible gzip blocks. Next to it is a .contacts.json
+index with the blocks' byte ranges and a sorted list of contact IDs
+mapped to the blocks that hold their events. A lookup:
+
+1. finds the indexes for the requested days: archive parts from the
+   per-day archive index, and segments by listing their event type and
+   day prefixes;
+2. binary-searches each index for the contact;
+3. fetches only the matching blocks with ranged GETs, merging adjacent
+   blocks into one request.
+
+Indexes and blocks are fetched concurrently.
+
+Usage:
+    python webhook_lookup.py contact_abc123def --from 2025-09-01 [--to 2025-09-30] [--event contact_created]
+"""
+
+import os
+import json
+import gzip
+import bisect
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from s3_client import get_s3_client
+from s3_keys import safe_key_segment, webhook_archive_index_key, WEBHOOK_SEGMENT_ROOT
+
+logger = logging.getLogger(__name__)
+
+# Concurrent index and block requests per lookup
+LOOKUP_WORKERS = int(os.getenv('WEBHOOK_LOOKUP_WORKERS', '16'))
+
+# Days searched when a lookup gives no start date
+LOOKUP_DEFAULT_DAYS = 7
+
+
+class ContactLookup:
+    """
+    Looks up stored webhook events by GHL contact ID.
+    """
+
+    def __init__(self, workers=LOOKUP_WORKERS):
+        self.s3_client = get_s3_client()
+        self.s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.workers = workers
+
+    def find(self, contact_id, date_from, date_to=None, event_types=None):
+        """
+        Return every stored event of a contact in a date range.
+
+        Args:
+            contact_id (str): GHL contact ID
+            date_from (date): First day to search
+            date_to (date): Last day to search, inclusive; defaults to date_from
+            event_types (list): Only search these event types
+
+        Returns:
+            list: Event records sorted by receive time
+        """
+        days = []
+        day = date_from
+        while day <= (date_to or date_from):
+            days.append(day)
+            day += timedelta(days=1)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            index_keys = self._index_keys(executor, days, event_types)
+            found = executor.map(lambda key: self._search(key, contact_id), index_keys)
+            records = [record for batch in found for record in batch]
+
+        records.sort(key=lambda record: record['received_at'])
+        logger.info(f"Found {len(records)} events for contact {contact_id} in {len(index_keys)} indexed objects")
+        return records
+
+    def _index_keys(self, executor, days, event_types):
+        """Collect the contact index keys of archive parts and segments for the given days."""
+        wanted = {safe_key_segment(event_type) for event_type in event_types} if event_types else None
+
+        segment_types = [
+            prefix[len(f"{WEBHOOK_SEGMENT_ROOT}/event="):-1]
+            for prefix in self._common_prefixes(f"{WEBHOOK_SEGMENT_ROOT}/")
+        ]
+        segment_prefixes = [
+            f"{WEBHOOK_SEGMENT_ROOT}/event={event_type}/dt={day.isoformat()}/"
+            for day in days for event_type in segment_types if wanted is None or event_type in wanted
+        ]
+
+        archive_keys = executor.map(lambda day: self._archive_index_keys(day, wanted), days)
+        segment_keys = executor.map(self._segment_index_keys, segment_prefixes)
+        return [key for batch in archive_keys for key in batch] + [key for batch in segment_keys for key in batch]
+
+    def _archive_index_keys(self, day, wanted):
+        try:
+            body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=webhook_archive_index_key(day))['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return []
+            raise
+
+        return [
+            part['contacts_key']
+            for event_type, parts in json.loads(body)['partitions'].items()
+            if wanted is None or safe_key_segment(event_type) in wanted
+            for part in parts if part.get('contacts_key')
+        ]
+
+    def _segment_index_keys(self, prefix):
+        keys = []
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=self.s3_bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.contacts.json'))
+        return keys
+
+    def _common_prefixes(self, prefix):
+        prefixes = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=prefix, Delimiter='/'):
+            prefixes.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+        return prefixes
+
+    def _search(self, index_key, contact_id):
+        """Read one contact index and fetch the contact's blocks from its object."""
+        index = json.loads(self.s3_client.get_object(Bucket=self.s3_bucket, Key=index_key)['Body'].read())
+
+        contact_ids = index['contact_ids']
+        position = bisect.bisect_left(contact_ids, contact_id)
+        if position == len(contact_ids) or contact_ids[position] != contact_id:
+            return []
+
+        records = []
+        # Encoded like the segment lines, which keep non-ASCII characters unescaped
+        needle = json.dumps(contact_id, ensure_ascii=False).encode('utf-8')
+        for start, end in self._byte_ranges(index['blocks'], index['contact_blocks'][position]):
+            response = self.s3_client.get_object(
+                Bucket=self.s3_bucket, Key=index['object_key'], Range=f"bytes={start}-{end}"
+            )
+            for line in gzip.decompress(response['Body'].read()).splitlines():
+                # Cheap substring test before parsing; blocks mostly hold other contacts
+                if needle in line:
+                    record = json.loads(line)
+                    if record.get('contact_id') == contact_id:
+                        records.append(record)
+        return records
+
+    def _byte_ranges(self, blocks, block_numbers):
+        """Return inclusive byte ranges for the given blocks, merging adjacent ones."""
+        ranges = []
+        for number in sorted(block_numbers):
+            offset, length = blocks[number]
+            if ranges and ranges[-1][1] + 1 == offset:
+                ranges[-1][1] = offset + length - 1
+            else:
+                ranges.append([offset, offset + length - 1])
+        return ranges
+
+
+def lookup_handler(event, context):
+    """
+    Lambda entry point for contact lookups.
+
+    Accepts contact_id, and optionally from/to (YYYY-mm-dd) and a
+    comma-separated event list, as query string parameters or a JSON body.
+    Searches the last 7 days when no start date is given.
+    """
+    try:
+        params = event.get('queryStringParameters') or event.get('body') or event
+        if isinstance(params, str):
+            params = json.loads(params)
+
+        if not params.get('contact_id'):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': 'contact_id is required'})
+            }
+
+        today = datetime.now(timezone.utc).date()
+        date_from = date.fromisoformat(params['from']) if params.get('from') else today - timedelta(days=LOOKUP_DEFAULT_DAYS - 1)
+        date_to = date.fromisoformat(params['to']) if params.get('to') else today
+        event_types = [name for name in params.get('event', '').split(',') if name] or None
+
+        records = ContactLookup().find(params['contact_id'], date_from, date_to, event_types)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': True, 'contact_id': params['contact_id'], 'count': len(records), 'events': records})
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': f'Invalid parameter: {str(e)}'})
+        }
+    except Exception as e:
+        logger.error(f"Webhook lookup failed: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': False,
+                'error': 'Internal server error occurred while looking up webhooks'
+            })
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show every stored webhook event of a GHL contact')
+    parser.add_argument('contact_id', help='GHL contact ID')
+    parser.add_argument('--from', dest='date_from', required=True, type=date.fromisoformat, help='First day (YYYY-mm-dd)')
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Last day, inclusive (default: --from)')
+    parser.add_argument('--event', action='append', help='Only search this event type (repeatable)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    for record in ContactLookup().find(args.contact_id, args.date_from, args.date_to, args.event):
+        print(json.dumps(record))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Webhook Metrics
+Keeps per-minute webhook ingestion rollups in memory and flushes them to S3 as compact records.
+
+The plugin writes a clarity_webhook_logs row with processing_time_ms and
+payload_size for every webhook, and the admin logs page groups those rows
+on every view. Here each container adds every request to an in-memory
+rollup per minute, event type and status, holding:
+
+- count and payload bytes;
+- latency sum and maximum;
+- a latency histogram over LATENCY_BUCKETS_MS, with a final overflow
+  bucket.
+
+The first request after every WEBHOOK_METRICS_FLUSH_SECONDS uploads the
+rollups collected so far before it returns, since Lambda freezes the
+container once a response is sent, as one JSON object per writer and day
+under webhook-metrics/dt=YYYY-mm-dd/, and then clears them. A busy container
+writes one small object a minute instead of one row per webhook. Readers
+add up all objects of a day (load_rollups) and derive counts, averages and
+percentiles (summarize), so several flushes of one minute simply merge.
+
+Status is one of success, duplicate, rejected (4xx) or error (5xx).
+Event types without a route in webhook_routing are counted as unknown, so
+senders cannot create unbounded series.
+
+Usage:
+    python webhook_metrics.py --date 2025-09-27 [--by event_type|status|minute] [--local-s3 ./local-s3]
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import bisect
+import logging
+import argparse
+import threading
+from datetime import date, datetime, timezone
+
+from s3_client import get_s3_client
+from s3_keys import webhook_metrics_key, webhook_metrics_prefix
+from webhook_routing import ROUTES
+
+logger = logging.getLogger(__name__)
+
+# Seconds between rollup uploads per container
+METRICS_FLUSH_SECONDS = float(os.getenv('WEBHOOK_METRICS_FLUSH_SECONDS', '60'))
+
+# Upper bounds (inclusive) of the latency histogram buckets; slower requests go to a final overflow bucket
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Rollup fields in record order, followed by the histogram buckets
+_COUNT, _BYTES, _LATENCY_SUM, _LATENCY_MAX, _BUCKETS = range(5)
+
+
+def _empty_rollup():
+    return [0, 0, 0.0, 0.0] + [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+def _merge(target, rollup):
+    target[_COUNT] += rollup[_COUNT]
+    target[_BYTES] += rollup[_BYTES]
+    target[_LATENCY_SUM] += rollup[_LATENCY_SUM]
+    target[_LATENCY_MAX] = max(target[_LATENCY_MAX], rollup[_LATENCY_MAX])
+    for index in range(_BUCKETS, len(target)):
+        target[index] += rollup[index]
+
+
+class MetricsRollup:
+    """
+    Per-minute ingestion rollups of one process.
+    """
+
+    def __init__(self, s3_client=None, s3_bucket=None, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket or os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.flush_seconds = flush_seconds
+        self.writer_id = uuid.uuid4().hex[:12]
+        self._rollups = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, event_type, status, payload_bytes, latency_ms, now=None):
+        """
+        Add one request to its minute's rollup.
+
+        Args:
+            event_type (str): GHL event type; types without a route are recorded as 'unknown'
+            status (str): success, duplicate, rejected or error
+            payload_bytes (int): Request body size
+            latency_ms (float): Handler processing time
+            now (float): Epoch seconds of the request; defaults to now
+        """
+        if event_type not in ROUTES:
+            event_type = 'unknown'
+        minute = int(now if now is not None else time.time()) // 60 * 60
+        bucket = _BUCKETS + bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+
+        with self._lock:
+            rollup = self._rollups.get((minute, event_type, status))
+            if rollup is None:
+                rollup = self._rollups[(minute, event_type, status)] = _empty_rollup()
+            rollup[_COUNT] += 1
+            rollup[_BYTES] += payload_bytes
+            rollup[_LATENCY_SUM] += latency_ms
+            if latency_ms > rollup[_LATENCY_MAX]:
+                rollup[_LATENCY_MAX] = latency_ms
+            rollup[bucket] += 1
+
+    def flush_due(self):
+        """Upload the rollups if the flush interval has passed."""
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Upload and clear the rollups collected so far.
+
+        Rollups that fail to upload are merged back and retried on the next flush.
+        """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            rollups, self._rollups = self._rollups, {}
+        if not rollups:
+            return
+        self._upload(rollups)
+
+    def _upload(self, rollups):
+        flushed_at = datetime.now(timezone.utc)
+        by_day = {}
+        for (minute, event_type, status), rollup in rollups.items():
+            by_day.setdefault(datetime.fromtimestamp(minute, timezone.utc).date(), []).append(
+                [minute, event_type, status] + rollup
+            )
+
+        uploaded = set()
+        try:
+            s3_client = self.s3_client or get_s3_client()
+            for day, records in by_day.items():
+                s3_client.put_object(
+                    Bucket=self.s3_bucket,
+                    Key=webhook_metrics_key(day, flushed_at, self.writer_id),
+                    Body=json.dumps({'latency_buckets_ms': LATENCY_BUCKETS_MS, 'rollups': records},
+                                    separators=(',', ':')).encode('utf-8'),
+                    ContentType='application/json',
+                    ServerSideEncryption='AES256'
+                )
+                uploaded.add(day)
+        except Exception as e:
+            logger.error(f"Webhook metrics flush failed, will retry: {str(e)}")
+            with self._lock:
+                for key, rollup in rollups.items():
+                    if datetime.fromtimestamp(key[0], timezone.utc).date() in uploaded:
+                        continue
+                    target = self._rollups.get(key)
+                    if target is None:
+                        self._rollups[key] = rollup
+                    else:
+                        _merge(target, rollup)
+
+
+def load_rollups(day, s3_client=None, s3_bucket=None):
+    """
+    Merge every writer's rollups of a day.
+
+    Args:
+        day (date): UTC day
+        s3_client: S3 client; defaults to the shared client
+        s3_bucket (str): Bucket; defaults to S3_BUCKET
+
+    Returns:
+        dict: Rollup lists keyed by (minute epoch, event type, status)
+    """
+    s3_client = s3_client or get_s3_client()
+    s3_bucket = s3_bucket or os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+
+    merged = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=webhook_metrics_prefix(day)):
+        for obj in page.get('Contents', []):
+            flushed = json.loads(s3_client.get_object(Bucket=s3_bucket, Key=obj['Key'])['Body'].read())
+            for minute, event_type, status, *rollup in flushed['rollups']:
+                target = merged.get((minute, event_type, status))
+                if target is None:
+                    merged[(minute, event_type, status)] = rollup
+                else:
+                    _merge(target, rollup)
+    return merged
+
+
+def _percentile(buckets, count, fraction, latency_max):
+    """Return the upper bound of the histogram bucket holding a percentile."""
+    rank = fraction * count
+    seen = 0
+    for index, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= rank:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else latency_max
+    return latency_max
+
+
+def summarize(rollups, group_by=('event_type', 'status')):
+    """
+    Aggregate rollups into report rows.
+
+    Args:
+        rollups (dict): Rollups from load_rollups()
+        group_by (tuple): Any of 'minute', 'event_type' and 'status'
+
+    Returns:
+        list: Rows with the group fields, count, bytes, average, p50/p95/p99 (histogram
+            bucket upper bounds) and maximum latency
+    """
+    groups = {}
+    for (minute, event_type, status), rollup in rollups.items():
+        values = {'minute': datetime.fromtimestamp(minute, timezone.utc).strftime('%H:%M'),
+                  'event_type': event_type, 'status': status}
+        key = tuple(values[field] for field in group_by)
+        target = groups.get(key)
+        if target is None:
+            groups[key] = list(rollup)
+        else:
+            _merge(target, rollup)
+
+    rows = []
+    for key, rollup in sorted(groups.items()):
+        count = rollup[_COUNT]
+        buckets = rollup[_BUCKETS:]
+        row = dict(zip(group_by, key))
+        row.update({
+            'count': count,
+            'bytes': rollup[_BYTES],
+            'avg_ms': round(rollup[_LATENCY_SUM] / count, 2) if count else 0,
+            'p50_ms': _percentile(buckets, count, 0.50, rollup[_LATENCY_MAX]),
+            'p95_ms': _percentile(buckets, count, 0.95, rollup[_LATENCY_MAX]),
+            'p99_ms': _percentile(buckets, count, 0.99, rollup[_LATENCY_MAX]),
+            'max_ms': round(rollup[_LATENCY_MAX], 2)
+        })
+        rows.append(row)
+    return rows
+
+
+# Created on first use; flushed once more when the process exits, for local runs
+_metrics = None
+
+
+def get_metrics():
+    """Return the container's metrics rollup."""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRollup()
+        atexit.register(_metrics.flush)
+    return _metrics
+
+
+def metrics_handler(event, context):
+    """
+    Lambda entry point for dashboard queries.
+
+    Accepts date (YYYY-mm-dd, default today UTC) and by (comma-separated
+    minute, event_type and/or status; default event_type,status) as query
+    string parameters or a JSON body.
+    """
+    try:
+        params = event.get('queryStringParameters') or event.get('body') or {}
+        if isinstance(params, str):
+            params = json.loads(params)
+
+        day = date.fromisoformat(params['date']) if params.get('date') else datetime.now(timezone.utc).date()
+        group_by = tuple(field for field in params.get('by', 'event_type,status').split(',') if field)
+        if not group_by or any(field not in ('minute', 'event_type', 'status') for field in group_by):
+            raise ValueError('by must list minute, event_type and/or status')
+
+        rows = summarize(load_rollups(day), group_by)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': True, 'date': day.isoformat(), 'rows': rows})
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': f'Invalid parameter: {str(e)}'})
+        }
+    except Exception as e:
+        logger.error(f"Webhook metrics query failed: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'success': False,
+                'error': 'Internal server error occurred while reading webhook metrics'
+            })
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize webhook ingestion rollups for a day')
+    parser.add_argument('--date', type=date.fromisoformat, default=datetime.now(timezone.utc).date(),
+                        help='UTC day (YYYY-mm-dd, default today)')
+    parser.add_argument('--by', default='event_type,status', help='Comma-separated: minute, event_type, status')
+    parser.add_argument('--local-s3', help='Read rollups from this directory instead of S3')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.local_s3:
+        from local_s3 import LocalS3
+        LocalS3(args.local_s3).install()
+
+    for row in summarize(load_rollups(args.date), tuple(args.by.split(','))):
+        print(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
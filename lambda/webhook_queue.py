@@ -0,0 +1,181 @@
+"""
+Webhook Queue Module
+Durable hand-off of accepted webhooks from the ingestion Lambda to the effect consumers.
+
+webhook_ingest acknowledges a webhook once its message is on the queue.
+The queue's consumers then run the side effects (see webhook_effects).
+
+- With WEBHOOK_QUEUE_URL set, messages go to that SQS queue. send_message
+  only returns once SQS has stored the message redundantly, so an
+  acknowledged webhook survives the ingestion container.
+- Without it, LocalWorkQueue stands in for SQS for tests and local runs.
+  It batches messages to an EffectRunner on a background thread, and
+  messages live in process memory only. webhook_ingest appends each event
+  to its segment before acknowledging it and queues only the contact and
+  notify effects here, along with deferred retries. Those are given
+  LOCAL_QUEUE_EXIT_SECONDS to finish when the process exits.
+"""
+
+import os
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# SQS queue for accepted webhooks; an in-process queue is used when unset
+WEBHOOK_QUEUE_URL = os.getenv('WEBHOOK_QUEUE_URL', '')
+
+# Seconds the in-process queue may keep an exiting process alive to finish its messages
+LOCAL_QUEUE_EXIT_SECONDS = float(os.getenv('WEBHOOK_LOCAL_QUEUE_EXIT_SECONDS', '10'))
+
+# SQS rejects messages larger than 256 KB
+SQS_MAX_MESSAGE_BYTES = 256 * 1024
+
+
+class MessageTooLarge(ValueError):
+    """
+    Raised when an encoded message exceeds SQS_MAX_MESSAGE_BYTES.
+    """
+
+
+def encode_message(message):
+    """Return a queue message as compact UTF-8 JSON."""
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+class SQSWorkQueue:
+    """
+    Work queue backed by an SQS queue.
+    """
+
+    durable = True
+
+    def __init__(self, queue_url=WEBHOOK_QUEUE_URL, sqs_client=None):
+        self.queue_url = queue_url
+        self.sqs_client = sqs_client or boto3.client('sqs', region_name=os.getenv('S3_REGION') or None)
+
+    def send(self, message, delay_seconds=0):
+        """
+        Put a message on the queue.
+
+        Args:
+            message (dict): JSON-serializable message
+            delay_seconds (int): Seconds before the message becomes visible
+
+        Returns:
+            str: SQS message ID
+
+        Raises:
+            MessageTooLarge: If the encoded message is larger than SQS accepts
+        """
+        body = encode_message(message)
+        if len(body.encode('utf-8')) > SQS_MAX_MESSAGE_BYTES:
+            raise MessageTooLarge('Message too large for the work queue')
+        response = self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=body,
+                                                DelaySeconds=int(delay_seconds))
+        return response['MessageId']
+
+
+class LocalWorkQueue:
+    """
+    In-process stand-in for the SQS queue and its consumer.
+
+    Messages are JSON round-tripped like SQS bodies and handed to the runner
+    in batches of up to ``batch_size`` from a background thread. Deferred
+    effects come back through the same queue after their delay.
+    """
+
+    durable = False
+
+    def __init__(self, runner=None, batch_size=10):
+        self.runner = runner
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._outstanding = 0
+        self._idle = threading.Condition()
+        self._thread = None
+
+    def send(self, message, delay_seconds=0):
+        """
+        Put a message on the queue.
+
+        Args:
+            message (dict): JSON-serializable message
+            delay_seconds (float): Seconds before the message is delivered
+
+        Returns:
+            str: Local message ID
+        """
+        body = encode_message(message)
+        with self._idle:
+            self._outstanding += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._consume, name='local-work-queue', daemon=True)
+                self._thread.start()
+
+        if delay_seconds:
+            timer = threading.Timer(delay_seconds, self._queue.put, args=(body,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._queue.put(body)
+        return uuid.uuid4().hex
+
+    def drain(self, timeout=None):
+        """
+        Wait until every message sent so far, including deferred effects, has been processed.
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            bool: True if the queue is empty
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _consume(self):
+        from webhook_effects import defer_failures, get_effect_runner
+
+        runner = self.runner or get_effect_runner()
+        while True:
+            bodies = [self._queue.get()]
+            while len(bodies) < self.batch_size:
+                try:
+                    bodies.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                failures = runner.process_batch([json.loads(body) for body in bodies])
+                for message in defer_failures(self, failures):
+                    logger.error(f"Dropping webhook message with failed effects {message['effects']}: "
+                                 f"{message['record']['event_type']} received at {message['record']['received_at']}")
+            except Exception as e:
+                logger.error(f"Local work queue batch failed: {str(e)}", exc_info=True)
+
+            with self._idle:
+                self._outstanding -= len(bodies)
+                self._idle.notify_all()
+
+
+# Created on first use so importing the module does not create clients
+_work_queue = None
+
+
+def get_work_queue():
+    """Return the container's work queue: SQS when WEBHOOK_QUEUE_URL is set, otherwise in-process."""
+    global _work_queue
+    if _work_queue is None:
+        if WEBHOOK_QUEUE_URL:
+            _work_queue = SQSWorkQueue()
+        else:
+            _work_queue = LocalWorkQueue()
+            atexit.register(_work_queue.drain, LOCAL_QUEUE_EXIT_SECONDS)
+    return _work_queue
@@ -0,0 +1,427 @@
+"""
+Webhook Replay
+Re-drives stored GHL webhook events through a handler after a bug or an outage.
+
+Events are read day by day from every place webhooks are stored:
+compaction archives, ingestion segments, and single-event webhooks/
+objects that are not compacted yet. Each day's events are filtered by
+time range and event type, sorted by receive time, and re-submitted to
+either:
+
+- a URL, e.g. the plugin's /wp-json/clarity-ghl/v1/webhook endpoint. The
+  payload is POSTed as JSON and signed with GHL_WEBHOOK_SECRET when it is
+  set;
+- a local function such as webhook_ingest.webhook_handler, called with an
+  API Gateway proxy event.
+
+Events of one contact always go to the same worker, so they are
+re-submitted in their original order. Different contacts are replayed in
+parallel, up to --concurrency workers and --rate events per second. Server
+errors and timeouts are retried with backoff.
+
+Events stored twice, e.g. both in an archive and as a webhooks/ object
+kept by compaction, are replayed once. Progress is appended to a journal
+as each event finishes. A rerun with the same journal skips events already
+replayed and retries the failed ones.
+
+Every request carries X-Clarity-Replay: 1, so webhook_ingest accepts it
+even if its delivery was already seen (see webhook_dedupe).
+
+Usage:
+    python webhook_replay.py --from 2025-09-27 [--to 2025-09-28T12:00] [--event contact_created]
+                             (--url https://site/wp-json/clarity-ghl/v1/webhook | --function webhook_ingest.webhook_handler)
+                             [--concurrency 8] [--rate 20] [--journal replay.journal] [--dry-run]
+"""
+
+import os
+import json
+import gzip
+import time
+import zlib
+import queue
+import hashlib
+import logging
+import argparse
+import importlib
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from s3_client import get_s3_client
+from s3_keys import safe_key_segment, webhook_archive_index_key, WEBHOOK_SEGMENT_ROOT
+from webhook_compaction import WebhookCompactor
+from webhook_signature import WebhookVerifier
+
+logger = logging.getLogger('webhook_replay')
+
+# Events queued per worker before the reader waits
+LANE_QUEUE_SIZE = 100
+
+# Attempts per event for timeouts, 429 and 5xx responses
+REPLAY_ATTEMPTS = 4
+
+
+def replay_id(record):
+    """Return a stable ID for an event, the same whether it is read from an archive, a segment or webhooks/."""
+    canonical = json.dumps([record['received_at'], record.get('payload')], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:24]
+
+
+class ArchiveReader:
+    """
+    Reads stored webhook events in receive-time order, one day at a time.
+    """
+
+    def __init__(self, fetch_workers=32):
+        self.s3_client = get_s3_client()
+        self.s3_bucket = os.getenv('S3_BUCKET', 'clarity-aws-ghl-demo-storage')
+        self.fetch_workers = fetch_workers
+        self.compactor = WebhookCompactor(fetch_workers=fetch_workers, delete_originals=False)
+
+    def events(self, start, end, event_types=None):
+        """
+        Yield stored events received in [start, end).
+
+        Args:
+            start (datetime): Earliest receive time (UTC)
+            end (datetime): Receive time to stop before (UTC)
+            event_types (list): Only yield these event types
+
+        Yields:
+            dict: Event records with received_at, event_type, contact_id and payload
+        """
+        wanted = {safe_key_segment(event_type) for event_type in event_types} if event_types else None
+
+        day = start.date()
+        while datetime(day.year, day.month, day.day, tzinfo=timezone.utc) < end:
+            records = [
+                record for record in self._day_records(day, wanted)
+                if start <= datetime.fromisoformat(record['received_at']) < end
+            ]
+            records.sort(key=lambda record: datetime.fromisoformat(record['received_at']))
+            logger.info(f"{day}: {len(records)} events to replay")
+            yield from records
+            day += timedelta(days=1)
+
+    def _day_records(self, day, wanted):
+        object_keys = self._archive_parts(day, wanted) + self._segments(day, wanted)
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            batches = list(executor.map(self._read_object, object_keys))
+            legacy = list(executor.map(self.compactor.fetch_record, self.compactor.list_day(day)))
+
+        records = [record for batch in batches for record in batch] + legacy
+        if wanted is not None:
+            records = [record for record in records if safe_key_segment(record['event_type']) in wanted]
+        return records
+
+    def _archive_parts(self, day, wanted):
+        try:
+            body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=webhook_archive_index_key(day))['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return []
+            raise
+        return [
+            part['key']
+            for event_type, parts in json.loads(body)['partitions'].items()
+            if wanted is None or safe_key_segment(event_type) in wanted
+            for part in parts
+        ]
+
+    def _segments(self, day, wanted):
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        keys = []
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{WEBHOOK_SEGMENT_ROOT}/", Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                event_type = common['Prefix'][len(f"{WEBHOOK_SEGMENT_ROOT}/event="):-1]
+                if wanted is not None and event_type not in wanted:
+                    continue
+                for listing in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{common['Prefix']}dt={day.isoformat()}/"):
+                    keys.extend(obj['Key'] for obj in listing.get('Contents', []) if obj['Key'].endswith('.ndjson.gz'))
+        return keys
+
+    def _read_object(self, key):
+        body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)['Body'].read()
+        return [json.loads(line) for line in gzip.decompress(body).splitlines() if line]
+
+
+class ReplayJournal:
+    """
+    Append-only NDJSON record of replayed events.
+
+    Only 'done' entries are skipped on resume, so failures are retried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partial line from a crash mid-write
+                    if entry.get('status') == 'done':
+                        self.completed.add(entry['id'])
+
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def is_done(self, event_id):
+        return event_id in self.completed
+
+    def record(self, event_id, status, **details):
+        entry = {'id': event_id, 'status': status}
+        entry.update(details)
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            if status == 'done':
+                self.completed.add(event_id)
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class RateLimiter:
+    """Spaces calls evenly to at most ``rate`` per second across threads (0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RetryableError(Exception):
+    """A delivery failure worth retrying: timeouts, connection errors, 429 and 5xx."""
+
+
+def url_target(url, timeout=30):
+    """
+    Return a sender that POSTs payloads to a URL.
+
+    Args:
+        url (str): Webhook endpoint
+        timeout (float): Seconds per request
+
+    Returns:
+        callable: Sender taking a record and returning the HTTP status
+    """
+    verifier = WebhookVerifier()
+
+    def send(record):
+        body = json.dumps(record['payload'], separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'X-Clarity-Replay': '1'}
+        if verifier.enabled:
+            headers['X-GHL-Signature'] = verifier.sign(body)
+
+        request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f"HTTP {e.code}")
+            return e.code
+        except (urllib.error.URLError, OSError) as e:
+            raise RetryableError(str(e))
+
+    return send
+
+
+def function_target(handler_path):
+    """
+    Return a sender that calls a local Lambda handler with an API Gateway proxy event.
+
+    Args:
+        handler_path (str): module.function, e.g. webhook_ingest.webhook_handler
+
+    Returns:
+        callable: Sender taking a record and returning the handler's statusCode
+    """
+    from local_api import build_proxy_event
+
+    module_name, _, function_name = handler_path.rpartition('.')
+    handler = getattr(importlib.import_module(module_name), function_name)
+    verifier = WebhookVerifier()
+
+    def send(record):
+        body = json.dumps(record['payload'], separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'X-Clarity-Replay': '1'}
+        if verifier.enabled:
+            headers['X-GHL-Signature'] = verifier.sign(body)
+
+        response = handler(build_proxy_event('POST', '/webhook', headers, body), None)
+        status = int(response.get('statusCode', 500))
+        if status == 429 or status >= 500:
+            raise RetryableError(f"statusCode {status}")
+        return status
+
+    return send
+
+
+def run_replay(events, send, journal, concurrency, rate, progress_interval=10):
+    """
+    Replay events with per-contact ordering, a concurrency limit and a rate cap.
+
+    Args:
+        events (iterable): Event records in receive-time order
+        send (callable): Sender from url_target() or function_target()
+        journal (ReplayJournal): Progress journal
+        concurrency (int): Parallel workers
+        rate (float): Maximum events per second (0 = unlimited)
+        progress_interval (float): Seconds between progress log lines
+
+    Returns:
+        dict: Counts of replayed, failed and skipped events
+    """
+    limiter = RateLimiter(rate)
+    lanes = [queue.Queue(maxsize=LANE_QUEUE_SIZE) for _ in range(concurrency)]
+    counts = {'replayed': 0, 'failed': 0, 'skipped': 0}
+    counts_lock = threading.Lock()
+    started = time.monotonic()
+
+    def deliver(record, event_id):
+        for attempt in range(REPLAY_ATTEMPTS):
+            limiter.acquire()
+            try:
+                status = send(record)
+            except RetryableError as e:
+                error = str(e)
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+                continue
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            if 200 <= status < 300:
+                journal.record(event_id, 'done', http_status=status)
+                return True
+            error = f"status {status}"
+            break
+
+        journal.record(event_id, 'failed', error=error, event_type=record['event_type'], contact_id=record.get('contact_id'))
+        logger.error(f"Replay of {record['event_type']} for contact {record.get('contact_id')} failed: {error}")
+        return False
+
+    def worker(lane):
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            try:
+                ok = deliver(*item)
+            except Exception as e:
+                # Never let a worker die; its lane would block the reader forever
+                logger.error(f"Replay worker error: {str(e)}", exc_info=True)
+                ok = False
+            with counts_lock:
+                counts['replayed' if ok else 'failed'] += 1
+
+    threads = [threading.Thread(target=worker, args=(lane,), daemon=True) for lane in lanes]
+    for thread in threads:
+        thread.start()
+
+    last_report = started
+    next_lane = 0
+    # An event can be stored twice, e.g. archived by a compaction run that kept its originals
+    queued = set()
+    for record in events:
+        event_id = replay_id(record)
+        if journal.is_done(event_id) or event_id in queued:
+            counts['skipped'] += 1
+            continue
+        queued.add(event_id)
+
+        contact_id = record.get('contact_id')
+        if contact_id:
+            # A contact's events share one lane, which keeps them in order
+            lane = lanes[zlib.crc32(contact_id.encode('utf-8')) % concurrency]
+        else:
+            lane = lanes[next_lane]
+            next_lane = (next_lane + 1) % concurrency
+        lane.put((record, event_id))
+
+        now = time.monotonic()
+        if now - last_report >= progress_interval:
+            last_report = now
+            logger.info(f"replayed {counts['replayed']} failed {counts['failed']} skipped {counts['skipped']} | "
+                        f"{counts['replayed'] / (now - started):.1f} events/s")
+
+    for lane in lanes:
+        lane.put(None)
+    for thread in threads:
+        thread.join()
+
+    counts['seconds'] = round(time.monotonic() - started, 1)
+    return counts
+
+
+def parse_time(value, end=False):
+    """Parse YYYY-mm-dd or an ISO datetime as UTC; a bare end date includes the whole day."""
+    parsed = datetime.fromisoformat(value)
+    if len(value) == 10:
+        parsed = datetime.combine(date.fromisoformat(value), datetime.min.time()) + (timedelta(days=1) if end else timedelta())
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay stored GHL webhook events through a handler')
+    parser.add_argument('--from', dest='start', required=True, help='Earliest receive time (YYYY-mm-dd or ISO datetime, UTC)')
+    parser.add_argument('--to', dest='end', help='Latest receive time; a bare date includes that day (default: end of --from day)')
+    parser.add_argument('--event', action='append', help='Only replay this event type (repeatable)')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Webhook endpoint to POST events to')
+    target.add_argument('--function', help='Local handler to call, as module.function')
+    target.add_argument('--dry-run', action='store_true', help='Only count the events that would be replayed')
+    parser.add_argument('--concurrency', type=int, default=8, help='Parallel workers; one contact never uses two')
+    parser.add_argument('--rate', type=float, default=20, help='Maximum events per second (0 = unlimited)')
+    parser.add_argument('--journal', default='webhook-replay.journal', help='Progress journal used to resume')
+    parser.add_argument('--fetch-workers', type=int, default=32, help='Concurrent S3 reads')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    start = parse_time(args.start)
+    end = parse_time(args.end, end=True) if args.end else parse_time(args.start[:10], end=True)
+    events = ArchiveReader(args.fetch_workers).events(start, end, args.event)
+
+    if args.dry_run:
+        by_type = {}
+        for record in events:
+            by_type[record['event_type']] = by_type.get(record['event_type'], 0) + 1
+        print(json.dumps({'events': sum(by_type.values()), 'by_event_type': by_type}, indent=2))
+        return
+
+    send = url_target(args.url) if args.url else function_target(args.function)
+    journal = ReplayJournal(args.journal)
+    logger.info(f"Replaying {start.isoformat()} to {end.isoformat()}, {len(journal.completed)} events already done "
+                f"according to {journal.path}")
+    try:
+        counts = run_replay(events, send, journal, args.concurrency, args.rate)
+    finally:
+        journal.close()
+
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == '__main__':
+    main()
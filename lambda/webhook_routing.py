@@ -0,0 +1,149 @@
+"""
+Webhook Routing
+Maps GHL event types to precompiled field extractors and handling flags, built once per container.
+
+Clarity_GHL_Webhook probes several candidate keys for the contact ID of
+every event, then scans lists to decide whether the event creates a
+contact (is_contact_event) or sends a notification (is_important_event).
+Here every known event type has a route built at import time:
+
+- where the type's payload keeps its contact ID, as one or two key
+  paths compiled into a small getter, e.g. form.contactId for
+  form_submitted;
+- whether the event carries contact data to upsert, as in the plugin's
+  is_contact_event: ContactCreate, ContactUpdate, contact.created and
+  contact.updated;
+- whether it should trigger a notification, as in the plugin's
+  is_important_event: ContactCreate, OpportunityCreate and
+  AppointmentScheduled.
+
+Dispatch is one dict lookup, so its cost does not grow with the number of
+routes. Event types without a route fall back to the plugin's probe order,
+followed by the contactId of any nested object (form.contactId,
+opportunity.contactId, ...).
+Both the plugin's documented snake_case names (see GHL_WEBHOOK_README.md)
+and GHL's native names such as ContactCreate are routed. Like the plugin,
+the snake_case names are archived but neither upserted nor notified.
+"""
+
+# Keys that may hold the event type, in the plugin's order of preference
+EVENT_TYPE_FIELDS = ('type', 'event', 'eventType')
+
+# Contact ID probe for event types without a route, as in Clarity_GHL_Webhook::extract_contact_id,
+# then the contactId of any nested object such as form or opportunity
+FALLBACK_CONTACT_PATHS = (('contactId',), ('contact', 'id'), ('id',), ('*', 'contactId'))
+
+
+def _compile_getter(path):
+    """Return a function reading one key path of one or two levels from a payload; '*' matches any key."""
+    if len(path) == 1:
+        key = path[0]
+        return lambda data: data.get(key)
+
+    outer, inner = path
+
+    if outer == '*':
+        def get_any(data):
+            for nested in data.values():
+                if isinstance(nested, dict) and nested.get(inner):
+                    return nested[inner]
+            return None
+        return get_any
+
+    def get(data):
+        nested = data.get(outer)
+        return nested.get(inner) if isinstance(nested, dict) else None
+    return get
+
+
+def _compile_extractor(paths):
+    """Return a function returning the first non-empty value of the given key paths as a string."""
+    getters = tuple(_compile_getter(path) for path in paths)
+
+    if len(getters) == 1:
+        getter = getters[0]
+
+        def extract_one(data):
+            value = getter(data)
+            return str(value) if value else None
+        return extract_one
+
+    def extract(data):
+        for getter in getters:
+            value = getter(data)
+            if value:
+                return str(value)
+        return None
+    return extract
+
+
+class EventRoute:
+    """
+    How one GHL event type is handled.
+    """
+
+    __slots__ = ('event_type', 'is_contact', 'is_important', 'contact_id')
+
+    def __init__(self, event_type, contact_paths, is_contact=False, is_important=False):
+        self.event_type = event_type
+        self.is_contact = is_contact
+        self.is_important = is_important
+        # Reads only this type's contact ID fields, in order
+        self.contact_id = _compile_extractor(contact_paths)
+
+
+# Contact ID locations per payload family
+_CONTACT_PATHS = (('contact', 'id'), ('contactId',), ('id',))
+_OPPORTUNITY_PATHS = (('opportunity', 'contactId'), ('contactId',))
+_FORM_PATHS = (('form', 'contactId'), ('contactId',))
+_SURVEY_PATHS = (('survey', 'contactId'), ('contactId',))
+_APPOINTMENT_PATHS = (('appointment', 'contactId'), ('contactId',))
+
+ROUTES = {route.event_type: route for route in (
+    EventRoute('contact_created', _CONTACT_PATHS),
+    EventRoute('contact_updated', _CONTACT_PATHS),
+    EventRoute('contact_deleted', _CONTACT_PATHS),
+    EventRoute('ContactCreate', _CONTACT_PATHS, is_contact=True, is_important=True),
+    EventRoute('ContactUpdate', _CONTACT_PATHS, is_contact=True),
+    EventRoute('ContactDelete', _CONTACT_PATHS),
+    EventRoute('contact.created', _CONTACT_PATHS, is_contact=True),
+    EventRoute('contact.updated', _CONTACT_PATHS, is_contact=True),
+    EventRoute('opportunity_created', _OPPORTUNITY_PATHS),
+    EventRoute('opportunity_updated', _OPPORTUNITY_PATHS),
+    EventRoute('opportunity_status_changed', _OPPORTUNITY_PATHS),
+    EventRoute('OpportunityCreate', _OPPORTUNITY_PATHS, is_important=True),
+    EventRoute('OpportunityUpdate', _OPPORTUNITY_PATHS),
+    EventRoute('OpportunityStatusUpdate', _OPPORTUNITY_PATHS),
+    EventRoute('form_submitted', _FORM_PATHS),
+    EventRoute('survey_submitted', _SURVEY_PATHS),
+    EventRoute('appointment_scheduled', _APPOINTMENT_PATHS),
+    EventRoute('appointment_cancelled', _APPOINTMENT_PATHS),
+    EventRoute('appointment_rescheduled', _APPOINTMENT_PATHS),
+    EventRoute('AppointmentScheduled', _APPOINTMENT_PATHS, is_important=True),
+)}
+
+# Route for event types not in ROUTES
+FALLBACK_ROUTE = EventRoute('unknown', FALLBACK_CONTACT_PATHS)
+
+
+def extract_event_type(data):
+    """Return the GHL event type, probing the same keys as the plugin."""
+    for field in EVENT_TYPE_FIELDS:
+        if data.get(field):
+            return str(data[field])
+    return 'unknown'
+
+
+def route_event(data):
+    """
+    Classify a parsed webhook payload.
+
+    Args:
+        data (dict): Parsed webhook payload
+
+    Returns:
+        tuple: (route, event_type, contact_id); route is FALLBACK_ROUTE for unknown event types
+    """
+    event_type = extract_event_type(data)
+    route = ROUTES.get(event_type, FALLBACK_ROUTE)
+    return route, event_type, route.contact_id(data)
@@ -0,0 +1,143 @@
+"""
+Webhook Signature Module
+Verifies GoHighLevel webhook signatures on the raw request bytes before anything is parsed.
+
+Accepts the same headers as Clarity_GHL_Webhook::verify_signature:
+X-GHL-Signature, X-GoHighLevel-Signature and X-Hub-Signature-256, in that
+order of preference, with or without a 'sha256=' prefix. The signature is
+a hex HMAC-SHA256 of the raw body with the shared webhook secret.
+
+The HMAC key schedule is computed once per process and copied for every
+request, and signatures are compared in constant time. Oversized and
+unsigned requests are rejected from their length and headers alone,
+before the body is decoded, hashed or parsed. API Gateway bodies that
+arrive base64-encoded are verified on their decoded bytes.
+"""
+
+import os
+import hmac
+import base64
+import hashlib
+import binascii
+
+# Shared secret configured for the GHL webhook; verification is skipped when unset, as in the plugin
+GHL_WEBHOOK_SECRET = os.getenv('GHL_WEBHOOK_SECRET', '')
+
+# Larger bodies are rejected without being read; GHL events are a few KB
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv('WEBHOOK_MAX_BODY_BYTES', str(256 * 1024)))
+
+# Accepted signature headers (lowercase) in order of preference
+SIGNATURE_HEADERS = ('x-ghl-signature', 'x-gohighlevel-signature', 'x-hub-signature-256')
+
+SIGNATURE_PREFIX = 'sha256='
+
+
+class WebhookRejected(Exception):
+    """
+    Raised when a webhook request fails verification.
+    """
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class WebhookVerifier:
+    """
+    Verifies webhook requests against one shared secret.
+    """
+
+    def __init__(self, secret=GHL_WEBHOOK_SECRET, max_body_bytes=WEBHOOK_MAX_BODY_BYTES):
+        self.max_body_bytes = max_body_bytes
+        # Keyed once; every request continues from a copy of this state
+        self._mac = hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256) if secret else None
+
+    @property
+    def enabled(self):
+        return self._mac is not None
+
+    def verify(self, event, headers=None):
+        """
+        Check an API Gateway proxy event and return its raw body.
+
+        Args:
+            event (dict): API Gateway proxy event
+            headers (dict): The event's headers with lowercase names, if the caller already built them
+
+        Returns:
+            bytes: Raw request body, base64-decoded when needed
+
+        Raises:
+            WebhookRejected: 413 for oversized bodies, 401 for missing or invalid signatures
+        """
+        body = event.get('body') or ''
+        encoded = bool(event.get('isBase64Encoded'))
+
+        # Upper bound of the decoded size, known without decoding anything
+        if (len(body) * 3 // 4 if encoded else len(body)) > self.max_body_bytes:
+            raise WebhookRejected(413, 'Payload too large')
+
+        if headers is None:
+            headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+        signature = self._find_signature(headers)
+        if self.enabled and signature is None:
+            raise WebhookRejected(401, 'Missing webhook signature')
+
+        raw_body = decode_body(body, encoded)
+        if len(raw_body) > self.max_body_bytes:
+            raise WebhookRejected(413, 'Payload too large')
+
+        if self.enabled and not hmac.compare_digest(self._hexdigest(raw_body), signature):
+            raise WebhookRejected(401, 'Signature verification failed')
+
+        return raw_body
+
+    def sign(self, raw_body):
+        """
+        Return the signature header value GHL would send for a body.
+
+        Args:
+            raw_body (bytes): Request body
+
+        Returns:
+            str: Hex HMAC-SHA256 with the 'sha256=' prefix
+        """
+        return SIGNATURE_PREFIX + self._hexdigest(raw_body).decode('ascii')
+
+    def _hexdigest(self, raw_body):
+        mac = self._mac.copy()
+        mac.update(raw_body)
+        return mac.hexdigest().encode('ascii')
+
+    def _find_signature(self, headers):
+        """Return the preferred signature as lowercase hex bytes, from headers with lowercase names."""
+        for name in SIGNATURE_HEADERS:
+            value = headers.get(name)
+            if value:
+                if value.startswith(SIGNATURE_PREFIX):
+                    value = value[len(SIGNATURE_PREFIX):]
+                return value.strip().lower().encode('utf-8')
+        return None
+
+
+def decode_body(body, encoded=False):
+    """
+    Return a proxy event body as bytes.
+
+    Args:
+        body (str): Body as delivered by API Gateway
+        encoded (bool): Whether API Gateway base64-encoded the body
+
+    Returns:
+        bytes: Raw body
+
+    Raises:
+        WebhookRejected: 400 if a base64 body is malformed
+    """
+    if encoded:
+        try:
+            return base64.b64decode(body, validate=True)
+        except (binascii.Error, ValueError):
+            raise WebhookRejected(400, 'Malformed base64 body')
+    return body.encode('utf-8') if isinstance(body, str) else bytes(body)
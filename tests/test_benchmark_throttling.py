@@ -0,0 +1,40 @@
+"""
+Tests for the S3 throttling benchmark (lambda/benchmark_throttling.py).
+
+Runs both retry strategies against the local throttling bucket with fixed,
+heavily contended parameters and checks counts rather than wall time.
+"""
+
+import benchmark_throttling
+from benchmark_throttling import run_scenario
+
+# 64 threads against a bucket accepting 50 req/s: about 4 s per scenario
+UPLOADS = 200
+WORKERS = 64
+CAPACITY = 50
+
+
+def test_both_strategies_get_the_same_retry_budget(monkeypatch):
+    calls = []
+    create = benchmark_throttling.create_s3_client
+
+    def recording_create(**kwargs):
+        calls.append(kwargs)
+        return create(**kwargs)
+
+    monkeypatch.setattr(benchmark_throttling, 'create_s3_client', recording_create)
+    run_scenario('legacy', 4, 2, 1000, shared=False, max_attempts=7)
+    run_scenario('adaptive', 4, 2, 1000, shared=True, max_attempts=7)
+
+    assert {call['retry_mode'] for call in calls} == {'legacy', 'adaptive'}
+    assert {call['max_attempts'] for call in calls} == {7}
+
+
+def test_shared_adaptive_client_is_throttled_far_less():
+    legacy = run_scenario('legacy', UPLOADS, WORKERS, CAPACITY, shared=False)
+    adaptive = run_scenario('adaptive', UPLOADS, WORKERS, CAPACITY, shared=True)
+
+    assert legacy['succeeded'] == adaptive['succeeded'] == UPLOADS
+    assert adaptive['attempts'] < legacy['attempts']
+    assert adaptive['throttled'] * 3 < legacy['throttled']
+    assert adaptive['client_metrics']['throttled_responses'] == adaptive['throttled']
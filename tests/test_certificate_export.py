@@ -0,0 +1,52 @@
+"""
+Tests for storing HTML certificates and exporting them (lambda/handler.py, lambda/certificate_export.py).
+"""
+
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from s3_keys import certificate_key
+
+# Multi-byte characters in names must survive chunked encoding
+HTML = '<html><body><h1>Zoë Ångström</h1>' + 'Certificate of Completion ' * 5000 + '</body></html>'
+
+
+@pytest.fixture
+def handler(local_s3):
+    import handler
+    return handler
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_upload_round_trip(handler, s3, compress):
+    s3_client, bucket = s3
+    s3_key = certificate_key(123, 456, 'CERT-2024-0001', 'html')
+
+    handler.upload_to_s3(HTML, s3_key, compress=compress, fingerprint='abc123')
+
+    stored = s3_client.get_object(Bucket=bucket, Key=s3_key)
+    body = stored['Body'].read()
+    assert stored.get('ContentEncoding') == ('gzip' if compress else None)
+    assert stored['Metadata']['fingerprint'] == 'abc123'
+    assert (gzip.decompress(body) if compress else body).decode('utf-8') == HTML
+
+
+def test_export_holds_html_of_gzip_certificates(handler, s3, monkeypatch):
+    from certificate_export import CertificateExporter
+    s3_client, bucket = s3
+    monkeypatch.setattr(handler, 'HTML_GZIP', True)
+    handler.upload_to_s3(HTML, certificate_key(123, 456, 'CERT-2024-0001', 'html'))
+    handler.upload_to_s3('<html>plain</html>', certificate_key(123, 789, 'CERT-2024-0002', 'html'), compress=False)
+
+    exporter = CertificateExporter()
+    entries = exporter.list_user_certificates(123)
+    result = exporter.export(entries, 'exports/user-123.zip')
+
+    assert result['certificate_count'] == 2
+    archive = zipfile.ZipFile(io.BytesIO(s3_client.get_object(Bucket=bucket, Key='exports/user-123.zip')['Body'].read()))
+    assert archive.read('456/cert-CERT-2024-0001.html').decode('utf-8') == HTML
+    assert archive.read('789/cert-CERT-2024-0002.html') == b'<html>plain</html>'
+
@@ -0,0 +1,42 @@
+"""
+Tests for skipping unchanged certificates on regeneration (lambda/certificate_generator.py).
+"""
+
+import pytest
+
+try:
+    import certificate_generator
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint unavailable: {e}", allow_module_level=True)
+
+CERTIFICATE = {
+    'recipient_name': 'Jane Smith',
+    'course_title': 'Real Estate Foundations',
+    'tier_level': 1,
+    'completion_date': 'October 05, 2024',
+    'certificate_number': 'CERT-2024-0001',
+    'user_id': 123,
+    'course_id': 456
+}
+
+
+@pytest.fixture
+def generator(local_s3):
+    return certificate_generator.CertificateGenerator()
+
+
+def test_uploaded_certificate_is_current(generator):
+    assert not generator.is_current(CERTIFICATE)
+
+    generator.upload_certificate(b'%PDF-1.7 stub', dict(CERTIFICATE), previews=())
+
+    assert generator.is_current(dict(CERTIFICATE))
+    assert not generator.is_current(dict(CERTIFICATE, recipient_name='Jane Smith-Jones'))
+    assert not generator.is_current(dict(CERTIFICATE, tier_level=2))
+
+
+def test_render_settings_change_the_fingerprint(generator, monkeypatch):
+    generator.upload_certificate(b'%PDF-1.7 stub', dict(CERTIFICATE), previews=())
+    monkeypatch.setattr(certificate_generator, 'PDF_OPTIMIZATION', 'max')
+
+    assert not certificate_generator.CertificateGenerator().is_current(dict(CERTIFICATE))
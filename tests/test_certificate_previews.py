@@ -0,0 +1,55 @@
+"""
+Tests for preview images generated alongside certificates (lambda/certificate_generator.py).
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+try:
+    import certificate_generator
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint unavailable: {e}", allow_module_level=True)
+
+pytest.importorskip('pypdfium2')
+
+CERTIFICATE = {
+    'recipient_name': 'Jane Smith',
+    'course_title': 'Real Estate Foundations',
+    'tier_level': 3,
+    'completion_date': 'October 05, 2024',
+    'certificate_number': 'CERT-2024-0001',
+    'user_id': 123,
+    'course_id': 456
+}
+
+
+@pytest.fixture
+def generator(local_s3):
+    return certificate_generator.CertificateGenerator()
+
+
+def test_previews_match_their_presets(generator):
+    pdf = generator.render_pdf(dict(CERTIFICATE))
+
+    images = generator.render_previews(pdf, ('thumbnail', 'share'))
+
+    thumbnail = Image.open(io.BytesIO(images['thumbnail']))
+    share = Image.open(io.BytesIO(images['share']))
+    assert thumbnail.format == share.format == 'PNG'
+    assert thumbnail.width == 320 and thumbnail.height > thumbnail.width  # Portrait page, aspect ratio kept
+    assert share.size == (1200, 627)
+
+
+def test_previews_upload_next_to_the_pdf(generator, s3):
+    s3_client, bucket = s3
+    pdf = generator.render_pdf(dict(CERTIFICATE))
+
+    result = generator.upload_certificate(pdf, dict(CERTIFICATE), previews=('thumbnail', 'share'))
+
+    assert s3_client.get_object(Bucket=bucket, Key=result['s3_key'])['Body'].read() == pdf
+    for name in ('thumbnail', 'share'):
+        stored = s3_client.get_object(Bucket=bucket, Key=result['previews'][name]['s3_key'])
+        assert stored['ContentType'].startswith('image/png')
+        assert stored['Body'].read().startswith(b'\x89PNG')
@@ -0,0 +1,93 @@
+"""
+Tests for coalescing duplicate certificate requests (lambda/single_flight.py, lambda/handler.py).
+"""
+
+import json
+import threading
+
+import pytest
+
+from conftest import response_body
+
+
+@pytest.fixture
+def handler(local_s3, monkeypatch):
+    """The HTML handler with an empty coalescing cache; renders are counted in handler.renders."""
+    import handler
+    from single_flight import SingleFlight
+    monkeypatch.setattr(handler, 'certificate_flight', SingleFlight(result_ttl=30))
+
+    renders = []
+    issue_html_certificate = handler.issue_html_certificate
+
+    def counting_issue(body, *args):
+        renders.append(body)
+        return issue_html_certificate(body, *args)
+
+    monkeypatch.setattr(handler, 'issue_html_certificate', counting_issue)
+    monkeypatch.setattr(handler, 'renders', renders, raising=False)
+    return handler
+
+
+def issue(handler, **overrides):
+    body = {
+        'recipient_name': 'Jane Smith',
+        'course_title': 'Real Estate Foundations',
+        'tier_level': 1,
+        'completion_date': '2024-10-05',
+        'user_id': 123,
+        'course_id': 456
+    }
+    body.update(overrides)
+    response = handler.lambda_handler({'body': json.dumps(body)}, None)
+    assert response['statusCode'] == 200
+    return response_body(response)['certificate_url']
+
+
+def test_repeated_request_reuses_certificate(handler):
+    assert issue(handler) == issue(handler)
+    assert len(handler.renders) == 1
+
+
+def test_corrected_render_inputs_issue_new_certificate(handler):
+    issue(handler)
+    issue(handler, recipient_name='Jane Smith-Jones')
+    issue(handler, course_title='Real Estate Mastery')
+    issue(handler, tier_level=2)
+    issue(handler, completion_date='2024-10-06')
+
+    assert [body['recipient_name'] for body in handler.renders] == ['Jane Smith', 'Jane Smith-Jones'] + ['Jane Smith'] * 3
+
+
+def test_other_course_is_not_coalesced(handler):
+    issue(handler)
+    issue(handler, course_id=789)
+    assert len(handler.renders) == 2
+
+
+def test_concurrent_callers_share_one_call():
+    from single_flight import SingleFlight
+
+    flight = SingleFlight(result_ttl=30)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'CERT-1'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', render))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {value for value, _ in results} == {'CERT-1'}
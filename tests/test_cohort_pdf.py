@@ -0,0 +1,61 @@
+"""
+Tests for rendering a cohort into one PDF (lambda/certificate_generator.py).
+"""
+
+import copy
+
+import pytest
+
+try:
+    import certificate_generator
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint unavailable: {e}", allow_module_level=True)
+
+# Mixed tiers in non-consecutive order
+COHORT = [
+    {'recipient_name': 'Ada Lovelace', 'course_title': 'Analytics', 'tier_level': 3,
+     'completion_date': 'October 1, 2024', 'certificate_number': 'CERT-2024-0001'},
+    {'recipient_name': 'Alan Turing', 'course_title': 'Analytics', 'tier_level': 1,
+     'completion_date': 'October 1, 2024', 'certificate_number': 'CERT-2024-0002'},
+    {'recipient_name': 'Grace Hopper', 'course_title': 'Analytics', 'tier_level': 3,
+     'completion_date': 'October 1, 2024', 'certificate_number': 'CERT-2024-0003'}
+]
+
+
+@pytest.fixture
+def generator(local_s3):
+    return certificate_generator.CertificateGenerator()
+
+
+def test_mixed_tiers_render_as_one_document(generator, monkeypatch):
+    rendered = []
+    html_class = certificate_generator.HTML
+
+    def recording_html(*args, **kwargs):
+        rendered.append(kwargs['string'])
+        return html_class(*args, **kwargs)
+
+    monkeypatch.setattr(certificate_generator, 'HTML', recording_html)
+    pdf = generator.render_cohort_pdf(copy.deepcopy(COHORT))
+
+    assert pdf.startswith(b'%PDF')
+    assert len(rendered) == 1
+    assert rendered[0].count('class="certificate tier-3"') == 2
+    assert rendered[0].count('class="certificate tier-1"') == 1
+
+
+def test_each_tier_gets_its_accent_color(generator):
+    css = generator._get_cohort_tier_css([3, 1])
+
+    assert '.certificate.tier-3 .organization { color: #F39C12 }' in css
+    assert '.certificate.tier-1 .organization { color: #4A90E2 }' in css
+    assert '.certificate.tier-1::before { border: 3px solid #4A90E2 }' in css
+    assert certificate_generator.ACCENT_PLACEHOLDER not in css
+
+
+def test_caller_data_is_not_modified(generator):
+    cohort = copy.deepcopy(COHORT)
+
+    generator.render_cohort_pdf(cohort)
+
+    assert cohort == COHORT
@@ -0,0 +1,94 @@
+"""
+Tests for bulk-syncing GHL contacts into the plugin's contacts table (lambda/ghl_contacts.py, lambda/contact_sync.py).
+"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ghl_contacts import ContactsDatabase, collapse_contacts, php_serialize
+from s3_keys import webhook_day_prefix
+
+DAY_START = datetime(2025, 9, 27, tzinfo=timezone.utc)
+
+
+def record(contact_id, received_at='2025-09-27T13:30:00+00:00', **contact):
+    return {'received_at': received_at, 'event_type': 'ContactUpdate', 'contact_id': contact_id,
+            'payload': {'type': 'ContactUpdate', 'contact': dict(contact, id=contact_id)}}
+
+
+@pytest.fixture
+def database(tmp_path):
+    return ContactsDatabase(f"sqlite:///{tmp_path / 'contacts.db'}")
+
+
+def stored_contacts(database):
+    connection = sqlite3.connect(database.url.path[1:])
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(f"SELECT * FROM {database.table} ORDER BY ghl_contact_id").fetchall()
+        return {row['ghl_contact_id']: dict(row) for row in rows}
+    finally:
+        connection.close()
+
+
+def test_values_serialize_like_php():
+    assert php_serialize(['lead', 'website']) == 'a:2:{i:0;s:4:"lead";i:1;s:7:"website";}'
+    assert php_serialize({'company': 'Zoë & Co', 'seats': 5, 'vip': True, 'notes': None}) == (
+        'a:4:{s:7:"company";s:9:"Zoë & Co";s:5:"seats";i:5;s:3:"vip";b:1;s:5:"notes";N;}'
+    )
+
+
+def test_events_collapse_to_the_latest_state_per_contact():
+    contacts = collapse_contacts([
+        record('contact_1', firstName='Jane', email='jane@example.com', tags=['lead']),
+        record('contact_1', phone='+15550100'),
+        record('contact_2', firstName='No Email Or Phone'),
+        record('contact_1', email='jane.smith@example.com')
+    ])
+
+    assert list(contacts) == ['contact_1']
+    contact = contacts['contact_1']
+    assert (contact['first_name'], contact['email'], contact['phone']) == ('Jane', 'jane.smith@example.com', '+15550100')
+    assert contact['tags'] == php_serialize(['lead'])
+    assert contact['source'] == 'webhook'
+
+
+def test_upserts_keep_stored_fields_an_event_leaves_out(database):
+    first = collapse_contacts(record(f"contact_{n}", firstName=f"Contact {n}", email=f"c{n}@example.com") for n in range(5))
+    assert database.upsert_contacts(list(first.values()), batch_size=2) == 5
+
+    update = collapse_contacts([record('contact_3', phone='+15550103')])
+    database.upsert_contacts(list(update.values()))
+
+    stored = stored_contacts(database)
+    assert len(stored) == 5
+    assert (stored['contact_3']['first_name'], stored['contact_3']['email'], stored['contact_3']['phone']) == (
+        'Contact 3', 'c3@example.com', '+15550103'
+    )
+    assert stored['contact_3']['updated_at'] is not None and stored['contact_2']['updated_at'] is None
+
+
+def test_sync_writes_contact_events_of_the_range(s3, database):
+    from contact_sync import sync_contacts
+    s3_client, bucket = s3
+    events = [
+        ('contact_1', 'ContactCreate', {'firstName': 'Jane', 'email': 'jane@example.com'}),
+        ('contact_1', 'ContactUpdate', {'phone': '+15550100'}),
+        ('contact_2', 'OpportunityCreate', {'email': 'opportunity@example.com'}),
+        ('contact_3', 'ContactCreate', {'email': 'john@example.com'})
+    ]
+    for n, (contact_id, event_type, contact) in enumerate(events):
+        received_at = DAY_START + timedelta(minutes=n)
+        payload = {'type': event_type, 'contact': dict(contact, id=contact_id)}
+        key = webhook_day_prefix(received_at) + f"webhook-{contact_id}-{int(received_at.timestamp())}.json"
+        s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(payload).encode('utf-8'))
+
+    result = sync_contacts(DAY_START, DAY_START + timedelta(days=1), database)
+
+    assert (result['events'], result['contacts'], result['rows_written']) == (3, 2, 2)
+    stored = stored_contacts(database)
+    assert sorted(stored) == ['contact_1', 'contact_3']
+    assert (stored['contact_1']['email'], stored['contact_1']['phone']) == ('jane@example.com', '+15550100')
@@ -0,0 +1,133 @@
+"""
+Tests for issuing HTML certificates through the handler (lambda/handler.py).
+"""
+
+import gzip
+import json
+
+import pytest
+
+from conftest import response_body
+
+
+@pytest.fixture
+def handler(local_s3, monkeypatch):
+    """The HTML handler with an empty coalescing cache."""
+    import handler
+    from single_flight import SingleFlight
+    monkeypatch.setattr(handler, 'certificate_flight', SingleFlight(result_ttl=30))
+    return handler
+
+
+def issue(handler, **overrides):
+    body = {
+        'recipient_name': 'Zoë Ångström',
+        'course_title': 'Real Estate Foundations',
+        'tier_level': 1,
+        'completion_date': '2024-10-05',
+        'user_id': 123,
+        'course_id': 456
+    }
+    body.update(overrides)
+    response = handler.lambda_handler({'body': json.dumps(body)}, None)
+    assert response['statusCode'] == 200
+    return response_body(response)
+
+
+def stored_certificates(s3):
+    s3_client, bucket = s3
+    listing = s3_client.list_objects_v2(Bucket=bucket, Prefix='certificates/')
+    return [s3_client.get_object(Bucket=bucket, Key=item['Key']) for item in listing.get('Contents', [])]
+
+
+@pytest.mark.parametrize('html_gzip', [True, False])
+def test_certificate_is_stored_with_its_encoding(handler, s3, monkeypatch, html_gzip):
+    monkeypatch.setattr(handler, 'HTML_GZIP', html_gzip)
+
+    issue(handler)
+
+    [stored] = stored_certificates(s3)
+    body = stored['Body'].read()
+    html = (gzip.decompress(body) if html_gzip else body).decode('utf-8')
+    assert stored.get('ContentEncoding') == ('gzip' if html_gzip else None)
+    assert stored['ContentType'] == 'text/html; charset=utf-8'
+    assert 'Zoë Ångström' in html
+    if html_gzip:
+        assert len(body) * 2 < len(html.encode('utf-8'))
+
+
+def test_compression_is_deterministic(handler):
+    data = handler.generate_html_certificate({'tier_level': 2, 'recipient_name': 'Jane Smith'}).encode('utf-8')
+
+    assert handler.compress_content(data) == handler.compress_content(data)
+    assert gzip.decompress(handler.compress_content(data)) == data
+
+
+@pytest.fixture
+def linked(handler, monkeypatch):
+    """The handler in linked stylesheet mode with no stylesheet published yet."""
+    monkeypatch.setattr(handler, 'HTML_STYLESHEET_MODE', 'linked')
+    monkeypatch.setattr(handler, 'STYLESHEET_BASE_URL', 'https://assets.example.com/')
+    monkeypatch.setattr(handler, '_published_stylesheets', {})
+    return handler
+
+
+def test_linked_certificates_share_one_stylesheet_per_tier(linked, s3):
+    s3_client, bucket = s3
+
+    issue(linked, user_id=1)
+    issue(linked, user_id=2)
+    issue(linked, user_id=3, tier_level=3)
+
+    listing = s3_client.list_objects_v2(Bucket=bucket, Prefix=linked.STYLESHEET_PREFIX)
+    keys = sorted(item['Key'] for item in listing['Contents'])
+    assert keys == sorted([linked.get_stylesheet_key(1), linked.get_stylesheet_key(3)])
+
+    stylesheet = s3_client.get_object(Bucket=bucket, Key=linked.get_stylesheet_key(3))
+    assert stylesheet['CacheControl'] == 'public, max-age=31536000, immutable'
+    assert '#F39C12' in stylesheet['Body'].read().decode('utf-8')
+
+    url = f"https://assets.example.com/{linked.get_stylesheet_key(1)}"
+    htmls = [certificate['Body'].read().decode('utf-8') for certificate in stored_certificates(s3)]
+    assert sum(f'<link rel="stylesheet" href="{url}">' in html for html in htmls) == 2
+    assert not any('<style>' in html for html in htmls)
+
+
+def test_published_stylesheet_is_not_checked_again(linked, s3):
+    s3_client, bucket = s3
+    issue(linked, user_id=1)
+    s3_client.delete_object(Bucket=bucket, Key=linked.get_stylesheet_key(1))
+
+    issue(linked, user_id=2)
+
+    assert 'Contents' not in s3_client.list_objects_v2(Bucket=bucket, Prefix=linked.STYLESHEET_PREFIX)
+
+
+def test_linked_mode_without_base_url_inlines_css(linked, s3, monkeypatch):
+    monkeypatch.setattr(linked, 'STYLESHEET_BASE_URL', '')
+
+    issue(linked)
+
+    [stored] = stored_certificates(s3)
+    assert '<style>' in stored['Body'].read().decode('utf-8')
+
+
+def test_certificate_records_its_render_fingerprint(handler, s3, monkeypatch):
+    issued = issue(handler)
+    certificate_data = {
+        'recipient_name': 'Zoë Ångström',
+        'course_title': 'Real Estate Foundations',
+        'tier_level': 1,
+        'tier_name': 'Foundation Program',
+        'completion_date': 'October 05, 2024',
+        'certificate_number': issued['certificate_number'],
+        'user_id': 123,
+        'course_id': 456,
+        'accent_color': '#4A90E2'
+    }
+
+    [stored] = stored_certificates(s3)
+    assert stored['Metadata']['fingerprint'] == handler.html_fingerprint(certificate_data)
+
+    monkeypatch.setattr(handler, 'TEMPLATE_HASH', 'changed-template')
+    assert stored['Metadata']['fingerprint'] != handler.html_fingerprint(certificate_data)
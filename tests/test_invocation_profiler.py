@@ -0,0 +1,83 @@
+"""
+Tests for sampled and latency-triggered handler profiling (lambda/invocation_profiler.py).
+"""
+
+import os
+import pstats
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import invocation_profiler
+
+
+def handler(event, context):
+    time.sleep(event['sleep_ms'] / 1000)
+    return {'statusCode': 200}
+
+
+def invoke(wrapped, sleep_ms, request_id='req-1'):
+    return wrapped({'sleep_ms': sleep_ms}, SimpleNamespace(aws_request_id=request_id))
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    """Profiling to a local directory; tests set the sample rate and latency threshold."""
+    monkeypatch.setattr(invocation_profiler, 'PROFILE_DESTINATION', str(tmp_path / 'profiles'))
+    monkeypatch.setattr(invocation_profiler, 'PROFILE_SAMPLE_RATE', 0.0)
+    monkeypatch.setattr(invocation_profiler, 'PROFILE_LATENCY_MS', 0.0)
+    return invocation_profiler
+
+
+def saved_profiles(profiler):
+    destination = profiler.PROFILE_DESTINATION
+    return sorted(os.listdir(destination)) if os.path.isdir(destination) else []
+
+
+def test_disabled_profiling_returns_the_handler_unchanged(profiler):
+    assert profiler.profile_invocation(handler) is handler
+
+
+def test_latency_threshold_keeps_only_slow_invocations(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_LATENCY_MS', 50.0)
+    wrapped = profiler.profile_invocation(handler)
+
+    assert invoke(wrapped, 0, 'fast') == {'statusCode': 200}
+    assert invoke(wrapped, 80, 'slow') == {'statusCode': 200}
+
+    [name] = saved_profiles(profiler)
+    assert name.startswith('test_invocation_profiler-') and name.endswith('-slow.pstats')
+    stats = pstats.Stats(os.path.join(profiler.PROFILE_DESTINATION, name))
+    assert any(function == 'handler' for _, _, function in stats.stats)
+
+
+def test_unsampled_invocations_are_not_profiled(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_SAMPLE_RATE', 0.5)
+    monkeypatch.setattr(profiler.random, 'random', lambda: 0.7)
+
+    invoke(profiler.profile_invocation(handler), 0)
+
+    assert saved_profiles(profiler) == []
+
+
+def test_profiles_upload_to_the_diagnostics_prefix(profiler, s3, monkeypatch):
+    s3_client, bucket = s3
+    monkeypatch.setattr(profiler, 'PROFILE_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(profiler, 'PROFILE_DESTINATION', 's3://')
+
+    invoke(profiler.profile_invocation(handler), 0)
+
+    [item] = s3_client.list_objects_v2(Bucket=bucket, Prefix='diagnostics/profiles/')['Contents']
+    assert item['Key'].endswith('-req-1.pstats')
+
+
+def test_failing_to_save_does_not_fail_the_invocation(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_SAMPLE_RATE', 1.0)
+
+    def failing_save(*args):
+        raise OSError('read-only file system')
+
+    monkeypatch.setattr(profiler, 'save_profile', failing_save)
+
+    assert invoke(profiler.profile_invocation(handler), 0) == {'statusCode': 200}
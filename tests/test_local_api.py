@@ -0,0 +1,116 @@
+"""
+Tests for the local API Gateway emulator and load generator (lambda/local_api.py, lambda/load_test.py).
+"""
+
+import base64
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import load_test
+from local_api import LocalApiServer, build_proxy_event
+
+HANDLERS = '''
+import json
+import os
+
+
+def echo(event, context):
+    return {
+        'statusCode': 201,
+        'headers': {'Content-Type': 'application/json'},
+        'multiValueHeaders': {'X-Seen': ['a', 'b']},
+        'body': json.dumps({'path': event['path'], 'body': event['body'], 'request_id': context.aws_request_id,
+                            'pid': os.getpid()})
+    }
+
+
+def fail(event, context):
+    raise RuntimeError('boom')
+'''
+
+
+def test_proxy_event_matches_api_gateway():
+    event = build_proxy_event('POST', '/certificates?tier=1&tier=2&debug=', {'User-Agent': 'curl'}, b'{"a": 1}',
+                              request_id='req-1')
+
+    assert event['path'] == '/certificates'
+    assert event['queryStringParameters'] == {'tier': '2', 'debug': ''}
+    assert event['multiValueQueryStringParameters'] == {'tier': ['1', '2'], 'debug': ['']}
+    assert event['requestContext']['path'] == '/local/certificates'
+    assert event['requestContext']['requestId'] == 'req-1'
+    assert (event['body'], event['isBase64Encoded']) == ('{"a": 1}', False)
+
+
+def test_binary_bodies_are_base64_encoded():
+    event = build_proxy_event('PUT', '/upload', {}, b'\xff\xfe\x00')
+
+    assert event['isBase64Encoded'] is True
+    assert base64.b64decode(event['body']) == b'\xff\xfe\x00'
+    assert event['queryStringParameters'] is None
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """Start emulators for handlers in a temporary local_handlers module; each call returns a base URL."""
+    (tmp_path / 'local_handlers.py').write_text(HANDLERS, encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    servers = []
+
+    def start(handler_path):
+        server = LocalApiServer(('127.0.0.1', 0), handler_path, 1, str(tmp_path / 's3'), 30)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_requests_run_in_a_warm_worker(serve):
+    url = serve('local_handlers.echo')
+
+    responses = [post(f"{url}/certificates", {'n': n}) for n in range(2)]
+
+    bodies = [json.loads(body) for _, _, body in responses]
+    assert [status for status, _, _ in responses] == [201, 201]
+    assert bodies[0]['path'] == '/certificates' and json.loads(bodies[0]['body']) == {'n': 0}
+    assert bodies[0]['pid'] == bodies[1]['pid'] == int(responses[0][1]['X-Local-Worker'])
+    assert bodies[0]['request_id'] == responses[0][1]['x-amzn-RequestId']
+    assert responses[0][1]['X-Seen'] == 'a, b'
+    assert float(responses[0][1]['X-Local-Duration-Ms']) >= 0
+
+
+def test_handler_errors_answer_502(serve):
+    status, _, body = post(f"{serve('local_handlers.fail')}/certificates", {})
+
+    assert status == 502
+    assert json.loads(body) == {'message': 'Internal server error'}
+
+
+def test_load_report_counts_statuses_and_workers(serve):
+    url = serve('local_handlers.echo')
+
+    results, elapsed = load_test.run_load(f"{url}/certificates", [{'user_id': 1}], rps=20, duration=0.5,
+                                          concurrency=4, timeout=60)
+    report = load_test.summarize(results, elapsed)
+
+    assert report['requests'] == 10
+    assert report['status_counts'] == {'201': 10}
+    assert report['error_rate'] == 0
+    assert report['workers_used'] == 1
+    assert report['latency_ms']['p50'] <= report['latency_ms']['p99'] <= report['latency_ms']['max']
@@ -0,0 +1,84 @@
+"""
+Tests for the memory profiling mode and the offline memory sweep (lambda/stage_memory.py, lambda/memory_sweep.py).
+"""
+
+import json
+import tracemalloc
+
+import pytest
+
+import memory_sweep
+import stage_memory
+from stage_memory import StageMemory
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    """Restore the process-wide profiling switch and stop tracemalloc after the test."""
+    monkeypatch.setattr(stage_memory.stage_memory, 'profiling', stage_memory.stage_memory.profiling)
+    yield
+    tracemalloc.stop()
+
+
+def test_profiling_is_a_no_op_when_disabled():
+    memory = StageMemory(profiling=False)
+
+    with memory.profile('render'):
+        data = bytearray(MB)
+
+    assert len(data) == MB
+    assert memory.profile_report() == {}
+
+
+def test_profile_reports_allocations_per_stage(tracing):
+    memory = StageMemory(profiling=True)
+
+    with memory.profile('render'):
+        data = bytearray(4 * MB)
+    with memory.profile('upload'):
+        pass
+
+    report = memory.profile_report()
+    assert list(report) == ['render', 'upload']
+    [render] = report['render']
+    assert render['traced_peak_bytes'] >= 4 * MB
+    assert render['top_allocators'][0]['size_bytes'] >= 4 * MB
+    assert 'test_memory_profiling.py:' in render['top_allocators'][0]['location']
+    assert render['peak_rss_bytes'] > 0
+    assert memory.profile_report() == {}
+    del data
+
+
+def test_recommendation_rounds_up_to_a_lambda_setting():
+    assert memory_sweep.recommend_memory_mb(100 * MB, 1.3) == 192
+    assert memory_sweep.recommend_memory_mb(10 * MB, 1.3) == memory_sweep.LAMBDA_MIN_MB
+    assert memory_sweep.recommend_memory_mb(20000 * MB, 1.3) == memory_sweep.LAMBDA_MAX_MB
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+
+    assert memory_sweep.percentile(values, 0.99) == 99
+    assert memory_sweep.percentile(values, 1.0) == 100
+    assert memory_sweep.percentile([7], 0.99) == 7
+
+
+def test_corpus_loads_ndjson_or_builds_variants(tmp_path):
+    path = tmp_path / 'payloads.ndjson'
+    path.write_text('\n'.join(json.dumps({'recipient_name': name}) for name in ('A', 'B')) + '\n', encoding='utf-8')
+
+    assert memory_sweep.load_corpus(str(path)) == [{'recipient_name': 'A'}, {'recipient_name': 'B'}]
+    variants = memory_sweep.load_corpus()
+    assert {payload['tier_level'] for payload in variants} == {1, 2, 3}
+    assert len(variants) == 3 * len(memory_sweep.RECIPIENTS) * len(memory_sweep.COURSES)
+
+
+def test_html_payload_reports_peak_rss_and_stage_profiles(tracing):
+    payload = memory_sweep.load_corpus()[0]
+
+    result = memory_sweep._run_payload('html', payload, warm=2, profile=True)
+
+    assert result['peak_rss_bytes'] > 0
+    assert len(result['stages']['render']) == 1  # Only the last warm run
@@ -0,0 +1,54 @@
+"""
+Tests for PDF size optimization levels (lambda/certificate_generator.py).
+"""
+
+import pytest
+
+try:
+    import certificate_generator
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint unavailable: {e}", allow_module_level=True)
+
+CERTIFICATE = {
+    'recipient_name': 'Jane Smith',
+    'course_title': 'Real Estate Foundations',
+    'tier_level': 2,
+    'completion_date': 'October 05, 2024',
+    'certificate_number': 'CERT-2024-0001',
+    'user_id': 123,
+    'course_id': 456
+}
+
+
+def generator_at(level, monkeypatch):
+    monkeypatch.setattr(certificate_generator, 'PDF_OPTIMIZATION', level)
+    return certificate_generator.CertificateGenerator()
+
+
+def test_standard_level_writes_smaller_pdfs(local_s3, monkeypatch):
+    unoptimized = generator_at('none', monkeypatch).render_pdf(dict(CERTIFICATE))
+    standard = generator_at('standard', monkeypatch).render_pdf(dict(CERTIFICATE))
+
+    assert unoptimized.startswith(b'%PDF') and standard.startswith(b'%PDF')
+    assert len(standard) < len(unoptimized)
+
+
+def test_size_report_compares_against_default_output(local_s3, monkeypatch):
+    monkeypatch.setattr(certificate_generator, 'PDF_SIZE_REPORT', True)
+    generator = generator_at('standard', monkeypatch)
+
+    pdf = generator.render_pdf(dict(CERTIFICATE))
+    generator.render_pdf(dict(CERTIFICATE, tier_level=3))
+
+    metrics = generator.get_pdf_size_metrics()
+    assert metrics['level'] == 'standard'
+    assert metrics['pdfs'] == metrics['baseline_pdfs'] == 2
+    assert metrics['bytes'] >= len(pdf)
+    assert metrics['size_reduction_percent'] == round(
+        100 - metrics['average_bytes'] * 100 / metrics['average_baseline_bytes'], 1
+    )
+
+
+def test_unknown_level_is_rejected(local_s3, monkeypatch):
+    with pytest.raises(ValueError):
+        generator_at('tiny', monkeypatch)
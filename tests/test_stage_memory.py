@@ -0,0 +1,37 @@
+"""
+Tests for streaming rendered text to uploads (lambda/stage_memory.py).
+"""
+
+import io
+
+from stage_memory import ENCODE_CHUNK_CHARS, EncodedTextReader, utf8_size
+
+# Multi-byte characters straddle the encode chunks
+TEXT = '<h1>Zoë Ångström</h1>' + 'é' * (ENCODE_CHUNK_CHARS * 2 + 7)
+
+
+def test_reads_and_seeks():
+    encoded = TEXT.encode('utf-8')
+    reader = EncodedTextReader(TEXT)
+
+    assert len(reader) == utf8_size(TEXT) == len(encoded)
+    assert reader.read() == encoded
+
+    reader.seek(10)
+    assert reader.read(20) == encoded[10:30]
+    reader.seek(-5, io.SEEK_END)
+    assert reader.read() == encoded[-5:]
+    assert reader.seek(0) == 0
+    assert reader.read() == encoded
+
+
+def test_seeking_to_the_end_encodes_nothing(monkeypatch):
+    reader = EncodedTextReader(TEXT)
+    reads = []
+    readinto = EncodedTextReader.readinto
+    monkeypatch.setattr(EncodedTextReader, 'readinto', lambda self, target: reads.append(1) or readinto(self, target))
+
+    assert reader.seek(0, io.SEEK_END) == len(TEXT.encode('utf-8'))
+    assert reader.seek(0) == 0
+    assert reads == []
+    assert reader.read(4) == b'<h1>'
@@ -0,0 +1,107 @@
+"""
+Tests for compacting single-event webhook objects into archive parts (lambda/webhook_compaction.py).
+"""
+
+import gzip
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from conftest import load_fixture
+from s3_keys import webhook_archive_index_key, webhook_day_prefix
+
+DAY = date(2025, 9, 27)
+DAY_START = datetime(2025, 9, 27, tzinfo=timezone.utc)
+EVENT_TYPES = ('contact_created', 'form_submitted', 'opportunity_created')
+
+
+@pytest.fixture
+def day_objects(s3):
+    """Store the fixtures as the plugin does, newest first."""
+    s3_client, bucket = s3
+    keys = []
+    for n in reversed(range(6)):
+        received_at = DAY_START + timedelta(hours=n)
+        filename = f"webhook-contact_{n}-{int(received_at.timestamp())}.json"
+        key = webhook_day_prefix(received_at) + filename
+        s3_client.put_object(Bucket=bucket, Key=key, Body=load_fixture(EVENT_TYPES[n % 3]))
+        keys.append(key)
+    return keys
+
+
+def read_part(s3, key):
+    s3_client, bucket = s3
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return [json.loads(line) for line in gzip.decompress(body).splitlines()]
+
+
+def test_compacts_a_day_into_parts_per_event_type(s3, day_objects):
+    from webhook_compaction import WebhookCompactor
+    s3_client, bucket = s3
+
+    result = WebhookCompactor().compact_day(DAY)
+
+    assert result['source_objects'] == result['archived_objects'] == result['deleted_objects'] == 6
+    assert result['index_key'] == webhook_archive_index_key(DAY)
+    index = json.loads(s3_client.get_object(Bucket=bucket, Key=result['index_key'])['Body'].read())
+    assert sorted(index['partitions']) == sorted(EVENT_TYPES)
+
+    records = [record for key in result['parts'] for record in read_part(s3, key)]
+    assert sorted(record['source_key'] for record in records) == sorted(day_objects)
+    for parts in index['partitions'].values():
+        assert [part['events'] for part in parts] == [2]
+        received = [record['received_at'] for record in read_part(s3, parts[0]['key'])]
+        assert received == sorted(received)
+        assert (parts[0]['first_received_at'], parts[0]['last_received_at']) == (received[0], received[-1])
+
+    assert 'Contents' not in s3_client.list_objects_v2(Bucket=bucket, Prefix=webhook_day_prefix(DAY))
+
+
+def test_rerun_does_not_archive_twice(s3, day_objects):
+    from webhook_compaction import WebhookCompactor
+    WebhookCompactor(delete_originals=False).compact_day(DAY)
+
+    result = WebhookCompactor().compact_day(DAY)
+
+    assert result['archived_objects'] == 0
+    assert result['parts'] == []
+    assert result['deleted_objects'] == 6
+
+
+def test_crashed_run_is_redone_under_the_same_part_names(s3, day_objects, monkeypatch):
+    from webhook_compaction import WebhookCompactor
+    s3_client, bucket = s3
+    crashed = WebhookCompactor()
+    put = crashed._put
+
+    def crash_on_index(key, *args, **kwargs):
+        if key == webhook_archive_index_key(DAY):
+            raise Exception('Lambda timed out')
+        put(key, *args, **kwargs)
+
+    monkeypatch.setattr(crashed, '_put', crash_on_index)
+    with pytest.raises(Exception, match='timed out'):
+        crashed.compact_day(DAY)
+    archived = s3_client.list_objects_v2(Bucket=bucket, Prefix='webhook-archive/')['KeyCount']
+
+    result = WebhookCompactor().compact_day(DAY)
+
+    assert result['archived_objects'] == 6
+    assert s3_client.list_objects_v2(Bucket=bucket, Prefix='webhook-archive/')['KeyCount'] == archived + 1
+
+
+def test_large_days_are_listed_in_key_ranges(s3, monkeypatch):
+    from webhook_compaction import WebhookCompactor
+    s3_client, bucket = s3
+    received_at = DAY_START + timedelta(hours=1)
+    expected = sorted(
+        webhook_day_prefix(DAY) + f"webhook-{contact_id}-{int(received_at.timestamp()) + n}.json"
+        for n, contact_id in enumerate(['0abc', 'Zed', 'abc', 'contact_1', 'contact_2', 'zzz'])
+    )
+    for key in expected:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=b'{}')
+    list_objects_v2 = s3_client.list_objects_v2
+    monkeypatch.setattr(s3_client, 'list_objects_v2', lambda **kwargs: list_objects_v2(MaxKeys=2, **kwargs))
+
+    assert WebhookCompactor().list_day(DAY) == expected
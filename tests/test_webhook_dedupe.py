@@ -0,0 +1,84 @@
+"""
+Tests for dropping repeated GHL webhook deliveries (lambda/webhook_dedupe.py, lambda/webhook_ingest.py).
+"""
+
+import json
+
+from conftest import load_fixture, response_body, webhook_event
+
+
+class FailingSegmentUploads:
+    """S3 client whose next segment uploads fail; every other call goes to the wrapped client."""
+
+    def __init__(self, s3_client, failures):
+        self.s3_client = s3_client
+        self.failures = failures
+
+    def put_object(self, **kwargs):
+        if kwargs['Key'].endswith('.ndjson.gz') and self.failures:
+            self.failures -= 1
+            raise Exception('SlowDown')
+        return self.s3_client.put_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.s3_client, name)
+
+
+def ingest(raw_body):
+    from webhook_ingest import webhook_handler
+    return webhook_handler(webhook_event(raw_body), None)
+
+
+def test_resent_delivery_is_a_duplicate(local_s3):
+    raw_body = load_fixture('contact_created')
+
+    first, resent = ingest(raw_body), ingest(raw_body)
+
+    assert first['statusCode'] == resent['statusCode'] == 200
+    assert 'duplicate' not in response_body(first)
+    assert response_body(resent)['duplicate'] is True
+    assert response_body(resent)['message'] == 'Duplicate delivery ignored'
+
+
+def test_other_event_is_not_a_duplicate(local_s3):
+    ingest(load_fixture('contact_created'))
+    assert 'duplicate' not in response_body(ingest(load_fixture('form_submitted')))
+
+
+def test_archived_delivery_is_a_duplicate_in_another_container(s3):
+    from webhook_dedupe import DeliveryFilter, delivery_digest
+    from webhook_effects import get_effect_runner
+    raw_body = load_fixture('opportunity_created')
+    digest = delivery_digest(raw_body, json.loads(raw_body))
+    other_container = DeliveryFilter(*s3)
+
+    ingest(raw_body)
+    other_container.sync(force=True)
+    # Still in an open segment
+    assert not other_container.is_duplicate(digest)
+
+    get_effect_runner().flush()
+    other_container.sync(force=True)
+    assert other_container.is_duplicate(digest)
+
+
+def test_failed_archive_is_not_shared(s3, monkeypatch):
+    import webhook_effects
+    from webhook_dedupe import DeliveryFilter, delivery_digest
+    from webhook_segments import SegmentBuffer
+    segments = SegmentBuffer(s3_client=FailingSegmentUploads(s3[0], failures=1))
+    runner = webhook_effects.EffectRunner([webhook_effects.archive_effect(segments)])
+    monkeypatch.setattr(webhook_effects, '_runner', runner)
+    raw_body = load_fixture('contact_created')
+    digest = delivery_digest(raw_body, json.loads(raw_body))
+    other_container = DeliveryFilter(*s3)
+
+    assert ingest(raw_body)['statusCode'] == 200
+    runner.flush()
+    other_container.sync(force=True)
+    assert not other_container.is_duplicate(digest)
+
+    # The failed segment is kept and retried by the next flush
+    runner.flush()
+    other_container.sync(force=True)
+    assert other_container.is_duplicate(digest)
@@ -0,0 +1,114 @@
+"""
+Tests for running webhook side effects off the acknowledgement path (lambda/webhook_effects.py, lambda/webhook_queue.py).
+"""
+
+import json
+
+import pytest
+
+import webhook_effects
+import webhook_queue
+from conftest import webhook_event
+from webhook_effects import Effect, EffectRunner, defer_failures
+
+
+class RecordingQueue:
+    """Durable work queue that keeps what was sent."""
+
+    durable = True
+
+    def __init__(self, max_bytes=None):
+        self.sent = []
+        self.max_bytes = max_bytes
+
+    def send(self, message, delay_seconds=0):
+        if self.max_bytes is not None and len(webhook_queue.encode_message(message)) > self.max_bytes:
+            raise webhook_queue.MessageTooLarge('Message too large for the work queue')
+        self.sent.append((message, delay_seconds))
+        return f"message-{len(self.sent)}"
+
+
+def message(contact_id='contact_1', effects=('archive', 'notify')):
+    record = {'received_at': '2025-09-27T13:30:00+00:00', 'event_type': 'ContactCreate', 'contact_id': contact_id,
+              'payload': {'type': 'ContactCreate'}}
+    return {'record': record, 'effects': list(effects)}
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(webhook_effects.time, 'sleep', lambda seconds: None)
+
+
+def test_failed_effects_are_retried_then_reported(no_backoff):
+    calls = []
+
+    def flaky(message):
+        calls.append(message['record']['contact_id'])
+        if message['record']['contact_id'] == 'contact_2' or len(calls) == 1:
+            raise ConnectionError('SES unavailable')
+
+    runner = EffectRunner([Effect('notify', flaky, attempts=3)])
+
+    failures = runner.process_batch([message('contact_1'), message('contact_2')])
+
+    assert calls.count('contact_1') == 2 and calls.count('contact_2') == 3
+    assert [(failed['record']['contact_id'], names) for failed, names in failures] == [('contact_2', ['notify'])]
+
+
+def test_only_failed_effects_are_deferred_with_growing_delays(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(webhook_effects, 'EFFECT_MAX_DEFERRALS', 2)
+
+    undeferred = defer_failures(queue, [(message(), ['notify'])])
+    deferred, delay = queue.sent[0]
+    undeferred += defer_failures(queue, [(deferred, ['notify'])])
+    redeferred, second_delay = queue.sent[1]
+    given_up = defer_failures(queue, [(redeferred, ['notify'])])
+
+    assert undeferred == []
+    assert (deferred['effects'], deferred['deferrals'], redeferred['deferrals']) == (['notify'], 1, 2)
+    assert 0 < delay < second_delay
+    assert given_up == [redeferred] and len(queue.sent) == 2
+
+
+def test_sqs_batches_return_only_undeferred_messages(no_backoff, monkeypatch):
+    class UnavailableQueue(RecordingQueue):
+        def send(self, message, delay_seconds=0):
+            raise ConnectionError('SQS unavailable')
+
+    def notify(message):
+        if message['record']['contact_id'] == 'contact_2':
+            raise ConnectionError('SES unavailable')
+
+    monkeypatch.setattr(webhook_effects, '_runner', EffectRunner([Effect('notify', notify, attempts=1)]))
+    monkeypatch.setattr(webhook_queue, '_work_queue', UnavailableQueue())
+    event = {'Records': [{'messageId': f"id-{n}", 'body': json.dumps(message(f"contact_{n}"))} for n in (1, 2)]}
+
+    assert webhook_effects.effects_handler(event, None) == {'batchItemFailures': [{'itemIdentifier': 'id-2'}]}
+
+
+def test_durable_queue_gets_every_effect(local_s3, s3, monkeypatch):
+    from webhook_ingest import webhook_handler
+    queue = RecordingQueue()
+    monkeypatch.setattr(webhook_queue, '_work_queue', queue)
+    raw_body = json.dumps({'type': 'ContactCreate', 'contact': {'id': 'contact_abc123def'}}).encode('utf-8')
+
+    assert webhook_handler(webhook_event(raw_body), None)['statusCode'] == 200
+
+    [(sent, delay)] = queue.sent
+    assert (sent['effects'], delay) == (['archive', 'contact', 'notify'], 0)
+    assert webhook_effects._runner is None  # Nothing ran in the ingestion container
+
+
+def test_events_too_large_to_queue_run_inline(local_s3, s3, monkeypatch):
+    from webhook_ingest import webhook_handler
+    queue = RecordingQueue(max_bytes=200)
+    archived = []
+    monkeypatch.setattr(webhook_queue, '_work_queue', queue)
+    monkeypatch.setattr(webhook_effects, '_runner', EffectRunner([Effect('archive', archived.append)]))
+    raw_body = json.dumps({'type': 'NoteCreate', 'contactId': 'contact_abc123def', 'body': 'x' * 500}).encode('utf-8')
+
+    assert webhook_handler(webhook_event(raw_body), None)['statusCode'] == 200
+
+    assert queue.sent == []
+    assert [message['record']['contact_id'] for message in archived] == ['contact_abc123def']
@@ -0,0 +1,98 @@
+"""
+Tests for batching webhook events into segments (lambda/webhook_ingest.py, lambda/webhook_segments.py).
+"""
+
+import gzip
+import json
+
+import pytest
+
+from conftest import load_fixture, webhook_event
+
+
+@pytest.fixture
+def segments(s3, monkeypatch):
+    """Segment buffer of the container's archive effect."""
+    import webhook_effects
+    from webhook_segments import SegmentBuffer
+    segments = SegmentBuffer()
+    monkeypatch.setattr(webhook_effects, '_runner', webhook_effects.EffectRunner([webhook_effects.archive_effect(segments)]))
+    return segments
+
+
+def ingest_contacts(count, first=0):
+    """Ingest distinct contact_created events."""
+    from webhook_ingest import webhook_handler
+    payload = json.loads(load_fixture('contact_created'))
+    for n in range(first, first + count):
+        payload['contact']['id'] = f"contact_{n}"
+        raw_body = json.dumps(payload).encode('utf-8')
+        assert webhook_handler(webhook_event(raw_body), None)['statusCode'] == 200
+
+
+def stored_segments(s3):
+    s3_client, bucket = s3
+    listing = s3_client.list_objects_v2(Bucket=bucket, Prefix='webhook-segments/')
+    return [obj['Key'] for obj in listing.get('Contents', []) if obj['Key'].endswith('.ndjson.gz')]
+
+
+def read_segment(s3, key):
+    s3_client, bucket = s3
+    return gzip.decompress(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()).splitlines()
+
+
+def test_events_share_segments(s3, segments):
+    from webhook_effects import get_effect_runner
+    ingest_contacts(20)
+    assert stored_segments(s3) == []
+
+    get_effect_runner().flush()
+
+    keys = stored_segments(s3)
+    assert len(keys) == 1
+    assert len(read_segment(s3, keys[0])) == 20
+
+
+def test_segments_upload_once_old_enough(s3, segments):
+    ingest_contacts(5)
+    assert stored_segments(s3) == []
+
+    segments.max_age_seconds = 0
+    ingest_contacts(1, first=5)
+
+    keys = stored_segments(s3)
+    assert len(keys) == 1
+    assert len(read_segment(s3, keys[0])) == 6
+
+
+def test_full_segments_upload_with_the_next_request(s3, segments):
+    segments.max_bytes = 1
+
+    ingest_contacts(3)
+
+    assert len(stored_segments(s3)) == 3
+
+
+def test_other_effects_run_after_the_webhook_is_answered(s3, monkeypatch):
+    import threading
+    import webhook_effects
+    from webhook_ingest import webhook_handler
+    from webhook_queue import get_work_queue
+    release = threading.Event()
+    notified = []
+
+    def notify(message):
+        release.wait(5)
+        notified.append(message['record']['contact_id'])
+
+    runner = webhook_effects.EffectRunner([webhook_effects.archive_effect(), webhook_effects.Effect('notify', notify)])
+    monkeypatch.setattr(webhook_effects, '_runner', runner)
+    raw_body = json.dumps({'type': 'ContactCreate', 'contact': {'id': 'contact_abc123def'}}).encode('utf-8')
+
+    response = webhook_handler(webhook_event(raw_body), None)
+
+    assert response['statusCode'] == 200
+    assert notified == []
+    release.set()
+    assert get_work_queue().drain(5)
+    assert notified == ['contact_abc123def']
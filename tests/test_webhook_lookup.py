@@ -0,0 +1,63 @@
+"""
+Tests for looking up stored webhook events by contact (lambda/webhook_lookup.py).
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import load_fixture, webhook_event
+from s3_keys import webhook_day_prefix
+
+
+@pytest.fixture
+def lookup(local_s3):
+    from webhook_lookup import ContactLookup
+    return ContactLookup()
+
+
+def ingest(*raw_bodies):
+    from webhook_effects import get_effect_runner
+    from webhook_ingest import webhook_handler
+    for raw_body in raw_bodies:
+        assert webhook_handler(webhook_event(raw_body), None)['statusCode'] == 200
+    get_effect_runner().flush()
+
+
+def find(lookup, contact_id, **kwargs):
+    # Segments are filed under their receive day; search around it in case the test spans midnight
+    today = datetime.now(timezone.utc).date()
+    return lookup.find(contact_id, today - timedelta(days=1), today + timedelta(days=1), **kwargs)
+
+
+def test_finds_ingested_events_by_contact(lookup):
+    ingest(*(load_fixture(event_type) for event_type in ('contact_created', 'form_submitted', 'opportunity_created')))
+
+    assert [record['event_type'] for record in find(lookup, 'contact_abc123def')] == ['contact_created']
+    # Form submissions carry the contact under form.contactId
+    assert [record['event_type'] for record in find(lookup, 'contact_def456')] == ['form_submitted']
+    assert [record['event_type'] for record in find(lookup, 'contact_abc123')] == ['opportunity_created']
+    assert find(lookup, 'contact_abc123def', event_types=['form_submitted']) == []
+    assert find(lookup, 'contact_missing') == []
+
+
+def test_finds_non_ascii_contact_ids(lookup):
+    payload = json.loads(load_fixture('contact_created'))
+    payload['contact']['id'] = 'contact_zoë_ångström'
+    ingest(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    records = find(lookup, 'contact_zoë_ångström')
+    assert [record['contact_id'] for record in records] == ['contact_zoë_ångström']
+
+
+def test_finds_compacted_events(lookup, s3):
+    from webhook_compaction import WebhookCompactor
+    s3_client, bucket = s3
+    received_at = datetime(2025, 9, 27, 12, tzinfo=timezone.utc)
+    filename = f"webhook-contact_abc123def-{int(received_at.timestamp())}.json"
+    s3_client.put_object(Bucket=bucket, Key=webhook_day_prefix(received_at) + filename, Body=load_fixture('contact_created'))
+    WebhookCompactor().compact_day(received_at.date())
+
+    records = lookup.find('contact_abc123def', received_at.date())
+    assert [record['received_at'] for record in records] == [received_at.isoformat()]
@@ -0,0 +1,93 @@
+"""
+Tests for webhook ingestion rollups (lambda/webhook_metrics.py).
+"""
+
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+from conftest import load_fixture, response_body, webhook_event
+
+DAY = date(2025, 9, 27)
+NOON = datetime(2025, 9, 27, 12, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def metrics(s3):
+    from webhook_metrics import MetricsRollup
+    return MetricsRollup(*s3, flush_seconds=60)
+
+
+def test_rolls_up_per_minute_type_and_status(s3, metrics):
+    from webhook_metrics import load_rollups, summarize
+    for latency_ms in (3, 4, 40, 700):
+        metrics.record('contact_created', 'success', 100, latency_ms, now=NOON)
+    metrics.record('contact_created', 'duplicate', 100, 1, now=NOON + 30)
+    metrics.record('form_submitted', 'success', 50, 8, now=NOON + 60)
+    metrics.flush()
+
+    rows = summarize(load_rollups(DAY, *s3))
+
+    assert rows[0] == {'event_type': 'contact_created', 'status': 'duplicate', 'count': 1, 'bytes': 100,
+                       'avg_ms': 1.0, 'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'max_ms': 1}
+    assert rows[1]['count'] == 4
+    assert (rows[1]['p50_ms'], rows[1]['p95_ms'], rows[1]['max_ms']) == (5, 1000, 700)
+    assert [row['count'] for row in summarize(load_rollups(DAY, *s3), ('minute',))] == [5, 1]
+
+
+def test_flushes_from_several_writers_merge(s3, metrics):
+    from webhook_metrics import MetricsRollup, load_rollups, summarize
+    other_writer = MetricsRollup(*s3)
+    metrics.record('contact_created', 'success', 100, 5, now=NOON)
+    other_writer.record('contact_created', 'success', 100, 5, now=NOON)
+    metrics.flush()
+    other_writer.flush()
+
+    assert summarize(load_rollups(DAY, *s3), ('event_type',))[0]['count'] == 2
+
+
+def test_unrouted_event_types_count_as_unknown(metrics):
+    for n in range(100):
+        metrics.record(f"made_up_{n}", 'success', 10, 1, now=NOON)
+
+    assert {key[1] for key in metrics._rollups} == {'unknown'}
+
+
+def test_failed_upload_is_retried(s3, metrics, monkeypatch):
+    from webhook_metrics import load_rollups
+    metrics.record('contact_created', 'success', 100, 5, now=NOON)
+    put_object = s3[0].put_object
+
+    def throttled(**kwargs):
+        raise Exception('SlowDown')
+
+    monkeypatch.setattr(s3[0], 'put_object', throttled)
+    metrics.flush()
+    assert load_rollups(DAY, *s3) == {}
+
+    monkeypatch.setattr(s3[0], 'put_object', put_object)
+    metrics.flush()
+    assert len(load_rollups(DAY, *s3)) == 1
+
+
+def test_handler_flushes_before_returning_once_due(s3, monkeypatch):
+    import webhook_metrics
+    from webhook_ingest import webhook_handler
+    from webhook_metrics import MetricsRollup, load_rollups, summarize
+    monkeypatch.setattr(webhook_metrics, '_metrics', MetricsRollup(*s3, flush_seconds=0))
+
+    response = webhook_handler(webhook_event(load_fixture('form_submitted')), None)
+    today = datetime.now(timezone.utc).date()
+
+    assert response_body(response)['success'] is True
+    rows = summarize(load_rollups(today, *s3))
+    assert [(row['event_type'], row['status'], row['count']) for row in rows] == [('form_submitted', 'success', 1)]
+
+
+def test_metrics_handler_rejects_unknown_groupings(s3):
+    from webhook_metrics import metrics_handler
+    response = metrics_handler({'queryStringParameters': {'date': DAY.isoformat(), 'by': 'contact_id'}}, None)
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['success'] is False
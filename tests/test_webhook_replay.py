@@ -0,0 +1,116 @@
+"""
+Tests for re-submitting stored webhook events (lambda/webhook_replay.py).
+"""
+
+import gzip
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from conftest import load_fixture, webhook_event
+from s3_keys import webhook_day_prefix
+
+DAY_START = datetime(2025, 9, 27, tzinfo=timezone.utc)
+DAY_END = DAY_START + timedelta(days=1)
+
+
+def store_originals(s3, count):
+    """Store contact_created events as the plugin does, one object each."""
+    s3_client, bucket = s3
+    payload = json.loads(load_fixture('contact_created'))
+    for n in range(count):
+        received_at = DAY_START + timedelta(minutes=n)
+        payload['contact']['id'] = f"contact_{n}"
+        filename = f"webhook-contact_{n}-{int(received_at.timestamp())}.json"
+        s3_client.put_object(Bucket=bucket, Key=webhook_day_prefix(received_at) + filename, Body=json.dumps(payload).encode('utf-8'))
+
+
+def recording_sender(status=200):
+    delivered = []
+    lock = threading.Lock()
+
+    def send(record):
+        with lock:
+            delivered.append(record)
+        return status
+
+    return send, delivered
+
+
+def test_events_stored_twice_are_replayed_once(s3, tmp_path):
+    from webhook_compaction import WebhookCompactor
+    from webhook_replay import ArchiveReader, ReplayJournal, run_replay
+    store_originals(s3, 5)
+    WebhookCompactor(delete_originals=False).compact_day(DAY_START.date())
+    send, delivered = recording_sender()
+    journal = ReplayJournal(str(tmp_path / 'replay.journal'))
+
+    counts = run_replay(ArchiveReader().events(DAY_START, DAY_END), send, journal, concurrency=2, rate=0)
+
+    assert (counts['replayed'], counts['skipped']) == (5, 5)
+    assert sorted(record['contact_id'] for record in delivered) == [f"contact_{n}" for n in range(5)]
+
+
+def test_rerun_skips_replayed_events_and_retries_failed_ones(s3, tmp_path):
+    from webhook_replay import ArchiveReader, ReplayJournal, run_replay
+    store_originals(s3, 4)
+    journal_path = str(tmp_path / 'replay.journal')
+
+    def fail_contact_2(record):
+        return 400 if record['contact_id'] == 'contact_2' else 200
+
+    journal = ReplayJournal(journal_path)
+    first = run_replay(ArchiveReader().events(DAY_START, DAY_END), fail_contact_2, journal, concurrency=2, rate=0)
+    journal.close()
+    send, delivered = recording_sender()
+    journal = ReplayJournal(journal_path)
+    second = run_replay(ArchiveReader().events(DAY_START, DAY_END), send, journal, concurrency=2, rate=0)
+    journal.close()
+
+    assert (first['replayed'], first['failed']) == (3, 1)
+    assert (second['replayed'], second['skipped']) == (1, 3)
+    assert [record['contact_id'] for record in delivered] == ['contact_2']
+
+
+def test_events_of_one_contact_keep_their_order(tmp_path):
+    from webhook_replay import ReplayJournal, run_replay
+    records = [
+        {'received_at': (DAY_START + timedelta(seconds=n)).isoformat(), 'event_type': 'ContactUpdate',
+         'contact_id': f"contact_{n % 3}", 'payload': {'n': n}}
+        for n in range(30)
+    ]
+    delivered = []
+
+    def send(record):
+        # Later events of a contact would overtake earlier ones if they shared no lane
+        time.sleep(0.002 * (30 - record['payload']['n']) / 30)
+        delivered.append(record)
+        return 200
+
+    run_replay(records, send, ReplayJournal(str(tmp_path / 'replay.journal')), concurrency=4, rate=0)
+
+    for contact in ('contact_0', 'contact_1', 'contact_2'):
+        order = [record['payload']['n'] for record in delivered if record['contact_id'] == contact]
+        assert order == sorted(order)
+
+
+def test_replays_are_not_dropped_as_duplicate_deliveries(s3, tmp_path):
+    from webhook_effects import get_effect_runner
+    from webhook_ingest import webhook_handler
+    from webhook_replay import ReplayJournal, function_target, run_replay
+    payload = {'type': 'ContactCreate', 'webhookId': 'wh_1', 'contact': {'id': 'contact_abc123def'}}
+    webhook_handler(webhook_event(json.dumps(payload).encode('utf-8')), None)
+    record = {'received_at': DAY_START.isoformat(), 'event_type': 'ContactCreate',
+              'contact_id': 'contact_abc123def', 'payload': payload}
+
+    counts = run_replay([record], function_target('webhook_ingest.webhook_handler'),
+                        ReplayJournal(str(tmp_path / 'replay.journal')), concurrency=1, rate=0)
+    get_effect_runner().flush()
+
+    assert counts['replayed'] == 1
+    s3_client, bucket = s3
+    keys = [obj['Key'] for obj in s3_client.list_objects_v2(Bucket=bucket, Prefix='webhook-segments/')['Contents']
+            if obj['Key'].endswith('.ndjson.gz')]
+    lines = gzip.decompress(s3_client.get_object(Bucket=bucket, Key=keys[0])['Body'].read()).splitlines()
+    assert len(keys) == 1 and len(lines) == 2
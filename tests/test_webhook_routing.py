@@ -0,0 +1,48 @@
+"""
+Tests for classifying GHL webhook events (lambda/webhook_routing.py).
+"""
+
+import json
+
+import pytest
+
+from conftest import load_fixture
+from webhook_routing import FALLBACK_ROUTE, ROUTES, route_event
+
+# Clarity_GHL_Webhook::is_contact_event and ::is_important_event
+PLUGIN_CONTACT_EVENTS = {'ContactCreate', 'ContactUpdate', 'contact.created', 'contact.updated'}
+PLUGIN_IMPORTANT_EVENTS = {'ContactCreate', 'OpportunityCreate', 'AppointmentScheduled'}
+
+
+def test_flags_match_the_plugin():
+    assert {event_type for event_type, route in ROUTES.items() if route.is_contact} == PLUGIN_CONTACT_EVENTS
+    assert {event_type for event_type, route in ROUTES.items() if route.is_important} == PLUGIN_IMPORTANT_EVENTS
+
+
+@pytest.mark.parametrize('event_type, contact_id', [
+    ('contact_created', 'contact_abc123def'),
+    ('form_submitted', 'contact_def456'),
+    ('opportunity_created', 'contact_abc123'),
+])
+def test_extracts_contact_ids_of_the_fixtures(event_type, contact_id):
+    route, routed_type, routed_contact_id = route_event(json.loads(load_fixture(event_type)))
+
+    assert route is ROUTES[event_type]
+    assert (routed_type, routed_contact_id) == (event_type, contact_id)
+
+
+def test_event_type_keys_are_probed_in_the_plugins_order():
+    assert route_event({'event': 'ContactUpdate', 'eventType': 'ContactCreate', 'contactId': 'c1'})[1] == 'ContactUpdate'
+    assert route_event({'eventType': 'ContactCreate', 'contactId': 'c1'})[1] == 'ContactCreate'
+    assert route_event({'contactId': 'c1'})[1] == 'unknown'
+
+
+def test_unrouted_events_fall_back_to_the_plugins_probe():
+    assert route_event({'type': 'NoteCreate', 'contactId': 'c1', 'id': 'note_1'}) == (FALLBACK_ROUTE, 'NoteCreate', 'c1')
+    assert route_event({'type': 'NoteCreate', 'contact': {'id': 'c2'}})[2] == 'c2'
+    assert route_event({'type': 'TaskCreate', 'task': {'contactId': 'c3'}})[2] == 'c3'
+    assert route_event({'type': 'NoteCreate'})[2] is None
+
+
+def test_contact_ids_are_strings():
+    assert route_event({'type': 'ContactCreate', 'contact': {'id': 12345}})[2] == '12345'
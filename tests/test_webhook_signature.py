@@ -0,0 +1,91 @@
+"""
+Tests for verifying webhook signatures (lambda/webhook_signature.py, lambda/webhook_ingest.py).
+"""
+
+import base64
+
+import pytest
+
+from conftest import load_fixture, response_body, webhook_event
+from webhook_signature import WebhookRejected, WebhookVerifier
+
+SECRET = 'shared-webhook-secret'
+BODY = load_fixture('contact_created')
+
+
+def signed_event(body, header='X-GHL-Signature', signature=None):
+    event = webhook_event(body)
+    event['headers'][header] = signature or WebhookVerifier(SECRET).sign(body)
+    return event
+
+
+def rejection(verifier, event):
+    with pytest.raises(WebhookRejected) as excinfo:
+        verifier.verify(event)
+    return excinfo.value.status_code, excinfo.value.message
+
+
+@pytest.mark.parametrize('header', ['X-GHL-Signature', 'X-GoHighLevel-Signature', 'X-Hub-Signature-256'])
+def test_signatures_from_every_plugin_header_verify(header):
+    verifier = WebhookVerifier(SECRET)
+    signature = verifier.sign(BODY)
+
+    assert verifier.verify(signed_event(BODY, header, signature)) == BODY
+    assert verifier.verify(signed_event(BODY, header, signature[len('sha256='):].upper())) == BODY
+
+
+def test_invalid_and_missing_signatures_are_rejected():
+    verifier = WebhookVerifier(SECRET)
+
+    assert rejection(verifier, signed_event(BODY + b' ', signature=verifier.sign(BODY))) == (401, 'Signature verification failed')
+    assert rejection(verifier, signed_event(BODY, signature=WebhookVerifier('other').sign(BODY)))[0] == 401
+    assert rejection(verifier, webhook_event(BODY)) == (401, 'Missing webhook signature')
+
+
+def test_preferred_header_wins():
+    verifier = WebhookVerifier(SECRET)
+    event = signed_event(BODY, 'X-Hub-Signature-256')
+    event['headers']['X-GHL-Signature'] = 'sha256=' + '0' * 64
+
+    assert rejection(verifier, event)[0] == 401
+
+
+def test_verification_is_skipped_without_a_secret():
+    verifier = WebhookVerifier('')
+
+    assert not verifier.enabled
+    assert verifier.verify(webhook_event(BODY)) == BODY
+
+
+def test_oversized_bodies_are_rejected_before_decoding(monkeypatch):
+    import webhook_signature
+    verifier = WebhookVerifier(SECRET, max_body_bytes=1024)
+
+    def unexpected_decode(*args):
+        raise AssertionError('body decoded')
+
+    monkeypatch.setattr(webhook_signature, 'decode_body', unexpected_decode)
+
+    assert rejection(verifier, signed_event(b'x' * 1025)) == (413, 'Payload too large')
+
+
+def test_base64_bodies_verify_on_their_decoded_bytes():
+    verifier = WebhookVerifier(SECRET)
+    event = signed_event(BODY)
+    event.update(body=base64.b64encode(BODY).decode('ascii'), isBase64Encoded=True)
+
+    assert verifier.verify(event) == BODY
+    event['body'] = 'not base64!'
+    assert rejection(verifier, event) == (400, 'Malformed base64 body')
+
+
+def test_ingest_rejects_unsigned_webhooks(local_s3, monkeypatch):
+    import webhook_ingest
+    monkeypatch.setattr(webhook_ingest, 'verifier', WebhookVerifier(SECRET))
+
+    unsigned = webhook_ingest.webhook_handler(webhook_event(BODY), None)
+    signed = webhook_ingest.webhook_handler(signed_event(BODY), None)
+
+    assert unsigned['statusCode'] == 401
+    assert response_body(unsigned)['error'] == 'Missing webhook signature'
+    assert signed['statusCode'] == 200